@@ -1,4 +1,6 @@
 import abc
+import asyncio
+import gc
 import importlib
 import inspect
 import json
@@ -6,6 +8,8 @@ import os
 import nltk
 import logging
 import logging.config
+import sys
+from collections import OrderedDict
 from types import SimpleNamespace
 from dataclasses import dataclass
 
@@ -28,6 +32,9 @@ def get_logger(name):
     return logging.getLogger(name)
 
 
+logger = get_logger(__name__)
+
+
 # Load backend dynamically from "backends" sibling directory
 # Note: The backends might use get_logger (circular import)
 def load_credentials(backend, file_name="key.json") -> Dict:
@@ -191,6 +198,28 @@ class Model(abc.ABC):
         """
         pass
 
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[Any, Any, str]:
+        """Coroutine version of generate_response() to have many dialogues in flight on one event loop.
+
+        Backends with an asynchronous client should overwrite this method. Otherwise, the blocking
+        generate_response() is called in a thread of the default executor so that the event loop is not blocked.
+
+        Args:
+            messages (List[Dict]): The dialogue context as for generate_response().
+
+        Returns:
+            Tuple[Any, Any, str]: The prompt object, the response object and the response text
+            as for generate_response().
+        """
+        return await asyncio.to_thread(self.generate_response, messages)
+
+    def close(self):
+        """
+        Release the resources held by the model, e.g. the weights of a local model. Called by the ModelPool when the
+        model is evicted; the model must not be used afterwards.
+        """
+        pass
+
 
 class Backend(abc.ABC):
     """ Marker class for a model provider."""
@@ -303,23 +332,13 @@ def get_model_for(model_spec: Union[str, Dict, ModelSpec]) -> Model:
     """
     assert len(_model_registry) > 0, "Model registry is empty. Load a model registry and try again."
 
-    if isinstance(model_spec, str):
-        model_spec = ModelSpec.from_name(model_spec)
-    if isinstance(model_spec, dict):
-        model_spec = ModelSpec.from_dict(model_spec)
+    model_spec = unify_model_spec(model_spec)
 
     if model_spec.is_human():
         return HumanModel(model_spec)
     if model_spec.is_programmatic():
         return CustomResponseModel(model_spec)
 
-    for registered_spec in _model_registry:
-        try:
-            model_spec = model_spec.unify(registered_spec)
-            break  # use first model spec that does unify (doesn't throw an error)
-        except ValueError:
-            continue
-
     if not model_spec.has_backend():
         raise ValueError(
             f"Model spec requires 'backend' after unification, but not found in model spec '{model_spec}'. "
@@ -329,6 +348,89 @@ def get_model_for(model_spec: Union[str, Dict, ModelSpec]) -> Model:
     return model
 
 
+def unify_model_spec(model_spec: Union[str, Dict, ModelSpec]) -> ModelSpec:
+    """
+    :param model_spec: a model name, dict or partial model spec
+    :return: the model spec unified with the first matching entry of the model registry
+    """
+    if isinstance(model_spec, str):
+        model_spec = ModelSpec.from_name(model_spec)
+    if isinstance(model_spec, dict):
+        model_spec = ModelSpec.from_dict(model_spec)
+
+    if model_spec.is_human() or model_spec.is_programmatic():
+        return model_spec
+
+    for registered_spec in _model_registry:
+        try:
+            model_spec = model_spec.unify(registered_spec)
+            break  # use first model spec that does unify (doesn't throw an error)
+        except ValueError:
+            continue
+    return model_spec
+
+
+class ModelPool:
+    """
+    Keeps loaded models around, so that several runs in the same process (e.g. all games for one model) load the
+    weights only once. Models are identified by their unified model spec.
+
+    Eviction policy: when the models for a run are requested, all pooled models that are not used by this run are
+    closed before any new model is loaded. Thus, at most the models of a single run are held in memory.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Model] = OrderedDict()
+
+    @staticmethod
+    def _key_for(model_spec: ModelSpec) -> str:
+        return json.dumps(model_spec.__dict__, sort_keys=True, default=str)
+
+    def get_models_for(self, model_specs: List[Union[str, Dict, ModelSpec]]) -> List[Model]:
+        """
+        :param model_specs: the model specs of a run; the same spec given twice results in the same model instance
+        :return: the loaded models in the order of the model specs
+        """
+        model_specs = [unify_model_spec(model_spec) for model_spec in model_specs]
+        keys = [self._key_for(model_spec) for model_spec in model_specs]
+        for key in [key for key in self._models if key not in keys]:
+            self.evict(key)
+        models = []
+        for key, model_spec in zip(keys, model_specs):
+            if model_spec.is_human() or model_spec.is_programmatic():  # nothing to load
+                models.append(get_model_for(model_spec))
+                continue
+            if key not in self._models:
+                self._models[key] = get_model_for(model_spec)
+            else:
+                logger.info(f"Re-using loaded model: {model_spec.model_name}")
+            models.append(self._models[key])
+        return models
+
+    def evict(self, key: str):
+        model = self._models.pop(key)
+        logger.info(f"Releasing model: {model.get_name()}")
+        model.close()
+        del model
+        gc.collect()
+        if "torch" in sys.modules:  # only local backends import torch
+            torch = sys.modules["torch"]
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self):
+        """ Release all pooled models """
+        for key in list(self._models):
+            self.evict(key)
+
+    def __len__(self):
+        return len(self._models)
+
+
+# process-wide pool used by clemgame.benchmark.run()
+model_pool = ModelPool()
+
+
 class ContextExceededError(Exception):
     """
     Exception to be raised when the messages passed to a backend instance exceed the context limit of the model.
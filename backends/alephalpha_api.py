@@ -1,11 +1,10 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 
 import aleph_alpha_client
 import anthropic
 import backends
 from backends import ModelSpec, Model
-from backends.utils import ensure_messages_format
+from backends.utils import ensure_messages_format, retry, HTTP_DEFAULTS
 
 logger = backends.get_logger(__name__)
 
@@ -16,7 +15,10 @@ class AlephAlpha(backends.Backend):
 
     def __init__(self):
         creds = backends.load_credentials(NAME)
-        self.client = aleph_alpha_client.Client(creds[NAME]["api_key"])
+        # the aleph alpha client keeps its own (requests) session, which only takes the timeout
+        http_settings = {**HTTP_DEFAULTS, **creds[NAME].get("http", {})}
+        self.client = aleph_alpha_client.Client(creds[NAME]["api_key"],
+                                                request_timeout_seconds=http_settings["timeout"])
 
     def get_model_for(self, model_spec: ModelSpec) -> Model:
         return AlephAlphaModel(self.client, model_spec)
@@ -1,13 +1,11 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 import anthropic
 import backends
 import json
-import base64
-import httpx
-import imghdr
 
-from backends.utils import ensure_messages_format
+from backends import image_cache
+from backends.utils import ensure_messages_format, retry, async_retry, get_http_client, get_async_http_client, \
+    EventLoopLocal
 
 logger = backends.get_logger(__name__)
 
@@ -17,26 +15,28 @@ NAME = "anthropic"
 class Anthropic(backends.Backend):
     def __init__(self):
         creds = backends.load_credentials(NAME)
-        self.client = anthropic.Anthropic(api_key=creds[NAME]["api_key"])
+        http_settings = creds[NAME].get("http")
+        self.client = anthropic.Anthropic(api_key=creds[NAME]["api_key"],
+                                          http_client=get_http_client(NAME, http_settings))
+        # the async clients are bound to the event loop they are used in
+        self.async_client = EventLoopLocal(
+            lambda: anthropic.AsyncAnthropic(api_key=creds[NAME]["api_key"],
+                                             http_client=get_async_http_client(NAME, http_settings)))
 
     def get_model_for(self, model_spec: backends.ModelSpec) -> backends.Model:
-        return AnthropicModel(self.client, model_spec)
+        return AnthropicModel(self.client, model_spec, async_client=self.async_client)
 
 
 class AnthropicModel(backends.Model):
-    def __init__(self, client: anthropic.Client, model_spec: backends.ModelSpec):
+    def __init__(self, client: anthropic.Client, model_spec: backends.ModelSpec,
+                 async_client: EventLoopLocal = None):
         super().__init__(model_spec)
         self.client = client
+        self.async_client = async_client
 
     def encode_image(self, image_path):
-        if image_path.startswith('http'):
-            image_bytes = httpx.get(image_path).content
-        else:
-            with open(image_path, "rb") as image_file:
-                image_bytes = image_file.read()
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        image_type = imghdr.what(None, image_bytes)
-        return image_data, "image/"+str(image_type)
+        # the images of the whole history are sent on each turn, so that the encoded images are cached
+        return image_cache.load_base64(image_path)
 
     def encode_messages(self, messages):
         encoded_messages = []
@@ -111,3 +111,28 @@ class AnthropicModel(backends.Model):
         response_text = completion.content[0].text
 
         return prompt, response, response_text
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        if self.async_client is None:
+            return await super().agenerate_response(messages)
+        return await self._agenerate_response(messages)
+
+    @async_retry(tries=3, delay=0, logger=logger)
+    @ensure_messages_format
+    async def _agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        """ Same as generate_response, but awaits the asynchronous client """
+        prompt, system_message = self.encode_messages(messages)
+
+        completion = await self.async_client.get().messages.create(
+            messages=prompt,
+            system=system_message,
+            model=self.model_spec.model_id,
+            temperature=self.get_temperature(),
+            max_tokens=self.get_max_tokens()
+        )
+
+        json_output = completion.model_dump_json()
+        response = json.loads(json_output)
+        response_text = completion.content[0].text
+
+        return prompt, response, response_text
@@ -1,8 +1,7 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 import cohere
 import backends
-from backends.utils import ensure_messages_format
+from backends.utils import ensure_messages_format, retry, HTTP_DEFAULTS
 import json
 
 logger = backends.get_logger(__name__)
@@ -14,7 +13,9 @@ class Cohere(backends.Backend):
 
     def __init__(self):
         creds = backends.load_credentials(NAME)
-        self.client = cohere.Client(creds[NAME]["api_key"])
+        # the cohere client keeps its own (requests) session, which only takes the timeout
+        http_settings = {**HTTP_DEFAULTS, **creds[NAME].get("http", {})}
+        self.client = cohere.Client(creds[NAME]["api_key"], timeout=http_settings["timeout"])
 
     def get_model_for(self, model_spec: backends.ModelSpec) -> backends.Model:
         return CohereModel(self.client, model_spec)
@@ -1,19 +1,20 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 import google.generativeai as genai
 import backends
-from backends.utils import ensure_messages_format
+from backends import image_cache
+from backends.utils import ensure_messages_format, retry, get_http_client
 import os
-import requests
+import httpx
 import uuid
 import tempfile
-import imghdr
 import time
 
 logger = backends.get_logger(__name__)
 
 NAME = "google"
 
+UPLOADED_FILE = "gemini_file"  # the kind of the image cache entries of the files uploaded to Gemini
+
 
 class Google(backends.Backend):
 
@@ -41,7 +42,7 @@ class GoogleModel(backends.Model):
 
         try:
             # Send a GET request to the URL
-            response = requests.get(image_url)
+            response = get_http_client(image_cache.IMAGES_HTTP_CLIENT).get(image_url)
             response.raise_for_status()
 
             # Generate a unique file name
@@ -53,7 +54,7 @@ class GoogleModel(backends.Model):
                 file.write(response.content)
             return file_path
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Failed to download {image_url}: {e}")
             return None
 
@@ -65,16 +66,21 @@ class GoogleModel(backends.Model):
         file_url = genai.upload_file(file_path, mime_type=mime_type)
         return file_url
 
+    def _upload_image(self, image_path):
+        if image_path.startswith('http'):
+            image_path = self.download_image(image_path)
+
+        with open(image_path, 'rb') as image_file:
+            image_type = image_cache.image_type(image_file.read(12))
+        # upload to Gemini server
+        return self.upload_file(image_path, 'image/'+image_type)
+
     def encode_images(self, images):
         image_parts = []
 
         for image_path in images:
-            if image_path.startswith('http'):
-                image_path = self.download_image(image_path)
-
-            image_type = imghdr.what(image_path)
-            # upload to Gemini server
-            file_url = self.upload_file(image_path, 'image/'+image_type)
+            # the images of the whole history are sent on each turn, so that each image is uploaded only once
+            file_url = image_cache.get_image_cache().get(UPLOADED_FILE, image_path, self._upload_image)
             image_parts.append(file_url)
         return image_parts
 
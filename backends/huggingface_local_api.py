@@ -2,21 +2,30 @@
     Backend using HuggingFace transformers models.
     Uses HF tokenizers instruct/chat templates for proper input format per model.
 """
-from typing import List, Dict, Tuple, Any, Union
+import asyncio
+import queue
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Tuple, Any, Union, Optional
 import torch
 import backends
 import re
 
-from transformers import AutoTokenizer, AutoModelForCausalLM, AutoConfig
+from transformers import AutoTokenizer, AutoModelForCausalLM, AutoConfig, DynamicCache
 import copy
 
 from jinja2 import TemplateError
 
-from backends.utils import ensure_alternating_roles
+from backends.utils import ensure_alternating_roles, check_context_size
 
 logger = backends.get_logger(__name__)
 
 FALLBACK_CONTEXT_SIZE = 256
+DEFAULT_MAX_BATCH_WAIT = 0.05  # seconds to wait for more prompts before generating a batch
+# the part of a cached sequence that must be a prefix of the new prompt for the cache entry to be reused
+DEFAULT_MIN_SHARED_FRACTION = 0.8
 
 
 def load_config_and_tokenizer(model_spec: backends.ModelSpec) -> Union[AutoTokenizer, AutoConfig, int]:
@@ -120,6 +129,181 @@ def load_model(model_spec: backends.ModelSpec) -> Any:
     return model
 
 
+class BatchGenerator:
+    """
+    Collects the prompts of concurrently running episodes and generates their continuations with a single
+    model.generate() call on a left-padded batch. The prompts are submitted from any thread (or coroutine via
+    asyncio.wrap_future) and the generation itself happens on a single background thread.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int, max_batch_wait: float = DEFAULT_MAX_BATCH_WAIT):
+        """
+        :param model: the loaded transformers model
+        :param tokenizer: to look up the padding and eos token ids
+        :param max_batch_size: the maximal number of prompts generated together
+        :param max_batch_wait: the maximal number of seconds to wait for more prompts after the first one arrived
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        # generation stops at any of the eos ids of the generation config (an int or a list), finished outputs of a
+        # batch are filled up with padding
+        generation_config = getattr(model, "generation_config", None)
+        self.eos_token_ids = set(_as_token_ids(tokenizer.eos_token_id))
+        self.eos_token_ids.update(_as_token_ids(getattr(generation_config, "eos_token_id", None)))
+        self.stop_token_ids = torch.tensor(sorted(self.eos_token_ids | set(_as_token_ids(tokenizer.pad_token_id))),
+                                           dtype=torch.long)
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="hf-batch-generator", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt_tokens: torch.Tensor, **gen_kwargs) -> Future:
+        """
+        :param prompt_tokens: 1-dimensional tensor of the prompt token ids
+        :param gen_kwargs: passed to model.generate(); only prompts with the same arguments are batched together
+        :return: a future for the 1-dimensional tensor of the prompt and generated token ids (without padding)
+        """
+        future = Future()
+        self._pending.put((prompt_tokens, gen_kwargs, future))
+        return future
+
+    def close(self):
+        """ Stop the background thread after the pending prompts have been generated """
+        self._pending.put(None)
+        self._worker.join()
+
+    def _collect_batch(self) -> List[Tuple[torch.Tensor, Dict, Future]]:
+        batch = [self._pending.get()]  # block until there is something to do
+        deadline = time.monotonic() + self.max_batch_wait
+        while len(batch) < self.max_batch_size and batch[-1] is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        is_closed = False
+        while not is_closed:
+            batch = self._collect_batch()
+            if batch[-1] is None:  # close() has been called
+                is_closed = True
+                batch = batch[:-1]
+            requests_by_gen_args = defaultdict(list)
+            for prompt_tokens, gen_kwargs, future in batch:
+                requests_by_gen_args[tuple(sorted(gen_kwargs.items()))].append((prompt_tokens, future))
+            for gen_args, requests in requests_by_gen_args.items():
+                self._generate(requests, dict(gen_args))
+
+    def _generate(self, requests: List[Tuple[torch.Tensor, Future]], gen_kwargs: Dict):
+        try:
+            logger.info(f"Generating a batch of {len(requests)} prompts")
+            pad_token_id = self.tokenizer.pad_token_id
+            max_length = max(len(prompt_tokens) for prompt_tokens, _ in requests)
+            device = requests[0][0].device
+            input_ids = torch.full((len(requests), max_length), pad_token_id, dtype=torch.long, device=device)
+            attention_mask = torch.zeros((len(requests), max_length), dtype=torch.long, device=device)
+            for idx, (prompt_tokens, _) in enumerate(requests):  # left padding
+                input_ids[idx, max_length - len(prompt_tokens):] = prompt_tokens
+                attention_mask[idx, max_length - len(prompt_tokens):] = 1
+            output_ids = self.model.generate(input_ids, attention_mask=attention_mask,
+                                             pad_token_id=pad_token_id, **gen_kwargs)
+            for idx, (prompt_tokens, future) in enumerate(requests):
+                generated_ids = output_ids[idx, max_length:]
+                # cut the padding after the first eos, as if the prompt had been generated alone
+                stop_positions = torch.isin(generated_ids, self.stop_token_ids.to(generated_ids.device)).nonzero()
+                if len(stop_positions) > 0:
+                    stop_position = stop_positions[0].item()
+                    if generated_ids[stop_position].item() in self.eos_token_ids:
+                        stop_position += 1  # keep the eos itself
+                    generated_ids = generated_ids[:stop_position]
+                future.set_result(torch.cat([prompt_tokens, generated_ids]))
+        except Exception as e:  # let the waiting players handle the exception
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def _as_token_ids(token_ids: Union[int, List[int], None]) -> List[int]:
+    if token_ids is None:
+        return []
+    if isinstance(token_ids, int):
+        return [token_ids]
+    return list(token_ids)
+
+
+class PrefixCache:
+    """
+    Keeps the key/value cache of recent generations, so that the next turn of a dialogue only needs to prefill the
+    tokens that have been added to the context since. Entries are looked up by their token ids: an entry is reused
+    for the longest prefix it shares with the new prompt, if that covers (nearly) the whole cached sequence. Thus, a
+    changed end of the history (e.g. when ensure_alternating_roles merges the new message into the previous one) only
+    reuses the part of the cache that is still valid, while the entries of other dialogues (e.g. of the other player
+    of a game, which only share the chat template header with the prompt) are left for their next turn.
+    Entries are evicted in least-recently-used order, so the caches of finished episodes are dropped first.
+    """
+
+    def __init__(self, max_entries: int, min_shared_fraction: float = DEFAULT_MIN_SHARED_FRACTION):
+        """
+        :param max_entries: the maximal number of cached dialogues; bounds the (GPU) memory used by the cache
+        :param min_shared_fraction: the part of a cached sequence that must be a prefix of the prompt to reuse it
+        """
+        self.max_entries = max_entries
+        self.min_shared_fraction = min_shared_fraction
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # id -> (token_ids, DynamicCache)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def pop(self, prompt_tokens: torch.Tensor) -> Optional[DynamicCache]:
+        """
+        Remove the entry sharing the longest prefix with the prompt and crop it to the shared prefix. Only entries
+        whose token ids are (nearly, see min_shared_fraction) a prefix of the prompt are considered.
+        The entry is removed, because generate() extends the cache in place.
+        :param prompt_tokens: 1-dimensional tensor of the prompt token ids
+        :return: the key/value cache for a prefix of the prompt or None, if no entry is a prefix of the prompt
+        """
+        with self._lock:
+            best_id, best_length = None, 0
+            for entry_id, (token_ids, _) in self._entries.items():
+                length = _common_prefix_length(token_ids, prompt_tokens)
+                if length > best_length and length >= self.min_shared_fraction * len(token_ids):
+                    best_id, best_length = entry_id, length
+            # at least the last prompt token must be fed to the model to get the next token logits
+            best_length = min(best_length, len(prompt_tokens) - 1)
+            if best_id is None or best_length <= 0:
+                self.misses += 1
+                return None
+            _, past_key_values = self._entries.pop(best_id)
+            self.hits += 1
+        past_key_values.crop(best_length)
+        return past_key_values
+
+    def put(self, token_ids: torch.Tensor, past_key_values: DynamicCache):
+        """
+        :param token_ids: 1-dimensional tensor of the token ids covered by the key/value cache
+        :param past_key_values: as returned by generate()
+        """
+        with self._lock:
+            self._entries[self._next_id] = (token_ids, past_key_values)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _common_prefix_length(a: torch.Tensor, b: torch.Tensor) -> int:
+    length = min(len(a), len(b))
+    mismatches = (a[:length] != b[:length]).nonzero()
+    if len(mismatches) > 0:
+        return mismatches[0].item()
+    return length
+
+
 class HuggingfaceLocal(backends.Backend):
     """
     Model/backend handler class for locally-run Huggingface models.
@@ -157,6 +341,34 @@ class HuggingfaceLocalModel(backends.Model):
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
 
+        # optional batching of the prompts of concurrently running episodes (see GameBenchmark.run(workers=N))
+        self.batch_generator = None
+        if 'max_batch_size' in model_spec and model_spec['max_batch_size'] > 1:
+            max_batch_wait = model_spec['max_batch_wait'] if 'max_batch_wait' in model_spec \
+                else DEFAULT_MAX_BATCH_WAIT
+            self.batch_generator = BatchGenerator(self.model, self.tokenizer,
+                                                  max_batch_size=model_spec['max_batch_size'],
+                                                  max_batch_wait=max_batch_wait)
+        # optional reuse of the key/value cache of the previous turn of a dialogue
+        self.prefix_cache = None
+        if 'prefix_cache_size' in model_spec and model_spec['prefix_cache_size'] > 0:
+            if self.batch_generator is not None:
+                logger.warning(f"{model_spec.model_name}: prefix_cache_size is ignored when max_batch_size is set")
+            elif not getattr(self.model, "_supports_cache_class", False):
+                logger.warning(f"{model_spec.model_name}: prefix_cache_size is ignored, because the model does not "
+                               f"support a DynamicCache")
+            else:
+                self.prefix_cache = PrefixCache(model_spec['prefix_cache_size'])
+        # fast tokenizers must not be used by several threads at the same time
+        self._tokenizer_lock = threading.Lock()
+
+    def close(self):
+        if self.batch_generator is not None:
+            self.batch_generator.close()
+            self.batch_generator = None
+        self.prefix_cache = None
+        del self.model
+
     def generate_response(self, messages: List[Dict],
                           return_full_text: bool = False,
                           log_messages: bool = False) -> Tuple[Any, Any, str]:
@@ -172,6 +384,56 @@ class HuggingfaceLocalModel(backends.Model):
         :param log_messages: If True, raw and cleaned messages passed will be logged.
         :return: the continuation
         """
+        prompt_tokens, prompt_text, prompt = self._prepare_prompt(messages, return_full_text, log_messages)
+
+        gen_kwargs = self._get_gen_kwargs()
+        if self.batch_generator is not None:
+            model_output_ids = self.batch_generator.submit(prompt_tokens[0], **gen_kwargs).result()
+        elif self.prefix_cache is not None:
+            model_output_ids = self._generate_with_prefix_cache(prompt_tokens, gen_kwargs)
+        else:
+            model_output_ids = self.model.generate(prompt_tokens, **gen_kwargs)[0]
+
+        return self._decode_response(model_output_ids, prompt_text, prompt, return_full_text)
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[Any, Any, str]:
+        if self.batch_generator is None:
+            return await super().agenerate_response(messages)
+        prompt_tokens, prompt_text, prompt = self._prepare_prompt(messages)
+        future = self.batch_generator.submit(prompt_tokens[0], **self._get_gen_kwargs())
+        model_output_ids = await asyncio.wrap_future(future)
+        return self._decode_response(model_output_ids, prompt_text, prompt)
+
+    def _generate_with_prefix_cache(self, prompt_tokens: torch.Tensor, gen_kwargs: Dict) -> torch.Tensor:
+        """
+        Generate with the cached keys/values of the longest known prefix of the prompt, so that only the new
+        suffix is prefilled, and cache the keys/values of this generation for the next turn.
+        :param prompt_tokens: 2-dimensional tensor (batch size 1) of the prompt token ids
+        :return: 1-dimensional tensor of the prompt and generated token ids
+        """
+        past_key_values = self.prefix_cache.pop(prompt_tokens[0])
+        if past_key_values is None:
+            past_key_values = DynamicCache()
+        output = self.model.generate(prompt_tokens, past_key_values=past_key_values,
+                                     return_dict_in_generate=True, **gen_kwargs)
+        model_output_ids = output.sequences[0]
+        # the last generated token has not been fed to the model, so it is not covered by the cache
+        cached_length = output.past_key_values.get_seq_length()
+        self.prefix_cache.put(model_output_ids[:cached_length], output.past_key_values)
+        return model_output_ids
+
+    def _get_gen_kwargs(self) -> Dict:
+        # greedy decoding, unless a temperature is given:
+        if self.get_temperature() > 0.0:
+            return dict(max_new_tokens=self.get_max_tokens(), temperature=self.get_temperature(), do_sample=True)
+        return dict(max_new_tokens=self.get_max_tokens(), do_sample=False)
+
+    def _prepare_prompt(self, messages: List[Dict], return_full_text: bool = False,
+                        log_messages: bool = False) -> Tuple[torch.Tensor, str, Dict]:
+        """
+        Apply the chat template to the messages and check the context limit.
+        :return: the prompt token ids, the prompt text and the prompt object to log
+        """
         # log current given messages list:
         if log_messages:
             logger.info(f"Raw messages passed: {messages}")
@@ -183,11 +445,12 @@ class HuggingfaceLocalModel(backends.Model):
             logger.info(f"Flattened messages: {current_messages}")
 
         # apply chat template & tokenize:
-        prompt_tokens = self.tokenizer.apply_chat_template(current_messages, add_generation_prompt=True,
-                                                           return_tensors="pt")
-        prompt_tokens = prompt_tokens.to(self.device)
+        with self._tokenizer_lock:
+            prompt_tokens = self.tokenizer.apply_chat_template(current_messages, add_generation_prompt=True,
+                                                               return_tensors="pt")
+            prompt_tokens = prompt_tokens.to(self.device)
 
-        prompt_text = self.tokenizer.batch_decode(prompt_tokens)[0]
+            prompt_text = self.tokenizer.batch_decode(prompt_tokens)[0]
         prompt = {"inputs": prompt_text, "max_new_tokens": self.get_max_tokens(),
                   "temperature": self.get_temperature(), "return_full_text": return_full_text}
 
@@ -201,27 +464,16 @@ class HuggingfaceLocalModel(backends.Model):
             raise backends.ContextExceededError(f"Context token limit for {self.model_spec.model_name} exceeded",
                                                 tokens_used=context_check[1], tokens_left=context_check[2],
                                                 context_size=context_check[3])
+        return prompt_tokens, prompt_text, prompt
 
-        # greedy decoding:
-        do_sample: bool = False
-        if self.get_temperature() > 0.0:
-            do_sample = True
-
-        if do_sample:
-            model_output_ids = self.model.generate(
-                prompt_tokens,
-                temperature=self.get_temperature(),
-                max_new_tokens=self.get_max_tokens(),
-                do_sample=do_sample
-            )
-        else:
-            model_output_ids = self.model.generate(
-                prompt_tokens,
-                max_new_tokens=self.get_max_tokens(),
-                do_sample=do_sample
-            )
-
-        model_output = self.tokenizer.batch_decode(model_output_ids)[0]
+    def _decode_response(self, model_output_ids: torch.Tensor, prompt_text: str, prompt: Dict,
+                         return_full_text: bool = False) -> Tuple[Any, Any, str]:
+        """
+        :param model_output_ids: 1-dimensional tensor of the prompt and generated token ids
+        :return: the prompt, response and response text as returned by generate_response()
+        """
+        with self._tokenizer_lock:
+            model_output = self.tokenizer.decode(model_output_ids)
 
         response = {'response': model_output}
 
@@ -252,11 +504,7 @@ def _check_context_limit(context_size, prompt_tokens, max_new_tokens: int = 100)
             Number of tokens of 'context space left'
             Total context token limit
     """
-    prompt_size = len(prompt_tokens)
-    tokens_used = prompt_size + max_new_tokens  # context includes tokens to be generated
-    tokens_left = context_size - tokens_used
-    fits = tokens_used <= context_size
-    return fits, tokens_used, tokens_left, context_size
+    return check_context_size(context_size, len(prompt_tokens), max_new_tokens)
 
 
 def check_messages(messages: List[Dict], model_spec: backends.ModelSpec) -> bool:
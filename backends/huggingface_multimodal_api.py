@@ -1,11 +1,15 @@
 """
 Backend using HuggingFace transformers for open-weight multimodal models.
 """
-from typing import List, Dict, Tuple, Any
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Tuple, Any, Optional
 import torch
 import backends
+from backends import image_cache
+from backends.utils import check_context_size, TokenCountCache
 from PIL import Image
-import requests
 from transformers import AutoProcessor, AutoModelForVision2Seq, IdeficsForVisionText2Text, AutoConfig
 from jinja2 import Template
 
@@ -18,6 +22,11 @@ MODEL_TYPE_MAP = {
 
 FALLBACK_CONTEXT_SIZE = 256
 
+# the threads that decode the images (shared by the models and the concurrently played episodes)
+IMAGE_LOADER_THREADS = 4
+_image_loader: Optional[ThreadPoolExecutor] = None
+_image_loader_lock = threading.Lock()
+
 logger = backends.get_logger(__name__)
 
 def get_context_limit(model_spec: backends.ModelSpec) -> int:
@@ -55,11 +64,7 @@ def check_context_limit(context_size: int, prompt_tokens: list, max_new_tokens:
             Number of tokens of 'context space left'
             Total context token limit
     """
-    prompt_size = len(prompt_tokens)
-    tokens_used = prompt_size + max_new_tokens  # context includes tokens to be generated
-    tokens_left = context_size - tokens_used
-    fits = tokens_used <= context_size
-    return fits, tokens_used, tokens_left, context_size
+    return check_context_size(context_size, len(prompt_tokens), max_new_tokens)
 
 
 def load_processor(model_spec: backends.ModelSpec) -> AutoProcessor:
@@ -106,30 +111,62 @@ def load_model(model_spec: backends.ModelSpec):
     return model
 
 
+def _decode_image(image: str):
+    if image.startswith('http') or image.startswith('https'):
+        image = Image.open(io.BytesIO(image_cache.read_image_bytes(image))).convert('RGB')
+    else:
+        image = Image.open(image).convert('RGB')
+
+    return image
+
+
 def load_image(image: str):
     """
-    Load an image based on a given local path or URL
+    Load an image based on a given local path or URL. The images of the whole history are passed on each turn,
+    so that the decoded images are cached (and must not be modified).
 
     :param image: Image path/url
     :return loaded_image: PIL Image
     """
+    return image_cache.get_image_cache().get(image_cache.RGB, image, _decode_image)
 
-    if image.startswith('http') or image.startswith('https'):
-        image = Image.open(requests.get(image, stream=True).raw).convert('RGB')
-    else:
-        image = Image.open(image).convert('RGB')
 
-    return image
+def _get_image_loader() -> ThreadPoolExecutor:
+    global _image_loader
+    with _image_loader_lock:
+        if _image_loader is None:
+            _image_loader = ThreadPoolExecutor(max_workers=IMAGE_LOADER_THREADS, thread_name_prefix="image_loader")
+        return _image_loader
 
 
-def get_images(messages: list[Dict]) -> list:
+def prefetch_images(images: List[str]) -> List[Future]:
     """
-    Return loaded images from messages
+    Start loading the images in the background (PIL releases the GIL while decoding), so that the images are decoded
+    in parallel to each other and to the caller.
+
+    :param images: Image paths/urls
+    :return: the futures of the loaded images, in the same order
+    """
+    image_loader = _get_image_loader()
+    return [image_loader.submit(load_image, image) for image in images]
+
+
+def load_images(images: List[str]) -> list:
+    """
+    Load the images in parallel.
+
+    :param images: Image paths/urls
+    :return: the PIL Images, in the same order
+    """
+    return [future.result() for future in prefetch_images(images)]
+
+
+def get_image_paths(messages: list[Dict]) -> List[str]:
+    """
+    Return the image links/file locations mentioned in the messages
 
     :param messages: A list of messages passed to the model
-    :return images: A list of PIL Image objects.
     """
-    # Collect image links/file locations mentioned in messages
     images = []
     for message in messages:
         if 'image' in message:
@@ -138,19 +175,24 @@ def get_images(messages: list[Dict]) -> list:
                     images.append(img)
             else:
                 images.append(message['image'])
+    return images
+
+
+def get_images(messages: list[Dict]) -> list:
+    """
+    Return loaded images from messages
+
+    :param messages: A list of messages passed to the model
+    :return images: A list of PIL Image objects.
+    """
+    images = get_image_paths(messages)
 
     # Return None if no image is passed
     # Use AutoTokenizer to generate output and not AutoProcessor, as only text is passed.
     if not images:
         return None
 
-    # Load Images
-    loaded_images = []
-    for img in images:
-        image = load_image(img)
-        loaded_images.append(image)
-
-    return loaded_images
+    return load_images(images)
 
 
 # Separate Input and Output generation for Idefics
@@ -174,9 +216,7 @@ def generate_idefics_input(messages: list[Dict]):
             idefics_text += 'User: ' + m['content']
             if 'image' in m.keys():
                 if type(m['image']) == list:  # Check if multiple images are passed, append accordingly
-                    for im in m['image']:
-                        loaded_im = load_image(im)
-                        idefics_input.append(loaded_im)
+                    idefics_input.extend(load_images(m['image']))
                 else:
                     idefics_input.append(m['image'])
             idefics_input.append('<end_of_utterance>')
@@ -258,11 +298,14 @@ class HuggingfaceMultimodalModel(backends.Model):
         # Type cast model_spec to a Dictionary, for cleaner loading of variables
         model_spec_dict = vars(model_spec)
         # Load model specific instance variables
-        self.template = model_spec_dict.get('custom_chat_template', None)
+        template_str = model_spec_dict.get('custom_chat_template', None)
+        self.template = Template(template_str) if template_str else None  # compiled once
         self.cull = model_spec_dict.get('eos_to_cull', None)
         self.supports_multiple_images = model_spec_dict.get('supports_multiple_images', False)
         self.padding = model_spec_dict.get('padding', False)
         self.idefics = 'idefics' in model_spec['model_name']
+        # the prompt of each turn extends the prompt of the previous turn, so that only the new text is tokenized
+        self.token_counts = TokenCountCache(self.processor.tokenizer.tokenize)
 
     def generate_response(self, messages: List[Dict]) -> Tuple[Any, Any, str]:
         """
@@ -282,20 +325,21 @@ class HuggingfaceMultimodalModel(backends.Model):
             print(f"Multiple images not supported in a single turn for model {self.model_name}")
             return "", {"response": ""}, ""
 
+        # Start decoding the images, while the prompt is prepared and checked
+        pending_images = prefetch_images(get_image_paths(messages))
+
         prompt_text = ""
         # Get input prompt by applying jinja template, if template is provided
         if self.template:
-            template_str = self.template
-            template = Template(template_str)
-            prompt_text = template.render(messages=messages)
+            prompt_text = self.template.render(messages=messages)
 
         # Get input prompt if model is of type IdeficsForVisionText2Text
         if self.idefics:
             _, prompt_text = generate_idefics_input(messages=messages)
 
         # Check context limit
-        prompt_tokens = self.processor.tokenizer.tokenize(prompt_text)
-        context_check = check_context_limit(self.context_size, prompt_tokens, max_new_tokens=self.get_max_tokens())
+        context_check = check_context_size(self.context_size, self.token_counts.count(prompt_text),
+                                           max_new_tokens=self.get_max_tokens())
         if not context_check[0]:  # if context is exceeded, context_check[0] is False
             logger.info(f"Context token limit for {self.model_spec.model_name} exceeded: "
                         f"{context_check[1]}/{context_check[3]}")
@@ -305,7 +349,7 @@ class HuggingfaceMultimodalModel(backends.Model):
                                                 context_size=context_check[3])
 
         # Get a list of images [as input to the Processor]
-        images = get_images(messages)
+        images = [future.result() for future in pending_images] or None
 
         # Generate the output
         if self.idefics:
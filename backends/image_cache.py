@@ -0,0 +1,204 @@
+"""
+    Process-wide cache of loaded images for the multimodal backends. The games send the images of the whole dialogue
+    history with every request, so that the same few images are otherwise read, decoded and encoded again and again.
+
+    The entries are keyed by the kind of the entry (e.g. decoded RGB image or base64 data) and the image path with its
+    modification time and size, so that a changed file is loaded again. Images given by URL are keyed by the URL.
+    The least recently used entries are removed when the cache holds more than max_bytes.
+"""
+import base64
+import collections
+import hashlib
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import backends
+from backends.utils import get_http_client
+
+logger = backends.get_logger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+RGB = "rgb"  # decoded PIL images
+BASE64 = "base64"  # (base64 data, mime type) of the image file
+DIGEST = "sha256"  # the hex digest of the image file
+
+IMAGES_HTTP_CLIENT = "images"  # the name of the shared http client that downloads images given by URL
+
+# the signatures at the start of the image files (instead of imghdr, which is removed in Python 3.13)
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"MM\x00*", "tiff"),
+    (b"II*\x00", "tiff"),
+]
+
+
+def _is_url(image: str) -> bool:
+    return image.startswith("http")
+
+
+def _source_key(image: str) -> Tuple:
+    if _is_url(image):
+        return image,
+    try:
+        stat = os.stat(image)
+    except OSError:  # the loader raises the error
+        return image,
+    return os.path.abspath(image), stat.st_mtime_ns, stat.st_size
+
+
+def _size_of(value: Any) -> int:
+    """
+    :return: the approximate memory used by a cached value in bytes
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_size_of(item) for item in value)
+    if hasattr(value, "getbands"):  # PIL image
+        return value.width * value.height * len(value.getbands())
+    if hasattr(value, "nbytes"):  # numpy array or tensor
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class ImageCache:
+    """
+    Memory-bounded LRU cache of loaded images. Safe to use from several threads. The cached values are shared and
+    must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param max_bytes: the maximal (approximate) memory of the cached values
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self._entries: collections.OrderedDict = collections.OrderedDict()  # key -> (value, size)
+        self._loading: Dict[Tuple, threading.Event] = dict()  # the keys that are being loaded
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, image: str, load: Callable[[str], Any]) -> Any:
+        """
+        :param kind: the kind of the value, e.g. RGB; different kinds of the same image are cached separately
+        :param image: the path or URL of the image
+        :param load: returns the value for the image, when it is not cached
+        :return: the cached or loaded value
+        """
+        key = (kind,) + _source_key(image)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits[kind] += 1
+                    return self._entries[key][0]
+                loading = self._loading.get(key)
+                if loading is None:  # this thread loads the image
+                    self.misses[kind] += 1
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()  # another thread loads the image (e.g. prefetched), so wait for it
+        try:
+            value = load(image)  # not under the lock, so that other threads are not blocked while loading
+            size = _size_of(value)
+            with self._lock:
+                if key not in self._entries and size <= self.max_bytes:
+                    self._entries[key] = (value, size)
+                    self.bytes += size
+                    while self.bytes > self.max_bytes:
+                        _, (_, evicted_size) = self._entries.popitem(last=False)
+                        self.bytes -= evicted_size
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": sum(self.hits.values()),
+                "misses": sum(self.misses.values())
+            }
+            for kind in kinds:
+                requests = self.hits[kind] + self.misses[kind]
+                stats[f"{kind}_hit_rate"] = self.hits[kind] / requests
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / requests if requests else 0.0
+        return stats
+
+
+_image_cache = ImageCache()  # shared by the backends of this process
+
+
+def get_image_cache() -> ImageCache:
+    return _image_cache
+
+
+def read_image_bytes(image: str) -> bytes:
+    """
+    :param image: the path or URL of the image
+    :return: the content of the image file
+    """
+    if _is_url(image):
+        return get_http_client(IMAGES_HTTP_CLIENT).get(image).content
+    with open(image, "rb") as image_file:
+        return image_file.read()
+
+
+def image_type(image_bytes: bytes) -> Optional[str]:
+    """
+    :param image_bytes: the content (or at least the first 12 bytes) of an image file
+    :return: the type of the image, e.g. 'png' or 'jpeg', or None if it is not known
+    """
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "webp"
+    for signature, type_name in IMAGE_SIGNATURES:
+        if image_bytes.startswith(signature):
+            return type_name
+    return None
+
+
+def _encode_base64(image: str) -> Tuple[str, str]:
+    image_bytes = read_image_bytes(image)
+    return base64.b64encode(image_bytes).decode("utf-8"), "image/" + str(image_type(image_bytes))
+
+
+def _digest(image: str) -> str:
+    return hashlib.sha256(read_image_bytes(image)).hexdigest()
+
+
+def image_digest(image: str) -> str:
+    """
+    :param image: the path or URL of the image
+    :return: the (cached) SHA-256 hex digest of the content of the image file
+    """
+    return _image_cache.get(DIGEST, image, _digest)
+
+
+def load_base64(image: str) -> Tuple[str, str]:
+    """
+    :param image: the path or URL of the image
+    :return: the (cached) base64 encoded image and its mime type, e.g. 'image/png'
+    """
+    return _image_cache.get(BASE64, image, _encode_base64)
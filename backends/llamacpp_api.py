@@ -154,6 +154,10 @@ class LlamaCPPLocalModel(backends.Model):
         # get context size from model instance:
         self.context_size = self.model._n_ctx
 
+    def close(self):
+        # llama.cpp frees the model memory when the Llama instance is garbage collected
+        del self.model
+
     def generate_response(self, messages: List[Dict], return_full_text: bool = False) -> Tuple[Any, Any, str]:
         """
         :param messages: for example
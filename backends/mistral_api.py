@@ -1,10 +1,10 @@
 from mistralai.client import MistralClient
+from mistralai.async_client import MistralAsyncClient
 from mistralai.models.chat_completion import ChatMessage
 from typing import List, Dict, Tuple, Any
-from retry import retry
 import json
 import backends
-from backends.utils import ensure_messages_format
+from backends.utils import ensure_messages_format, retry, async_retry, HTTP_DEFAULTS, EventLoopLocal
 
 logger = backends.get_logger(__name__)
 
@@ -15,7 +15,13 @@ class Mistral(backends.Backend):
 
     def __init__(self):
         creds = backends.load_credentials(NAME)
-        self.client = MistralClient(api_key=creds[NAME]["api_key"])
+        # the mistral clients keep their own connection pools, which only take these settings
+        http_settings = {**HTTP_DEFAULTS, **creds[NAME].get("http", {})}
+        self.client = MistralClient(api_key=creds[NAME]["api_key"], timeout=http_settings["timeout"])
+        # the async clients are bound to the event loop they are used in
+        self.async_client = EventLoopLocal(
+            lambda: MistralAsyncClient(api_key=creds[NAME]["api_key"], timeout=http_settings["timeout"],
+                                       max_concurrent_requests=http_settings["max_connections"]))
 
     def list_models(self):
         models = self.client.models.list()
@@ -24,14 +30,16 @@ class Mistral(backends.Backend):
         return names
 
     def get_model_for(self, model_spec: backends.ModelSpec) -> backends.Model:
-        return MistralModel(self.client, model_spec)
+        return MistralModel(self.client, model_spec, async_client=self.async_client)
 
 
 class MistralModel(backends.Model):
 
-    def __init__(self, client: MistralClient, model_spec: backends.ModelSpec):
+    def __init__(self, client: MistralClient, model_spec: backends.ModelSpec,
+                 async_client: EventLoopLocal = None):
         super().__init__(model_spec)
         self.client = client
+        self.async_client = async_client
 
     @retry(tries=3, delay=0, logger=logger)
     @ensure_messages_format
@@ -54,10 +62,35 @@ class MistralModel(backends.Model):
                                         messages=prompt,
                                         temperature=self.get_temperature(),
                                         max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return messages, response, response_text
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        if self.async_client is None:
+            return await super().agenerate_response(messages)
+        return await self._agenerate_response(messages)
+
+    @async_retry(tries=3, delay=0, logger=logger)
+    @ensure_messages_format
+    async def _agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        """ Same as generate_response, but awaits the asynchronous client """
+        prompt = []
+        for m in messages:
+            prompt.append(ChatMessage(role=m['role'], content=m['content']))
+        api_response = await self.async_client.get().chat(model=self.model_spec.model_id,
+                                                          messages=prompt,
+                                                          temperature=self.get_temperature(),
+                                                          max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return messages, response, response_text
+
+    @staticmethod
+    def parse_api_response(api_response) -> Tuple[Dict, str]:
         message = api_response.choices[0].message
         if message.role != "assistant":  # safety check
             raise AttributeError("Response message role is " + message.role + " but should be 'assistant'")
         response_text = message.content.strip()
         response = json.loads(api_response.model_dump_json())
-
-        return messages, response, response_text
+        return response, response_text
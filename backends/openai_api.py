@@ -1,13 +1,11 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 
 import json
 import openai
 import backends
-from backends.utils import ensure_messages_format
-import base64
-import imghdr
-import httpx
+from backends import image_cache
+from backends.utils import ensure_messages_format, retry, async_retry, get_http_client, get_async_http_client, \
+    EventLoopLocal
 
 logger = backends.get_logger(__name__)
 
@@ -20,7 +18,13 @@ class OpenAI(backends.Backend):
         creds = backends.load_credentials(NAME)
         api_key = creds[NAME]["api_key"]
         organization = creds[NAME]["organisation"] if "organisation" in creds[NAME] else None
-        self.client = openai.OpenAI(api_key=api_key, organization=organization)
+        http_settings = creds[NAME].get("http")
+        self.client = openai.OpenAI(api_key=api_key, organization=organization,
+                                    http_client=get_http_client(NAME, http_settings))
+        # the async clients are bound to the event loop they are used in
+        self.async_client = EventLoopLocal(
+            lambda: openai.AsyncOpenAI(api_key=api_key, organization=organization,
+                                       http_client=get_async_http_client(NAME, http_settings)))
 
     def list_models(self):
         models = self.client.models.list()
@@ -30,23 +34,22 @@ class OpenAI(backends.Backend):
         # [print(n) for n in names]   # 2024-01-10: what was this? a side effect-only method?
 
     def get_model_for(self, model_spec: backends.ModelSpec) -> backends.Model:
-        return OpenAIModel(self.client, model_spec)
+        return OpenAIModel(self.client, model_spec, async_client=self.async_client)
 
 
 class OpenAIModel(backends.Model):
 
-    def __init__(self, client: openai.OpenAI, model_spec: backends.ModelSpec):
+    def __init__(self, client: openai.OpenAI, model_spec: backends.ModelSpec, async_client: EventLoopLocal = None):
         super().__init__(model_spec)
         self.client = client
+        self.async_client = async_client
 
     def encode_image(self, image_path):
-        if image_path.startswith('http'):
-            image_bytes = httpx.get(image_path).content
-            image_type = imghdr.what(None, image_bytes)
-            return True, image_path, image_type
-        with open(image_path, "rb") as image_file:
-            image_type = imghdr.what(image_path)
-            return False, base64.b64encode(image_file.read()).decode('utf-8'), 'image/'+str(image_type)
+        if image_path.startswith('http'):  # the url is passed on as it is
+            return True, image_path, None
+        # the images of the whole history are sent on each turn, so that the encoded images are cached
+        image_data, image_type = image_cache.load_base64(image_path)
+        return False, image_data, image_type
 
     def encode_messages(self, messages):
         encoded_messages = []
@@ -100,10 +103,34 @@ class OpenAIModel(backends.Model):
                                                            messages=prompt,
                                                            temperature=self.get_temperature(),
                                                            max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return prompt, response, response_text
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        if self.async_client is None:
+            return await super().agenerate_response(messages)
+        return await self._agenerate_response(messages)
+
+    @async_retry(tries=3, delay=0, logger=logger)
+    @ensure_messages_format
+    async def _agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        """ Same as generate_response, but awaits the asynchronous client """
+        prompt = self.encode_messages(messages)
+
+        api_response = await self.async_client.get().chat.completions.create(model=self.model_spec.model_id,
+                                                                             messages=prompt,
+                                                                             temperature=self.get_temperature(),
+                                                                             max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return prompt, response, response_text
+
+    @staticmethod
+    def parse_api_response(api_response) -> Tuple[Dict, str]:
         message = api_response.choices[0].message
         if message.role != "assistant":  # safety check
             raise AttributeError("Response message role is " + message.role + " but should be 'assistant'")
         response_text = message.content.strip()
         response = json.loads(api_response.json())
-
-        return prompt, response, response_text
+        return response, response_text
@@ -1,12 +1,11 @@
 from typing import List, Dict, Tuple, Any
-from retry import retry
 
 import json
 import openai
 import backends
-import httpx
 
-from backends.utils import ensure_messages_format
+from backends.utils import ensure_messages_format, retry, async_retry, get_http_client, get_async_http_client, \
+    EventLoopLocal
 
 logger = backends.get_logger(__name__)
 
@@ -23,8 +22,14 @@ class GenericOpenAI(backends.Backend):
             ### TO BE REVISED!!! (Famous last words...)
             ### The line below is needed because of
             ### issues with the certificates on our GPU server.
-            http_client=httpx.Client(verify=False)
+            http_client=get_http_client(NAME, creds[NAME].get("http"), verify=False)
         )
+        # the async clients are bound to the event loop they are used in
+        self.async_client = EventLoopLocal(lambda: openai.AsyncOpenAI(
+            base_url=creds[NAME]["base_url"],
+            api_key=creds[NAME]["api_key"],
+            http_client=get_async_http_client(NAME, creds[NAME].get("http"), verify=False)
+        ))
 
     def list_models(self):
         models = self.client.models.list()
@@ -33,14 +38,16 @@ class GenericOpenAI(backends.Backend):
         return names
 
     def get_model_for(self, model_spec: backends.ModelSpec) -> backends.Model:
-        return GenericOpenAIModel(self.client, model_spec)
+        return GenericOpenAIModel(self.client, model_spec, async_client=self.async_client)
 
 
 class GenericOpenAIModel(backends.Model):
 
-    def __init__(self, client: openai.OpenAI, model_spec: backends.ModelSpec):
+    def __init__(self, client: openai.OpenAI, model_spec: backends.ModelSpec,
+                 async_client: EventLoopLocal = None):
         super().__init__(model_spec)
         self.client = client
+        self.async_client = async_client
 
     @retry(tries=3, delay=0, logger=logger)
     @ensure_messages_format
@@ -59,10 +66,33 @@ class GenericOpenAIModel(backends.Model):
         api_response = self.client.chat.completions.create(model=self.model_spec.model_id, messages=prompt,
                                                            temperature=self.get_temperature(),
                                                            max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return prompt, response, response_text
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        if self.async_client is None:
+            return await super().agenerate_response(messages)
+        return await self._agenerate_response(messages)
+
+    @async_retry(tries=3, delay=0, logger=logger)
+    @ensure_messages_format
+    async def _agenerate_response(self, messages: List[Dict]) -> Tuple[str, Any, str]:
+        """ Same as generate_response, but awaits the asynchronous client """
+        prompt = messages
+        api_response = await self.async_client.get().chat.completions.create(model=self.model_spec.model_id,
+                                                                             messages=prompt,
+                                                                             temperature=self.get_temperature(),
+                                                                             max_tokens=self.get_max_tokens())
+        response, response_text = self.parse_api_response(api_response)
+
+        return prompt, response, response_text
+
+    @staticmethod
+    def parse_api_response(api_response) -> Tuple[Dict, str]:
         message = api_response.choices[0].message
         if message.role != "assistant":  # safety check
             raise AttributeError("Response message role is " + message.role + " but should be 'assistant'")
         response_text = message.content.strip()
         response = json.loads(api_response.json())
-
-        return prompt, response, response_text
+        return response, response_text
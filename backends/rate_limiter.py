@@ -0,0 +1,243 @@
+"""
+    Client-side rate limiting of the API backends. Each model (of a backend) gets a RateLimiter that schedules its
+    requests within the request and token budgets per minute given in the model registry (requests_per_minute,
+    tokens_per_minute), and adapts the number of concurrent requests to the rate limit errors (HTTP 429) of the API:
+    the limit is halved on a rate limit error and grows again by one request per limit of successful requests.
+
+    Rate limited requests are retried with exponential backoff and jitter, or after the time given in the Retry-After
+    header of the response. Meanwhile, the other requests of the model are held back as well.
+"""
+import email.utils
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import backends
+
+logger = backends.get_logger(__name__)
+
+# the defaults of the retries of rate limited requests
+RATE_LIMIT_TRIES = 8
+BACKOFF_BASE = 1.
+BACKOFF_MAX = 60.
+
+MAX_RETRY_AFTER = 300.  # longer Retry-After values are not honoured
+MIN_DECREASE_INTERVAL = 1.  # 429s of the requests in flight at the same time only halve the concurrency once
+POLL_INTERVAL = 0.05  # to check again for a free slot when the concurrency limit is reached
+
+CHARS_PER_TOKEN = 4  # to estimate the prompt tokens of a request before it is sent
+
+
+class TokenBucket:
+    """
+    A budget per minute that is refilled continuously, and can be used up at once (a burst) when it is full.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.
+        self.level = self.capacity
+        self.last_update = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.last_update) * self.rate)
+        self.last_update = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        :return: the seconds until the amount is available (after refill())
+        """
+        amount = min(amount, self.capacity)  # requests larger than the budget are only delayed until it is full
+        if self.level >= amount:
+            return 0.
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Schedules the requests of a model. Safe to use from several threads and from coroutines (which do not block
+    the event loop while waiting, see try_acquire()).
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_concurrency: int = None):
+        """
+        :param requests_per_minute: the budget of requests, unlimited if None
+        :param tokens_per_minute: the budget of (prompt and completion) tokens, unlimited if None
+        :param max_concurrency: the maximal number of requests in flight, unlimited if None (until a rate limit error)
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit: float = max_concurrency or math.inf
+        self.in_flight = 0
+        self.paused_until = 0.
+        self.rate_limited = 0  # the number of rate limit errors
+        self._last_decrease = 0.
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        Take a slot for a request, if the budgets and the concurrency limit allow it.
+
+        :param tokens: the estimated tokens of the request
+        :return: 0 if the slot has been taken, otherwise the seconds to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self.paused_until - now
+            if self.in_flight >= self.concurrency_limit:
+                wait = max(wait, POLL_INTERVAL)
+            for bucket, amount in [(self.requests, 1), (self.tokens, tokens)]:
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amount))
+            if wait > 0:
+                return wait
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= tokens
+            self.in_flight += 1
+            return 0.
+
+    def acquire(self, tokens: int = 0):
+        """
+        Wait for a slot for a request.
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def release(self, tokens: int = 0, used_tokens: Optional[int] = None):
+        """
+        Give the slot of a finished request back.
+
+        :param tokens: the estimated tokens the slot has been taken with
+        :param used_tokens: the tokens actually used by the request (if known), to correct the budget
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if self.tokens is not None and used_tokens is not None:
+                self.tokens.level += tokens - used_tokens
+
+    def on_success(self):
+        """
+        Additive increase of the concurrency limit after a successful request.
+        """
+        with self._lock:
+            if math.isinf(self.concurrency_limit):
+                return
+            self.concurrency_limit += 1. / self.concurrency_limit
+            if self.max_concurrency is not None:
+                self.concurrency_limit = min(self.concurrency_limit, self.max_concurrency)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        Multiplicative decrease of the concurrency limit after a rate limit error, and pause all requests for the time
+        given by the API (if any).
+
+        :param retry_after: the seconds to wait according to the Retry-After header of the response
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            if now - self._last_decrease >= MIN_DECREASE_INTERVAL:
+                limit = min(self.concurrency_limit, self.in_flight + 1)  # including the request that failed
+                self.concurrency_limit = max(1., math.floor(limit / 2))
+                self._last_decrease = now
+                logger.info("Rate limited, reduced the concurrent requests to %s", int(self.concurrency_limit))
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate_limited": self.rate_limited,
+                "concurrency_limit": None if math.isinf(self.concurrency_limit) else int(self.concurrency_limit),
+                "in_flight": self.in_flight
+            }
+
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = dict()  # (backend, model id) -> shared by the model instances
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_spec: backends.ModelSpec) -> RateLimiter:
+    """
+    :param model_spec: with the (optional) requests_per_minute, tokens_per_minute and max_concurrency of the model
+    :return: the rate limiter of the model, shared by all its instances in this process
+    """
+    model_id = model_spec["model_id"] if "model_id" in model_spec else model_spec.model_name
+    key = (model_spec["backend"] if "backend" in model_spec else None, model_id)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(
+                requests_per_minute=model_spec["requests_per_minute"] if "requests_per_minute" in model_spec else None,
+                tokens_per_minute=model_spec["tokens_per_minute"] if "tokens_per_minute" in model_spec else None,
+                max_concurrency=model_spec["max_concurrency"] if "max_concurrency" in model_spec else None)
+        return _rate_limiters[key]
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: Optional[int]) -> int:
+    """
+    :return: a rough estimate of the tokens of a request: the prompt characters / 4 and the maximal completion tokens
+    """
+    characters = sum(len(str(message.get("content", ""))) for message in messages if isinstance(message, dict))
+    return characters // CHARS_PER_TOKEN + (max_tokens or 0)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attribute in ["status_code", "http_status", "code"]:  # openai and anthropic, mistral and cohere, google
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return int(status)
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return int(status) if isinstance(status, int) else None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    :return: True if the API rejected the request because of its rate limits (HTTP 429)
+    """
+    return _status_code(error) == 429 or type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def _headers_of(error: Exception) -> Dict:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(error, "headers", None)
+    return {str(name).lower(): value for name, value in headers.items()} if headers else dict()
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    :return: the seconds to wait according to the Retry-After (or retry-after-ms) header of the error response
+    """
+    headers = _headers_of(error)
+    try:
+        if "retry-after-ms" in headers:
+            return min(float(headers["retry-after-ms"]) / 1000., MAX_RETRY_AFTER)
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                seconds = float(value)
+            except ValueError:  # an HTTP date
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            return min(max(seconds, 0.), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        logger.warning("Invalid retry after header: %s", headers)
+    return None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, max_delay: float = BACKOFF_MAX) -> float:
+    """
+    :param attempt: the number of the failed attempts so far (from 1)
+    :return: the seconds to wait before the next attempt: exponential backoff with full jitter
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** (attempt - 1)))
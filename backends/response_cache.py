@@ -0,0 +1,231 @@
+"""
+    Persistent cache for model responses, so that re-running a benchmark (e.g. after a crash) does not re-issue
+    identical requests. Only deterministic (temperature 0) generations are cached.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Tuple, Any, Optional
+
+import backends
+from backends import image_cache, telemetry
+
+logger = backends.get_logger(__name__)
+
+CACHE_FILE_NAME = "response_cache.sqlite"
+CACHE_EXPORT_FILE_NAME = "response_cache.jsonl"  # the default file of cache export and import
+
+# the entries of the model spec that change the generated responses; other entries (e.g. requests_per_minute, the
+# release_date or the http settings) can be changed without invalidating the cached responses
+GENERATION_SPEC_KEYS = ["model_name", "backend", "model_id", "huggingface_id", "filename", "model_type",
+                        "premade_chat_template", "custom_chat_template", "eos_to_cull", "bos_string", "eos_string",
+                        "output_split_prefix", "padding", "slow_tokenizer", "not_fast"]
+
+
+def _with_image_digests(messages: List[Dict]) -> List[Dict]:
+    """
+    :return: the messages with the digests of the image contents instead of the image paths or URLs
+    """
+    keyed_messages = []
+    for message in messages:
+        if isinstance(message, dict) and message.get("image"):
+            images = [message["image"]] if isinstance(message["image"], str) else message["image"]
+            digests = []
+            for image in images:
+                try:
+                    digests.append(image_cache.image_digest(image))
+                except Exception:  # e.g. a missing file, the model reports it
+                    digests.append(image)
+            message = {**message, "image": digests}
+        keyed_messages.append(message)
+    return keyed_messages
+
+
+def cache_key(model_spec: backends.ModelSpec, temperature: float, max_tokens: int, messages: List[Dict]) -> str:
+    """
+    A stable hash for a request, independent of the order of the keys in the model spec and messages. Only the
+    entries of the model spec that change the responses are hashed (see GENERATION_SPEC_KEYS). The messages are
+    hashed as given, with the contents of their images, so that requests which only differ in the images do not
+    share a key, and a changed image file is not answered with the response to the previous one.
+    :param model_spec: of the model that is asked
+    :param temperature: the sampling temperature
+    :param max_tokens: the maximal number of tokens to generate
+    :param messages: the dialogue context as passed to generate_response()
+    :return: the hex digest of the request
+    """
+    request = {
+        "model_spec": {key: model_spec[key] for key in GENERATION_SPEC_KEYS if key in model_spec},
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "messages": _with_image_digests(messages)
+    }
+    request_str = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(request_str.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response store with least-recently-used eviction. Safe to use from several threads.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = None):
+        """
+        :param db_path: the sqlite file; created if it does not exist
+        :param max_entries: the maximal number of cached responses (default: unbounded)
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                 "(key TEXT PRIMARY KEY, model_name TEXT, value TEXT, last_access REAL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Any, Any, str]]:
+        """
+        :return: the cached (prompt, response, response_text) or None, if the key is not cached
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        prompt, response, response_text = json.loads(row[0])
+        return prompt, response, response_text
+
+    def put(self, key: str, model_name: str, prompt: Any, response: Any, response_text: str):
+        try:
+            value = json.dumps([prompt, response, response_text], ensure_ascii=False)
+        except TypeError:
+            logger.warning(f"Cannot cache response of {model_name}, because it is not JSON serializable")
+            return
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                     (key, model_name, value, time.time()))
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        size = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if size > self.max_entries:
+            self._connection.execute("DELETE FROM responses WHERE key IN "
+                                     "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                                     (size - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get_stats(self) -> Dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0
+        }
+
+    def export_to(self, file_path: str) -> int:
+        """
+        Write all cached responses as JSON lines, so that they can be imported on another machine.
+        :return: the number of exported entries
+        """
+        count = 0
+        with self._lock, open(file_path, "w", encoding="utf-8") as f:
+            for key, model_name, value, last_access in self._connection.execute("SELECT * FROM responses"):
+                entry = dict(key=key, model_name=model_name, value=value, last_access=last_access)
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_from(self, file_path: str) -> int:
+        """
+        Add the entries of an exported cache file; existing entries with the same key are replaced.
+        :return: the number of imported entries
+        """
+        count = 0
+        with self._lock, open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                         (entry["key"], entry["model_name"], entry["value"], entry["last_access"]))
+                count += 1
+            self._evict()
+            self._connection.commit()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachedModel(backends.Model):
+    """
+    Wraps a Model and answers repeated deterministic requests from a ResponseCache.
+    Everything else (name, generation arguments, ...) is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: backends.Model, cache: ResponseCache):
+        super().__init__(model.model_spec)
+        self.model = model
+        self.cache = cache
+
+    def set_gen_args(self, **gen_args):
+        self.model.set_gen_args(**gen_args)
+
+    def set_gen_arg(self, arg_name, arg_value):
+        self.model.set_gen_arg(arg_name, arg_value)
+
+    def get_gen_arg(self, arg_name):
+        return self.model.get_gen_arg(arg_name)
+
+    def __getattr__(self, item):
+        # only called for attributes not found on the wrapper itself
+        if "model" not in self.__dict__:
+            raise AttributeError(item)
+        return getattr(self.__dict__["model"], item)
+
+    def _cache_key(self, messages: List[Dict]) -> Optional[str]:
+        if self.get_temperature() > 0.0:  # sampled responses are not meant to be repeated
+            return None
+        return cache_key(self.model_spec, self.get_temperature(), self.get_max_tokens(), messages)
+
+    def generate_response(self, messages: List[Dict]) -> Tuple[Any, Any, str]:
+        key = self._cache_key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                telemetry.record_cache_hit()
+                return cached
+        prompt, response, response_text = self.model.generate_response(messages)
+        if key is not None:
+            self.cache.put(key, self.get_name(), prompt, response, response_text)
+        return prompt, response, response_text
+
+    async def agenerate_response(self, messages: List[Dict]) -> Tuple[Any, Any, str]:
+        key = self._cache_key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                telemetry.record_cache_hit()
+                return cached
+        prompt, response, response_text = await self.model.agenerate_response(messages)
+        if key is not None:
+            self.cache.put(key, self.get_name(), prompt, response, response_text)
+        return prompt, response, response_text
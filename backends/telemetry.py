@@ -0,0 +1,331 @@
+"""
+    Run-level telemetry of the model calls: the latency, the token counts (when the backend returns them), the retries,
+    the rate limit errors and the other errors of the calls are aggregated per model and game, and stored at the end of
+    a run as run_metrics.json (and optionally in the Prometheus text format).
+
+    The calls are tracked by the players (see track_call); the retry decorators and the backends report to the call
+    that is tracked in the current thread (or task).
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import backends
+
+logger = backends.get_logger(__name__)
+
+RUN_METRICS_FILE_NAME = "run_metrics.json"
+
+# the upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120.)
+PERCENTILES = (50, 90, 99)
+
+UNKNOWN_GAME = "unknown"
+
+# (prompt tokens, completion tokens) keys of the usage in the responses of the different APIs
+_USAGE_KEYS = [("usage", "prompt_tokens", "completion_tokens"),  # openai, mistral, openai compatible
+               ("usage", "input_tokens", "output_tokens"),  # anthropic
+               ("usage_metadata", "prompt_token_count", "candidates_token_count")]  # google
+
+
+def token_counts(response) -> Tuple[Optional[int], Optional[int]]:
+    """
+    :param response: the response object returned by generate_response()
+    :return: the numbers of prompt and completion tokens, or None if the response does not tell
+    """
+    if not isinstance(response, dict):
+        return None, None
+    for usage_key, prompt_key, completion_key in _USAGE_KEYS:
+        usage = response.get(usage_key)
+        if isinstance(usage, dict) and (prompt_key in usage or completion_key in usage):
+            return usage.get(prompt_key), usage.get(completion_key)
+    return None, None
+
+
+class CallStats:
+    """
+    The aggregated calls of a model in a game.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.context_exceeded = 0
+        self.cache_hits = 0  # answered from the response cache; not counted as calls
+        self.durations: List[float] = []
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # the last bucket is +Inf
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls_with_tokens = 0
+        self.duration_with_tokens = 0.
+
+    def add(self, call: "CallRecord"):
+        if call.cache_hit:
+            self.cache_hits += 1
+            return
+        self.calls += 1
+        self.errors += call.error
+        self.retries += call.retries
+        self.rate_limited += call.rate_limited
+        self.context_exceeded += call.context_exceeded
+        self.durations.append(call.duration)
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, call.duration)] += 1
+        if call.prompt_tokens is not None or call.completion_tokens is not None:
+            self.prompt_tokens += call.prompt_tokens or 0
+            self.completion_tokens += call.completion_tokens or 0
+            self.calls_with_tokens += 1
+            self.duration_with_tokens += call.duration
+
+    def merge(self, other: "CallStats"):
+        for name in ["calls", "errors", "retries", "rate_limited", "context_exceeded", "cache_hits",
+                     "prompt_tokens", "completion_tokens", "calls_with_tokens", "duration_with_tokens"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.durations.extend(other.durations)
+        self.bucket_counts = [count + other_count for count, other_count in zip(self.bucket_counts,
+                                                                                 other.bucket_counts)]
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        :return: the latency (nearest rank) below which the percentage of the calls are, or None without calls
+        """
+        if not self.durations:
+            return None
+        durations = sorted(self.durations)
+        rank = max(1, -(-len(durations) * percent // 100))
+        return durations[int(rank) - 1]
+
+    def to_dict(self) -> Dict:
+        total_duration = sum(self.durations)
+        latency = {
+            "mean": total_duration / self.calls if self.calls else None,
+            "max": max(self.durations, default=None),
+            **{f"p{percent}": self.percentile(percent) for percent in PERCENTILES},
+            "histogram": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), self.bucket_counts)}
+        }
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "context_exceeded": self.context_exceeded,
+            "cache_hits": self.cache_hits,
+            "total_duration": total_duration,
+            "latency": latency,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "calls_with_tokens": self.calls_with_tokens,
+            # only the calls whose responses have token counts
+            "completion_tokens_per_second": self.completion_tokens / self.duration_with_tokens
+            if self.duration_with_tokens > 0 else None
+        }
+
+
+class CallRecord:
+    """
+    A single call of a model, filled while the call is tracked.
+    """
+
+    def __init__(self, model_name: str, game_name: str):
+        self.model_name = model_name
+        self.game_name = game_name
+        self.duration = 0.
+        self.error = False
+        self.retries = 0
+        self.rate_limited = 0
+        self.context_exceeded = False
+        self.cache_hit = False
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+    def set_response(self, response):
+        """
+        :param response: the response object of the backend, from which the token counts are taken (if any)
+        """
+        self.prompt_tokens, self.completion_tokens = token_counts(response)
+
+
+_current_call: contextvars.ContextVar[Optional[CallRecord]] = contextvars.ContextVar("current_call", default=None)
+
+
+class Telemetry:
+    """
+    The aggregated model calls of a run. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.start_time = datetime.now()
+        self.game_name = UNKNOWN_GAME
+        self._stats: Dict[Tuple[str, str], CallStats] = dict()
+        self._lock = threading.Lock()
+
+    def set_game(self, game_name: str):
+        """
+        :param game_name: the game the subsequent calls are attributed to
+        """
+        self.game_name = game_name
+
+    @contextlib.contextmanager
+    def track_call(self, model_name: str):
+        """
+        Measure a call of the model. The retries, context limit errors and other errors of the call are counted.
+
+        :return: the record of the call, e.g. to set_response() on
+        """
+        call = CallRecord(model_name, self.game_name)
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            yield call
+        except backends.ContextExceededError:
+            call.context_exceeded = True
+            raise
+        except Exception:
+            call.error = True
+            raise
+        finally:
+            call.duration = time.perf_counter() - start
+            _current_call.reset(token)
+            self.add(call)
+
+    def add(self, call: CallRecord):
+        with self._lock:
+            key = (call.model_name, call.game_name)
+            if key not in self._stats:
+                self._stats[key] = CallStats()
+            self._stats[key].add(call)
+
+    def get_stats(self) -> Dict[Tuple[str, str], CallStats]:
+        """
+        :return: the stats per (model name, game name)
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def to_dict(self) -> Dict:
+        stats = self.get_stats()
+        models: Dict[str, CallStats] = dict()
+        for (model_name, _), game_stats in stats.items():
+            models.setdefault(model_name, CallStats()).merge(game_stats)
+        end_time = datetime.now()
+        return {
+            "start_time": str(self.start_time),
+            "end_time": str(end_time),
+            "duration": (end_time - self.start_time).total_seconds(),
+            "models": {model_name: model_stats.to_dict() for model_name, model_stats in sorted(models.items())},
+            "games": [{"model": model_name, "game": game_name, **game_stats.to_dict()}
+                      for (model_name, game_name), game_stats in sorted(stats.items())]
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: the metrics in the Prometheus text exposition format (e.g. for the textfile collector)
+        """
+        stats = sorted(self.get_stats().items())
+        lines = ["# HELP clembench_call_duration_seconds The latency of the model calls.",
+                 "# TYPE clembench_call_duration_seconds histogram"]
+        for (model_name, game_name), game_stats in stats:
+            labels = f'model="{_escape(model_name)}",game="{_escape(game_name)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), game_stats.bucket_counts):
+                cumulative += count
+                lines.append(f'clembench_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"clembench_call_duration_seconds_sum{{{labels}}} {sum(game_stats.durations)}")
+            lines.append(f"clembench_call_duration_seconds_count{{{labels}}} {game_stats.calls}")
+        for name, attribute, description in [
+            ("clembench_call_errors_total", "errors", "The model calls that raised an exception."),
+            ("clembench_call_retries_total", "retries", "The retried attempts of the model calls."),
+            ("clembench_rate_limited_total", "rate_limited", "The attempts rejected by the rate limits of the API."),
+            ("clembench_context_exceeded_total", "context_exceeded", "The calls that exceeded the context limit."),
+            ("clembench_cache_hits_total", "cache_hits", "The calls answered from the response cache."),
+            ("clembench_prompt_tokens_total", "prompt_tokens", "The prompt tokens reported by the backends."),
+            ("clembench_completion_tokens_total", "completion_tokens",
+             "The completion tokens reported by the backends.")]:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (model_name, game_name), game_stats in stats:
+                labels = f'model="{_escape(model_name)}",game="{_escape(game_name)}"'
+                lines.append(f"{name}{{{labels}}} {getattr(game_stats, attribute)}")
+        return "\n".join(lines) + "\n"
+
+    def store(self, results_root: str, prometheus_file: str = None) -> str:
+        """
+        Store the metrics as run_metrics.json in the results directory.
+
+        :param prometheus_file: also store the metrics in the Prometheus text format to this file
+        :return: the path of run_metrics.json
+        """
+        os.makedirs(results_root, exist_ok=True)
+        file_path = os.path.join(results_root, RUN_METRICS_FILE_NAME)
+        _write_atomic(file_path, json.dumps(self.to_dict(), indent=2))
+        if prometheus_file:
+            _write_atomic(prometheus_file, self.to_prometheus())
+        return file_path
+
+
+def _escape(label_value: str) -> str:
+    return str(label_value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _write_atomic(file_path: str, content: str):
+    # the textfile collector of Prometheus must never read a partially written file
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
+
+
+_telemetry = Telemetry()  # of the current run
+
+
+def get_telemetry() -> Telemetry:
+    """
+    :return: the telemetry of the current run
+    """
+    return _telemetry
+
+
+def start_run() -> Telemetry:
+    """
+    Start collecting the metrics of a new run.
+
+    :return: the telemetry of the new run
+    """
+    global _telemetry
+    _telemetry = Telemetry()
+    return _telemetry
+
+
+def record_retry():
+    """
+    Count a retried attempt of the call that is tracked in the current thread (or task), if any.
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.retries += 1
+
+
+def record_rate_limit():
+    """
+    Count a rate limit error of the call that is tracked in the current thread (or task), if any.
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.rate_limited += 1
+
+
+def record_cache_hit():
+    """
+    Mark the call that is tracked in the current thread (or task), if any, as answered from the response cache, so
+    that it is counted separately from the calls of the model (and not in their latency).
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.cache_hit = True
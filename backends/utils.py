@@ -1,8 +1,13 @@
+import asyncio
 import copy
+import inspect
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import List, Dict, Tuple
+from typing import Any, Callable, List, Dict, Tuple
 
-from backends import get_logger, ContextExceededError
+from backends import get_logger, ContextExceededError, ModelSpec, rate_limiter, telemetry
 
 logger = get_logger(__name__)
 
@@ -54,6 +59,14 @@ def ensure_alternating_roles(messages: List[Dict], cull_system_message: bool = T
 
 
 def ensure_messages_format(generate_response_fn):
+    if inspect.iscoroutinefunction(generate_response_fn):
+        @wraps(generate_response_fn)
+        async def async_wrapped_fn(self, messages):
+            _messages = ensure_alternating_roles(messages)
+            return await generate_response_fn(self, _messages)
+
+        return async_wrapped_fn
+
     @wraps(generate_response_fn)
     def wrapped_fn(self, messages):
         _messages = ensure_alternating_roles(messages)
@@ -62,6 +75,193 @@ def ensure_messages_format(generate_response_fn):
     return wrapped_fn
 
 
+class _RetryState:
+    """
+    The attempts of a call of generate_response: takes the slots of the rate limiter of the model (if the decorated
+    method is one of a backends.Model) and decides whether and when a failed attempt is retried.
+    """
+
+    def __init__(self, args, kwargs, tries: int, delay: float, rate_limit_tries: int, logger):
+        self.tries = tries
+        self.delay = delay
+        self.rate_limit_tries = rate_limit_tries
+        self.logger = logger
+        self.failures = 0
+        self.rate_limit_failures = 0
+        self.limiter, self.tokens = None, 0
+        model = args[0] if args else None
+        if isinstance(getattr(model, "model_spec", None), ModelSpec):
+            self.limiter = rate_limiter.get_rate_limiter(model.model_spec)
+            messages = args[1] if len(args) > 1 else kwargs.get("messages", [])
+            try:
+                max_tokens = model.get_max_tokens()
+            except AssertionError:  # not set
+                max_tokens = None
+            self.tokens = rate_limiter.estimate_tokens(messages, max_tokens)
+
+    def before_attempt(self) -> float:
+        """
+        :return: 0 if the attempt can start, otherwise the seconds to wait before asking again
+        """
+        return self.limiter.try_acquire(self.tokens) if self.limiter is not None else 0.
+
+    def succeeded(self, result):
+        if self.limiter is not None:
+            prompt_tokens, completion_tokens = telemetry.token_counts(result[1]) \
+                if isinstance(result, tuple) and len(result) > 1 else (None, None)
+            used_tokens = None if prompt_tokens is None and completion_tokens is None \
+                else (prompt_tokens or 0) + (completion_tokens or 0)
+            self.limiter.release(self.tokens, used_tokens)
+            self.limiter.on_success()
+
+    def failed(self, error: Exception) -> float:
+        """
+        :return: the seconds to wait before the next attempt
+        :raises: the error, if there are no attempts left
+        """
+        if self.limiter is not None:
+            self.limiter.release(self.tokens)
+        if rate_limiter.is_rate_limit_error(error):
+            self.rate_limit_failures += 1
+            retry_after = rate_limiter.retry_after_seconds(error)
+            telemetry.record_rate_limit()
+            if self.limiter is not None:
+                self.limiter.on_rate_limited(retry_after)
+            if self.rate_limit_failures >= self.rate_limit_tries:
+                raise error
+            wait = retry_after if retry_after is not None \
+                else max(self.delay, rate_limiter.backoff_delay(self.rate_limit_failures))
+        else:
+            self.failures += 1
+            if self.failures >= self.tries:
+                raise error
+            wait = self.delay
+        self.logger.warning('%s, retrying in %.1f seconds...', error, wait)
+        telemetry.record_retry()
+        return wait
+
+
+def retry(tries: int = 3, delay: float = 0, logger=logger, rate_limit_tries: int = rate_limiter.RATE_LIMIT_TRIES):
+    """
+    The retry decorator for generate_response, which also counts the retried attempts in the telemetry of the run.
+    The requests of a backends.Model are scheduled by the rate limiter of the model (see backends.rate_limiter).
+    Rate limit errors are retried separately, after the time given by the API or with exponential backoff.
+
+    :param tries: the maximum number of attempts (without the rate limited attempts)
+    :param delay: seconds to wait between attempts
+    :param logger: to log the failed attempts to
+    :param rate_limit_tries: the maximum number of rate limited attempts
+    """
+
+    def decorator(generate_response_fn):
+        @wraps(generate_response_fn)
+        def wrapped_fn(*args, **kwargs):
+            state = _RetryState(args, kwargs, tries, delay, rate_limit_tries, logger)
+            while True:
+                wait = state.before_attempt()
+                if wait > 0:
+                    time.sleep(wait)
+                    continue
+                try:
+                    result = generate_response_fn(*args, **kwargs)
+                except Exception as e:
+                    time.sleep(state.failed(e))
+                    continue
+                state.succeeded(result)
+                return result
+
+        return wrapped_fn
+
+    return decorator
+
+
+def async_retry(tries: int = 3, delay: float = 0, logger=logger, rate_limit_tries: int = rate_limiter.RATE_LIMIT_TRIES):
+    """
+    Coroutine counterpart of the retry decorator used for generate_response.
+
+    :param tries: the maximum number of attempts (without the rate limited attempts)
+    :param delay: seconds to wait between attempts
+    :param logger: to log the failed attempts to
+    :param rate_limit_tries: the maximum number of rate limited attempts
+    """
+
+    def decorator(agenerate_response_fn):
+        @wraps(agenerate_response_fn)
+        async def wrapped_fn(*args, **kwargs):
+            state = _RetryState(args, kwargs, tries, delay, rate_limit_tries, logger)
+            while True:
+                wait = state.before_attempt()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                try:
+                    result = await agenerate_response_fn(*args, **kwargs)
+                except Exception as e:
+                    await asyncio.sleep(state.failed(e))
+                    continue
+                state.succeeded(result)
+                return result
+
+        return wrapped_fn
+
+    return decorator
+
+
+def check_context_size(context_size: int, prompt_size: int, max_new_tokens: int = 100) -> Tuple[bool, int, int, int]:
+    """
+    The context limit check shared by the backends.
+    :param context_size: The total context token limit of the model
+    :param prompt_size: The number of prompt tokens
+    :param max_new_tokens: How many tokens to generate ('at most', but no stop sequence is defined).
+    :return: Tuple with
+            Bool: True if context limit is not exceeded, False if too many tokens
+            Number of tokens for the given messages and maximum new tokens
+            Number of tokens of 'context space left'
+            Total context token limit
+    """
+    tokens_used = prompt_size + max_new_tokens  # context includes tokens to be generated
+    tokens_left = context_size - tokens_used
+    fits = tokens_used <= context_size
+    return fits, tokens_used, tokens_left, context_size
+
+
+class TokenCountCache:
+    """
+    Token counts of the recent prompts of a model. In a dialogue, each prompt extends the prompt of the previous turn,
+    so that only the new suffix of the prompt text is tokenized and counted. Safe to use from several threads.
+
+    The count is exact, when the tokenizer does not merge tokens across the end of the previous prompt, which holds
+    for chat templates that end each message with a special token or a line break.
+    """
+
+    def __init__(self, tokenize: Callable[[str], List], max_entries: int = 64):
+        """
+        :param tokenize: returns the tokens of a text (without special tokens), e.g. tokenizer.tokenize
+        :param max_entries: the maximal number of remembered prompts (the least recently used ones are dropped)
+        """
+        self.tokenize = tokenize
+        self.max_entries = max_entries
+        self._counts: OrderedDict = OrderedDict()  # prompt text -> token count
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        """
+        :return: the number of tokens of the text
+        """
+        with self._lock:
+            prefix = max((known for known in self._counts if text.startswith(known)), key=len, default="")
+            prefix_count = self._counts[prefix] if prefix else 0
+            if prefix:
+                self._counts.move_to_end(prefix)
+        suffix_count = len(self.tokenize(text[len(prefix):])) if len(text) > len(prefix) else 0
+        with self._lock:
+            self._counts[text] = prefix_count + suffix_count
+            self._counts.move_to_end(text)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return prefix_count + suffix_count
+
+
 def check_context_limit_generic(context_size: int, prompt_tokens: List, model_name: str, max_new_tokens: int = 100) \
         -> Tuple[bool, int, int, int]:
     """
@@ -76,10 +276,8 @@ def check_context_limit_generic(context_size: int, prompt_tokens: List, model_na
             Number of tokens of 'context space left'
             Total context token limit
     """
-    prompt_size = len(prompt_tokens)
-    tokens_used = prompt_size + max_new_tokens  # context includes tokens to be generated
-    tokens_left = context_size - tokens_used
-    fits = tokens_used <= context_size
+    fits, tokens_used, tokens_left, context_size = check_context_size(context_size, len(prompt_tokens),
+                                                                      max_new_tokens)
 
     if not fits:
         logger.info(f"Context token limit for {model_name} exceeded: {tokens_used}/{tokens_left}")
@@ -88,3 +286,107 @@ def check_context_limit_generic(context_size: int, prompt_tokens: List, model_na
                                    tokens_used=tokens_used, tokens_left=tokens_left, context_size=context_size)
 
     return fits, tokens_used, tokens_left, context_size
+
+
+# the settings of the shared http connection pools (see get_http_client); each can be overwritten per backend with
+# an "http" entry of the backend in key.json, e.g. "openai": {"api_key": "...", "http": {"max_connections": 64}}
+HTTP_DEFAULTS = {
+    "timeout": 120.0,  # seconds to wait for a response
+    "connect_timeout": 10.0,  # seconds to wait for a connection
+    "max_connections": 32,  # the maximal number of concurrent connections of a backend (i.e. to its API host)
+    "max_keepalive_connections": 32,  # the maximal number of idle connections that are kept open for reuse
+    "keepalive_expiry": 60.0,  # seconds after which an idle connection is closed
+    "http2": True  # only used when the h2 package is installed (httpx[http2])
+}
+
+
+class EventLoopLocal:
+    """
+    A value per event loop, e.g. an async API client: the connections of an asyncio client are bound to the event
+    loop they have been opened on, so that a client cannot be used from the event loop of another asyncio.run().
+    The value is created on first use in each event loop; the values of closed event loops are dropped.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        """
+        :param factory: creates the value (called in the running event loop)
+        """
+        self.factory = factory
+        self._values: Dict[asyncio.AbstractEventLoop, Any] = dict()
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """
+        :return: the value of the running event loop (only to be called from coroutines)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for closed_loop in [other for other in self._values if other.is_closed()]:
+                del self._values[closed_loop]
+            if loop not in self._values:
+                self._values[loop] = self.factory()
+            return self._values[loop]
+
+
+_http_clients: Dict[Tuple, Any] = dict()
+_async_http_clients: Dict[Tuple, EventLoopLocal] = dict()
+_http_clients_lock = threading.Lock()
+
+
+def _create_http_client(client_class, settings: Dict, verify: bool):
+    import httpx  # only needed by the remote API backends
+
+    settings = {**HTTP_DEFAULTS, **(settings or {})}
+    http2 = settings["http2"]
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    return client_class(timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+                        limits=httpx.Limits(max_connections=settings["max_connections"],
+                                            max_keepalive_connections=settings["max_keepalive_connections"],
+                                            keepalive_expiry=settings["keepalive_expiry"]),
+                        http2=http2, verify=verify, follow_redirects=True)
+
+
+def _get_http_client(name: str, is_async: bool, settings: Dict, verify: bool):
+    import httpx
+
+    key = (name, verify)
+    if is_async:
+        with _http_clients_lock:
+            if key not in _async_http_clients:
+                _async_http_clients[key] = EventLoopLocal(
+                    lambda: _create_http_client(httpx.AsyncClient, settings, verify))
+                logger.info(f"Created the shared async http clients for {name}")
+        return _async_http_clients[key].get()
+    with _http_clients_lock:
+        if key not in _http_clients:
+            _http_clients[key] = _create_http_client(httpx.Client, settings, verify)
+            logger.info(f"Created the shared http client for {name}")
+        return _http_clients[key]
+
+
+def get_http_client(name: str, settings: Dict = None, verify: bool = True):
+    """
+    The http client (with its connection pool) shared by all the clients of a backend in this process, so that the
+    connections to the API host are kept alive and reused instead of opening a new (TLS) connection per request.
+
+    :param name: of the backend, e.g. 'openai'; each backend has its own connection pool
+    :param settings: overwrite HTTP_DEFAULTS; only used when the client is created (on the first call)
+    :param verify: whether to verify the TLS certificates of the host
+    :return: the shared httpx.Client
+    """
+    return _get_http_client(name, False, settings, verify)
+
+
+def get_async_http_client(name: str, settings: Dict = None, verify: bool = True):
+    """
+    Coroutine counterpart of get_http_client. Each event loop has its own client (see EventLoopLocal), so that this
+    must be called from a coroutine, e.g. in the factory of the EventLoopLocal of an async API client.
+
+    :return: the httpx.AsyncClient shared in the running event loop
+    """
+    return _get_http_client(name, True, settings, verify)
+
@@ -1,12 +1,17 @@
 """ Main entry point """
-from typing import List, Dict
+from typing import List, Dict, Union
+
+import os
 
 import backends
 import clemgame
 
 from datetime import datetime
 
-from clemgame.clemgame import load_benchmarks, load_benchmark
+from backends import telemetry, image_cache
+from backends.response_cache import ResponseCache, CachedModel, CACHE_FILE_NAME, CACHE_EXPORT_FILE_NAME
+from clemgame import file_utils, results_index
+from clemgame.clemgame import load_benchmarks, load_benchmark, process_episodes
 
 logger = clemgame.get_logger(__name__)
 stdout_logger = clemgame.get_logger("benchmark.run")
@@ -26,71 +31,184 @@ def list_games():
         stdout_logger.info(" Game: %s -> %s", game.name, game.get_description())
 
 
-def run(game_name: str, model_specs: List[backends.ModelSpec], gen_args: Dict,
-        experiment_name: str = None, instances_name: str = None, results_dir: str = None):
+def run(game_name: Union[str, List[str]], model_specs: List[backends.ModelSpec], gen_args: Dict,
+        experiment_name: str = None, instances_name: str = None, results_dir: str = None, workers: int = 1,
+        use_async: bool = False, use_cache: bool = False, cache_size: int = None, resume: bool = False,
+        stream_records: bool = False, compact_requests: bool = False, prometheus_file: str = None):
+    """
+    Run one or more games with the same models. The models are taken from the process-wide backends.model_pool,
+    so that they are loaded only once for all games (and for subsequent calls with the same model specs).
+    At the end, the metrics of the model calls (latency, tokens, retries, errors) are stored as run_metrics.json
+    in the results directory.
+    :param game_name: a game name, a list of game names or 'all'
+    :param prometheus_file: also store the metrics of the model calls in the Prometheus text format to this file
+    """
     if experiment_name:
         logger.info("Only running experiment: %s", experiment_name)
+    response_cache = None
+    run_telemetry = telemetry.start_run()
     try:
+        if use_cache:
+            response_cache = ResponseCache(os.path.join(file_utils.results_root(results_dir), CACHE_FILE_NAME),
+                                           max_entries=cache_size)
         player_models = []
-        for model_spec in model_specs:
-            model = backends.get_model_for(model_spec)
+        for model_spec, model in zip(model_specs, backends.model_pool.get_models_for(model_specs)):
+            if response_cache is not None and not model_spec.is_programmatic() and not model_spec.is_human():
+                model = CachedModel(model, response_cache)
             model.set_gen_args(**gen_args)  # todo make this somehow available in generate method?
             player_models.append(model)
-        benchmark = load_benchmark(game_name, instances_name=instances_name)
-        logger.info("Running benchmark for '%s' (models=%s)", game_name,
-                    player_models if player_models is not None else "see experiment configs")
-        if experiment_name:
-            benchmark.filter_experiment.append(experiment_name)
-        time_start = datetime.now()
-        benchmark.run(player_models=player_models, results_dir=results_dir)
-        time_end = datetime.now()
-        logger.info(f"Run {benchmark.name} took {str(time_end - time_start)}")
+        if game_name == "all":
+            games_list = load_benchmarks(instances_name=instances_name)
+        elif isinstance(game_name, str):
+            games_list = [load_benchmark(game_name, instances_name=instances_name)]
+        else:
+            games_list = [load_benchmark(name, instances_name=instances_name) for name in game_name]
+        total_games = len(games_list)
+        for idx, benchmark in enumerate(games_list):
+            try:
+                if total_games > 1:
+                    stdout_logger.info(f"Run game {idx + 1} of {total_games}: {benchmark.name}")
+                logger.info("Running benchmark for '%s' (models=%s)", benchmark.name,
+                            player_models if player_models is not None else "see experiment configs")
+                if experiment_name:
+                    benchmark.filter_experiment.append(experiment_name)
+                time_start = datetime.now()
+                run_telemetry.set_game(benchmark.name)
+                # a copy, because two-player games append the model for self-play
+                benchmark.run(player_models=list(player_models), results_dir=results_dir, workers=workers,
+                              use_async=use_async, resume=resume, stream_records=stream_records,
+                              compact_requests=compact_requests)
+                time_end = datetime.now()
+                logger.info(f"Run {benchmark.name} took {str(time_end - time_start)}")
+            except Exception as e:  # continue with the other games
+                stdout_logger.exception(e)
+                logger.error(e, exc_info=True)
     except Exception as e:
         stdout_logger.exception(e)
         logger.error(e, exc_info=True)
+    finally:
+        if response_cache is not None:
+            stdout_logger.info(f"Response cache: {response_cache.get_stats()}")
+            response_cache.close()
+        image_stats = image_cache.get_image_cache().get_stats()
+        if image_stats["hits"] + image_stats["misses"] > 0:
+            stdout_logger.info(f"Image cache: {image_stats}")
+        try:
+            metrics_path = run_telemetry.store(file_utils.results_root(results_dir), prometheus_file)
+            stdout_logger.info(f"Metrics of the model calls stored to {metrics_path}")
+        except OSError as e:
+            logger.error(f"Cannot store the metrics of the model calls: {e}")
 
 
-def score(game_name: str, experiment_name: str = None, results_dir: str = None):
+def score(game_name: str, experiment_name: str = None, results_dir: str = None, jobs: int = 1):
+    """
+    :param jobs: the number of processes that score the episodes (of all the games) in parallel
+    """
     logger.info("Scoring benchmark for: %s", game_name)
     if experiment_name:
         logger.info("Only scoring experiment: %s", experiment_name)
-    if game_name == "all":
-        games_list = load_benchmarks(do_setup=False)
-    else:
-        games_list = [load_benchmark(game_name, do_setup=False)]
-    total_games = len(games_list)
-    for idx, benchmark in enumerate(games_list):
-        try:
-            if experiment_name:
-                benchmark.filter_experiment.append(experiment_name)
-            stdout_logger.info(f"Score game {idx + 1} of {total_games}: {benchmark.name}")
-            time_start = datetime.now()
-            benchmark.compute_scores(results_dir)
-            time_end = datetime.now()
-            logger.info(f"Score {benchmark.name} took {str(time_end - time_start)}")
-        except Exception as e:
-            stdout_logger.exception(e)
-            logger.error(e, exc_info=True)
+    _process_games("score", game_name, experiment_name, results_dir, jobs)
 
 
-def transcripts(game_name: str, experiment_name: str = None, results_dir: str = None):
+def transcripts(game_name: str, experiment_name: str = None, results_dir: str = None, jobs: int = 1,
+                shared_css: bool = False, index_pages: bool = False):
+    """
+    :param jobs: the number of processes that build the transcripts of the episodes (of all the games) in parallel
+    :param shared_css: the transcripts link a single style sheet at the results root instead of inlining the css
+    :param index_pages: also store a (paginated) index.html of the transcripts of each experiment
+    """
     logger.info("Building benchmark transcripts for: %s", game_name)
     if experiment_name:
         logger.info("Only transcribe experiment: %s", experiment_name)
+    _process_games("transcribe", game_name, experiment_name, results_dir, jobs,
+                   shared_css=shared_css, index_pages=index_pages)
+
+
+def _process_games(action: str, game_name: str, experiment_name: str = None, results_dir: str = None,
+                   jobs: int = 1, **kwargs):
+    activity = "Score" if action == "score" else "Transcribe"
     if game_name == "all":
         games_list = load_benchmarks(do_setup=False)
     else:
         games_list = [load_benchmark(game_name, do_setup=False)]
+    for benchmark in games_list:
+        if experiment_name:
+            benchmark.filter_experiment.append(experiment_name)
+    if jobs > 1:  # a single pool for the episodes of all games
+        stdout_logger.info(f"{activity} {len(games_list)} games with {jobs} processes")
+        time_start = datetime.now()
+        try:
+            process_episodes(games_list, action, results_dir, jobs=jobs, **kwargs)
+        except Exception as e:
+            stdout_logger.exception(e)
+            logger.error(e, exc_info=True)
+        time_end = datetime.now()
+        logger.info(f"{activity} {len(games_list)} games took {str(time_end - time_start)}")
+        return
     total_games = len(games_list)
     for idx, benchmark in enumerate(games_list):
         try:
-            if experiment_name:
-                benchmark.filter_experiment.append(experiment_name)
-            stdout_logger.info(f"Transcribe game {idx + 1} of {total_games}: {benchmark.name}")
+            stdout_logger.info(f"{activity} game {idx + 1} of {total_games}: {benchmark.name}")
             time_start = datetime.now()
-            benchmark.build_transcripts(results_dir)
+            process_episodes([benchmark], action, results_dir, **kwargs)
             time_end = datetime.now()
-            logger.info(f"Building transcripts {benchmark.name} took {str(time_end - time_start)}")
+            logger.info(f"{activity} {benchmark.name} took {str(time_end - time_start)}")
         except Exception as e:
             stdout_logger.exception(e)
             logger.error(e, exc_info=True)
+
+
+def cache(action: str, file_path: str = None, results_dir: str = None, cache_size: int = None):
+    """
+    Inspect or share the response cache of a results directory.
+    :param action: 'stats', 'export' (to file_path) or 'import' (from file_path)
+    :param file_path: the JSON lines file, by default response_cache.jsonl in the results directory
+    """
+    cache_path = os.path.join(file_utils.results_root(results_dir), CACHE_FILE_NAME)
+    if file_path is None:
+        file_path = os.path.join(file_utils.results_root(results_dir), CACHE_EXPORT_FILE_NAME)
+    response_cache = ResponseCache(cache_path, max_entries=cache_size)
+    try:
+        if action == "stats":
+            stdout_logger.info(f"Response cache at {cache_path} holds {len(response_cache)} responses")
+        elif action == "export":
+            count = response_cache.export_to(file_path)
+            stdout_logger.info(f"Exported {count} cached responses to {file_path}")
+        elif action == "import":
+            count = response_cache.import_from(file_path)
+            stdout_logger.info(f"Imported {count} cached responses from {file_path}")
+        else:
+            raise ValueError(f"Unknown cache action: {action}")
+    finally:
+        response_cache.close()
+
+
+def index(action: str, results_dir: str = None, game_name: str = None, dialogue_pair: str = None,
+          status: str = None, full: bool = False):
+    """
+    Inspect, update or rebuild the index of the episodes in a results directory (see results_index.py).
+    :param action: 'rebuild' (from the directory tree), 'sync' (with the changes of the directory tree) or 'list'
+                   (the indexed episodes, optionally filtered)
+    :param full: sync all the experiment directories, not only those of the changed game directories
+    """
+    results_root = file_utils.results_root(results_dir)
+    episodes_index = results_index.ResultsIndex(results_root)
+    try:
+        if action == "rebuild":
+            count = episodes_index.rebuild()
+            stdout_logger.info(f"Indexed {count} episodes of {results_root}")
+        elif action == "sync":
+            added, removed = episodes_index.sync(dialogue_pair=dialogue_pair, game=game_name, full=full)
+            stdout_logger.info(f"Added {added} and removed {removed} episodes of {results_root}")
+        elif action == "list":
+            episodes_index.sync(dialogue_pair=dialogue_pair, game=game_name)
+            episodes = episodes_index.query(dialogue_pair=dialogue_pair, game=game_name, status=status)
+            for episode in episodes:
+                statuses = [status for status in results_index.STATUSES if getattr(episode, status) is not None]
+                stdout_logger.info(f" {episode.dialogue_pair}/{episode.game}/{episode.experiment}/{episode.episode}"
+                                   f" ({', '.join(statuses)})")
+            stdout_logger.info(f"{len(episodes)} episodes")
+        else:
+            raise ValueError(f"Unknown index action: {action}")
+    finally:
+        episodes_index.close()
@@ -1,16 +1,22 @@
 import abc
+import asyncio
 import collections
 import copy
+import importlib
+import json
 import os.path
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict, Tuple, Any
 
 from tqdm import tqdm
 
 import backends
-from backends import Model, CustomResponseModel, HumanModel
+from backends import Model, CustomResponseModel, HumanModel, telemetry
 import clemgame
-from clemgame import file_utils, transcript_utils
+from clemgame import file_utils, transcript_utils, scores_store, results_index
 import clemgame.metrics as ms
 
 logger = clemgame.get_logger(__name__)
@@ -19,6 +25,9 @@ stdout_logger = clemgame.get_logger("benchmark.run")
 # Showcases that should not be run for the overall benchmark (still can be run, when specified specifically)
 GAMES_TO_IGNORE = ["hellogame", "chatgame"]
 
+# Lists the completely recorded episodes of an experiment (see GameBenchmark.run(resume=True))
+RUN_MANIFEST_FILE_NAME = "run_manifest.json"
+
 
 class Player(abc.ABC):
     """
@@ -41,12 +50,36 @@ class Player(abc.ABC):
         call_start = datetime.now()
         prompt = messages
         response = dict()
-        if isinstance(self.model, CustomResponseModel):
-            response_text = self._custom_response(messages, turn_idx)
-        elif isinstance(self.model, HumanModel):
-            response_text = self._terminal_response(messages, turn_idx)
-        else:
-            prompt, response, response_text = self.model.generate_response(messages)
+        with telemetry.get_telemetry().track_call(self.model.get_name()) as call:
+            if isinstance(self.model, CustomResponseModel):
+                response_text = self._custom_response(messages, turn_idx)
+            elif isinstance(self.model, HumanModel):
+                response_text = self._terminal_response(messages, turn_idx)
+            else:
+                prompt, response, response_text = self.model.generate_response(messages)
+                call.set_response(response)
+        self._log_call_info(response, response_text, call_start)
+        return prompt, response, response_text
+
+    async def acall(self, messages: List[Dict], turn_idx) -> Tuple[Any, Any, str]:
+        """
+        Coroutine version of __call__() which awaits the agenerate_response() method of the backend.
+
+        Programmatic players are answered directly; human players and players that customize __call__()
+        are called in a separate thread so that the event loop is not blocked.
+        """
+        if isinstance(self.model, CustomResponseModel) and type(self).__call__ is Player.__call__:
+            return self(messages, turn_idx)
+        if isinstance(self.model, HumanModel) or type(self).__call__ is not Player.__call__:
+            return await asyncio.to_thread(self, messages, turn_idx)
+        call_start = datetime.now()
+        with telemetry.get_telemetry().track_call(self.model.get_name()) as call:
+            prompt, response, response_text = await self.model.agenerate_response(messages)
+            call.set_response(response)
+        self._log_call_info(response, response_text, call_start)
+        return prompt, response, response_text
+
+    def _log_call_info(self, response: Dict, response_text: str, call_start: datetime):
         call_duration = datetime.now() - call_start
         response["clem_player"] = {
             "call_start": str(call_start),
@@ -54,7 +87,6 @@ class Player(abc.ABC):
             "response": response_text,
             "model_name": self.model.get_name()
         }
-        return prompt, response, response_text
 
     def _terminal_response(self, messages, turn_idx) -> str:
         """
@@ -188,19 +220,59 @@ class GameRecorder(GameResourceLocator):
         }
         """ Stores calls to the API """
         self.requests = []
+        """ Open JSON lines files, when the records are streamed to the episode directory (see start_streaming) """
+        self._interactions_stream = None
+        self._requests_stream = None
+        self._requests_count = 0
+        """ Store the calls delta-encoded in requests_compact.json instead of requests.json """
+        self.compact_requests = False
+
+    def start_streaming(self, results_root: str, dialogue_pair_desc: str, game_record_dir: str):
+        """
+        Append each logged interaction and call as a line to interactions.jsonl and requests.jsonl in the episode
+        directory as soon as it happens. The calls are then not kept in memory and the records of an episode are
+        not lost when the run crashes. store_records() compacts the lines to the usual interactions.json and
+        requests.json files and removes the .jsonl files.
+        """
+        stream_dir = os.path.join(self.results_path_for(results_root, dialogue_pair_desc), game_record_dir)
+        os.makedirs(stream_dir, exist_ok=True)
+        self._interactions_stream = open(os.path.join(stream_dir, "interactions.jsonl"), "w", encoding="utf-8")
+        self._requests_stream = open(os.path.join(stream_dir, "requests.jsonl"), "w", encoding="utf-8")
+        self._requests_count = 0
+
+    def stop_streaming(self):
+        """ Close the JSON lines files; a no-op, when the records are not streamed """
+        for stream in [self._interactions_stream, self._requests_stream]:
+            if stream is not None:
+                stream.close()
+        self._interactions_stream = None
+        self._requests_stream = None
+
+    @staticmethod
+    def _append_line(stream, obj):
+        stream.write(json.dumps(obj, ensure_ascii=False) + "\n")
 
     def log_next_turn(self):
         """ Call this method to group interactions per turn """
         self.log_current_turn += 1
         self.interactions["turns"].append([])
+        if self._interactions_stream is not None:
+            self._append_line(self._interactions_stream, {"turn": self.log_current_turn})
+            # flush once per turn, so that at most the current turn is lost on a crash
+            self._interactions_stream.flush()
+            self._requests_stream.flush()
 
     def log_key(self, key: str, value: Any):
         """Add a key and value to the internal log."""
         self.interactions[key] = value
+        if self._interactions_stream is not None:
+            self._append_line(self._interactions_stream, {"key": key, "value": value})
         self.logger.info(f"{self.name}: Logged a game-specific interaction key: {key}.")
 
     def log_players(self, players_dic: Dict):
         self.interactions["players"] = players_dic
+        if self._interactions_stream is not None:
+            self._append_line(self._interactions_stream, {"key": "players", "value": players_dic})
         self.logger.info(f"{self.name}: Logged players metadata.")
 
     def log_event(self, from_: str, to: str, action: Dict, call: Tuple[Any, Any] = None):
@@ -222,15 +294,26 @@ class GameRecorder(GameResourceLocator):
             "action": action
         }
         self.interactions["turns"][self.log_current_turn].append(action_obj.copy())
+        if self._interactions_stream is not None:
+            self._append_line(self._interactions_stream, {"turn": self.log_current_turn, "event": action_obj})
         self.logger.info(
             f"{self.name}: Logged {action['type']} action ({from_}->{to}).")
         if call:
-            call_obj = {
-                "timestamp": timestamp,
-                "manipulated_prompt_obj": self._needs_copy(call[0]),
-                "raw_response_obj": self._needs_copy(call[1])
-            }
-            self.requests.append(call_obj)
+            if self._requests_stream is not None:  # serializing right away makes the copy unnecessary
+                call_obj = {
+                    "timestamp": timestamp,
+                    "manipulated_prompt_obj": call[0],
+                    "raw_response_obj": call[1]
+                }
+                self._append_line(self._requests_stream, call_obj)
+                self._requests_count += 1
+            else:
+                call_obj = {
+                    "timestamp": timestamp,
+                    "manipulated_prompt_obj": self._needs_copy(call[0]),
+                    "raw_response_obj": self._needs_copy(call[1])
+                }
+                self.requests.append(call_obj)
             self.logger.info(f"{self.name}: Logged a call with timestamp {timestamp}")
 
     @staticmethod
@@ -254,16 +337,41 @@ class GameRecorder(GameResourceLocator):
                     self.logger.warning(f"Invalid player identifiers, html builder won't work.")
         if not self.interactions["turns"]:
             self.logger.warning(f"Interaction logs are missing!")
-        if not self.requests:
+        if not self.requests and not self._requests_count:
             self.logger.warning(f"No calls logged!")
+        is_streaming = self._requests_stream is not None
+        self.stop_streaming()
         self.store_results_file(self.interactions, "interactions.json",
                                 dialogue_pair_desc,
                                 sub_dir=game_record_dir,
                                 root_dir=results_root)
-        self.store_results_file(self.requests, "requests.json",
-                                dialogue_pair_desc,
-                                sub_dir=game_record_dir,
-                                root_dir=results_root)
+        record_dir = os.path.join(self.results_path_for(results_root, dialogue_pair_desc), game_record_dir)
+        if is_streaming and self.compact_requests:
+            with open(os.path.join(record_dir, "requests.jsonl"), encoding="utf-8") as lines:
+                compact_requests = file_utils.encode_requests(json.loads(line) for line in lines if line.strip())
+            self.store_results_file(compact_requests, file_utils.COMPACT_REQUESTS_FILE_NAME,
+                                    dialogue_pair_desc,
+                                    sub_dir=game_record_dir,
+                                    root_dir=results_root)
+            os.remove(os.path.join(record_dir, "requests.jsonl"))
+        elif is_streaming:
+            fp = file_utils.compact_json_lines(os.path.join(record_dir, "requests.jsonl"),
+                                               os.path.join(record_dir, "requests.json"))
+            self.logger.info("Results file stored to %s", fp)
+        elif self.compact_requests:
+            self.store_results_file(file_utils.encode_requests(self.requests), file_utils.COMPACT_REQUESTS_FILE_NAME,
+                                    dialogue_pair_desc,
+                                    sub_dir=game_record_dir,
+                                    root_dir=results_root)
+        else:
+            self.store_results_file(self.requests, "requests.json",
+                                    dialogue_pair_desc,
+                                    sub_dir=game_record_dir,
+                                    root_dir=results_root)
+        if is_streaming:
+            os.remove(os.path.join(record_dir, "interactions.jsonl"))
+        results_index.mark_episode(results_root, dialogue_pair_desc, self.name, game_record_dir,
+                                   results_index.RECORDED)
 
 
 class GameMaster(GameRecorder):
@@ -300,6 +408,15 @@ class GameMaster(GameRecorder):
         """
         raise NotImplementedError()
 
+    async def aplay(self) -> None:
+        """
+        Coroutine version of play() to have many episodes in flight on one event loop.
+
+        By default, play() is called in a separate thread. Overwrite this method, if the game master can await
+        the players directly (see DialogueGameMaster).
+        """
+        await asyncio.to_thread(self.play)
+
 
 class GameScorer(GameResourceLocator):
     """
@@ -320,6 +437,7 @@ class GameScorer(GameResourceLocator):
                                 dialogue_pair=dialogue_pair,
                                 sub_dir=game_record_dir,
                                 root_dir=results_root)
+        results_index.mark_episode(results_root, dialogue_pair, self.name, game_record_dir, results_index.SCORED)
 
     def log_turn_score(self, turn_idx, score_name, score_value):
         if isinstance(score_value, bool):
@@ -442,7 +560,42 @@ class DialogueGameMaster(GameMaster):
             self.current_turn += 1
         self._on_after_game()
 
+    async def aplay(self) -> None:
+        """
+        Same as play(), but awaits the players, so that other episodes can proceed while waiting for a response.
+        """
+        if type(self).play is not DialogueGameMaster.play:  # customized game loop
+            await super().aplay()
+            return
+        self._on_before_game()
+        inner_break = False
+        while not inner_break and self._does_game_proceed():
+            self.log_next_turn()
+            self._on_before_turn(self.current_turn)
+            self.logger.info(f"{self.name}: %s turn: %d", self.name, self.current_turn)
+            for player in self.__player_sequence():
+                if not self._does_game_proceed():
+                    inner_break = True
+                    break
+                await self.aprompt(player)
+                while self._should_reprompt(player):
+                    self._on_before_reprompt(player)
+                    await self.aprompt(player, is_reprompt=True)
+            self._on_after_turn(self.current_turn)
+            self.current_turn += 1
+        self._on_after_game()
+
     def prompt(self, player: Player, is_reprompt=False):
+        history = self.__log_prompt(player, is_reprompt)
+        _prompt, _response, response_message = player(history, self.current_turn)
+        self.__log_and_add_response(player, _prompt, _response, response_message)
+
+    async def aprompt(self, player: Player, is_reprompt=False):
+        history = self.__log_prompt(player, is_reprompt)
+        _prompt, _response, response_message = await player.acall(history, self.current_turn)
+        self.__log_and_add_response(player, _prompt, _response, response_message)
+
+    def __log_prompt(self, player: Player, is_reprompt: bool) -> List[Dict]:
         # GM -> Player
         history = self.messages_by_names[player.descriptor]
         assert history, f"messages history must not be empty for {player.descriptor}"
@@ -455,9 +608,9 @@ class DialogueGameMaster(GameMaster):
         action_type = 'send message' if not is_reprompt else 'send message (reprompt)'
         action = {'type': action_type, 'content': message}
         self.log_event(from_='GM', to=player.descriptor, action=action)
+        return history
 
-        _prompt, _response, response_message = player(history, self.current_turn)
-
+    def __log_and_add_response(self, player: Player, _prompt: Any, _response: Any, response_message: str):
         # Player -> GM
         action = {'type': 'get message', 'content': response_message}
         # log 'get message' event including backend/API call:
@@ -609,6 +762,10 @@ class GameBenchmark(GameResourceLocator):
         super().__init__(name)
         self.instances = None
         self.filter_experiment: List[str] = []
+        self.stream_records = False
+        self.compact_requests = False
+        self._run_manifests: Dict[str, Dict] = dict()
+        self._run_manifests_lock = threading.Lock()
 
     def get_description(self) -> str:
         """
@@ -622,103 +779,128 @@ class GameBenchmark(GameResourceLocator):
             instances_name = "instances"
         self.instances = self.load_json(f"in/{instances_name}")
 
-    def build_transcripts(self, results_dir: str = None):
-        results_root = file_utils.results_root(results_dir)
-        dialogue_partners = [file for file in os.listdir(results_root)
-                             if os.path.isdir(os.path.join(results_root, file))]
-        for dialogue_pair in dialogue_partners:
-            game_result_path = self.results_path_for(results_root, dialogue_pair)
-            if not os.path.exists(game_result_path) or not os.path.isdir(game_result_path):
-                stdout_logger.info("No results directory found at: " + game_result_path)
-                continue
+    def build_transcripts(self, results_dir: str = None, jobs: int = 1, shared_css: bool = False,
+                          index_pages: bool = False):
+        """
+        :param jobs: the number of processes that build the transcripts of the episodes in parallel
+        :param shared_css: link a single style sheet at the results root instead of inlining the css
+        :param index_pages: also store a (paginated) index.html of the transcripts of each experiment
+        """
+        process_episodes([self], "transcribe", results_dir, jobs=jobs, shared_css=shared_css,
+                         index_pages=index_pages)
 
-            experiment_dirs = [file for file in os.listdir(game_result_path)
-                               if os.path.isdir(os.path.join(game_result_path, file))]
-            if not experiment_dirs:
-                stdout_logger.warning(f"{self.name}: No experiments for {dialogue_pair}")
-            for experiment_dir in experiment_dirs:
-                experiment_path = os.path.join(game_result_path, experiment_dir)
-                experiment_name = "_".join(experiment_dir.split("_")[1:])  # remove leading index number
-                if self.filter_experiment and experiment_name not in self.filter_experiment:
-                    stdout_logger.info(f"Skip experiment {experiment_name}")
-                    continue
-                stdout_logger.info(f"Transcribe: {experiment_name}")
-                experiment_config = self.load_results_json(f"{experiment_dir}/experiment_{experiment_name}",
-                                                           results_root, dialogue_pair)
-                episode_dirs = [file for file in os.listdir(experiment_path)
-                                if os.path.isdir(os.path.join(experiment_path, file))]
-                error_count = 0
-                for episode_dir in tqdm(episode_dirs, desc="Building transcripts"):
-                    try:
-                        rel_episode_path = f"{experiment_dir}/{episode_dir}"
-                        game_instance = self.load_results_json(f"{rel_episode_path}/instance",
-                                                               results_root, dialogue_pair)
-                        game_interactions = self.load_results_json(f"{rel_episode_path}/interactions",
-                                                                   results_root, dialogue_pair)
-
-                        transcript = transcript_utils.build_transcript(game_interactions, experiment_config,
-                                                                       game_instance, dialogue_pair)
-                        self.store_results_file(transcript, "transcript.html",
-                                                dialogue_pair,
-                                                sub_dir=rel_episode_path,
-                                                root_dir=results_root)
-                        transcript_tex = transcript_utils.build_tex(game_interactions)
-                        self.store_results_file(transcript_tex, "transcript.tex",
-                                                dialogue_pair,
-                                                sub_dir=rel_episode_path,
-                                                root_dir=results_root)
-                    except Exception:  # continue with other episodes if something goes wrong
-                        self.logger.exception(f"{self.name}: Cannot transcribe {episode_dir} (but continue)")
-                        error_count += 1
-                if error_count > 0:
-                    stdout_logger.error(
-                        f"{self.name}: '{error_count}' exceptions occurred: See clembench.log for details.")
+    def compute_scores(self, results_dir: str = None, jobs: int = 1):
+        """
+        :param jobs: the number of processes that score the episodes in parallel
+        """
+        process_episodes([self], "score", results_dir, jobs=jobs)
 
-    def compute_scores(self, results_dir: str = None):
-        results_root = file_utils.results_root(results_dir)
-        dialogue_partners = [file for file in os.listdir(results_root)
-                             if os.path.isdir(os.path.join(results_root, file))]
-        for dialogue_pair in dialogue_partners:
-            game_result_path = self.results_path_for(results_root, dialogue_pair)
-            if not os.path.exists(game_result_path) or not os.path.isdir(game_result_path):
-                stdout_logger.info("No results directory found at: " + game_result_path)
+    def list_episodes(self, results_root: str, activity: str) -> List[Tuple[str, str, str]]:
+        """
+        :param results_root: the results directory
+        :param activity: for logging, e.g. 'Scoring'
+        :return: the (dialogue_pair, experiment_dir, episode_dir) of all recorded episodes
+                 of the experiments not filtered out, in a stable order (as listed by the results index)
+        """
+        episodes_index = results_index.get_index(results_root)
+        episodes_index.sync(game=self.name)  # e.g. episodes copied into the results directory
+        episodes = []
+        logged_experiments = set()
+        for episode in episodes_index.query(game=self.name, status=results_index.RECORDED):
+            experiment_name = "_".join(episode.experiment.split("_")[1:])  # remove leading index number
+            if self.filter_experiment and experiment_name not in self.filter_experiment:
                 continue
+            if (episode.dialogue_pair, experiment_name) not in logged_experiments:
+                stdout_logger.info(f"{activity}: {experiment_name} ({episode.dialogue_pair})")
+                logged_experiments.add((episode.dialogue_pair, experiment_name))
+            episodes.append((episode.dialogue_pair, episode.experiment, episode.episode))
+        if not episodes:
+            stdout_logger.info(f"{self.name}: No recorded episodes found in the results index at {results_root}")
+        return episodes
+
+    def _load_episode(self, results_root: str, dialogue_pair: str, experiment_dir: str,
+                      episode_dir: str) -> Tuple[Dict, Dict, Dict]:
+        """
+        :return: the experiment config, game instance and interactions of the episode
+        """
+        experiment_name = "_".join(experiment_dir.split("_")[1:])
+        experiment_config = self.load_results_json(f"{experiment_dir}/experiment_{experiment_name}",
+                                                   results_root, dialogue_pair)
+        rel_episode_path = f"{experiment_dir}/{episode_dir}"
+        game_instance = self.load_results_json(f"{rel_episode_path}/instance",
+                                               results_root, dialogue_pair)
+        game_interactions = self.load_results_json(f"{rel_episode_path}/interactions",
+                                                   results_root, dialogue_pair)
+        return experiment_config, game_instance, game_interactions
+
+    def score_episode(self, results_root: str, dialogue_pair: str, experiment_dir: str, episode_dir: str):
+        experiment_config, game_instance, game_interactions = self._load_episode(results_root, dialogue_pair,
+                                                                                 experiment_dir, episode_dir)
+        game_scorer = self.create_game_scorer(experiment_config, game_instance)
+        game_scorer.compute_scores(game_interactions)
+        game_scorer.store_scores(results_root, dialogue_pair, f"{experiment_dir}/{episode_dir}")
+
+    def transcribe_episode(self, results_root: str, dialogue_pair: str, experiment_dir: str, episode_dir: str,
+                           shared_css: bool = False):
+        """
+        :param shared_css: link the style sheet at the results root instead of inlining the css into the transcript
+        """
+        experiment_config, game_instance, game_interactions = self._load_episode(results_root, dialogue_pair,
+                                                                                 experiment_dir, episode_dir)
+        rel_episode_path = f"{experiment_dir}/{episode_dir}"
+        css_href = transcript_utils.shared_css_href(4) if shared_css else None  # pair/game/experiment/episode
+        transcript = transcript_utils.build_transcript(game_interactions, experiment_config,
+                                                       game_instance, dialogue_pair, css_href=css_href)
+        self.store_results_file(transcript, "transcript.html",
+                                dialogue_pair,
+                                sub_dir=rel_episode_path,
+                                root_dir=results_root)
+        transcript_tex = transcript_utils.build_tex(game_interactions)
+        self.store_results_file(transcript_tex, "transcript.tex",
+                                dialogue_pair,
+                                sub_dir=rel_episode_path,
+                                root_dir=results_root)
+        results_index.mark_episode(results_root, dialogue_pair, self.name, rel_episode_path,
+                                   results_index.TRANSCRIBED)
+
+    def store_transcript_index(self, results_root: str, dialogue_pair: str, experiment_dir: str,
+                               episode_dirs: List[str], shared_css: bool = False):
+        """
+        Store the (paginated) index of the transcripts of an experiment as index.html in the experiment directory.
+
+        :param episode_dirs: the transcribed episodes of the experiment
+        :param shared_css: link the style sheet at the results root instead of inlining the css into the pages
+        """
+        experiment_name = "_".join(experiment_dir.split("_")[1:])
+        css_href = transcript_utils.shared_css_href(3) if shared_css else None  # pair/game/experiment
+        # episode_2 before episode_10
+        episode_dirs = sorted(episode_dirs, key=lambda name: (len(name), name))
+        pages = transcript_utils.build_experiment_index(f"Transcripts for {experiment_name} with {dialogue_pair}.",
+                                                        episode_dirs, css_href=css_href)
+        for page, content in enumerate(pages):
+            self.store_results_file(content, transcript_utils.index_page_name(page), dialogue_pair,
+                                    sub_dir=experiment_dir, root_dir=results_root)
+
+    def process_episode(self, action: str, results_root: str, dialogue_pair: str, experiment_dir: str,
+                        episode_dir: str, shared_css: bool = False) -> bool:
+        """
+        :param action: 'score' or 'transcribe'
+        :param shared_css: see transcribe_episode
+        :return: True, if the episode has been processed without exceptions; otherwise False
+        """
+        try:
+            if action == "score":
+                self.score_episode(results_root, dialogue_pair, experiment_dir, episode_dir)
+            else:
+                self.transcribe_episode(results_root, dialogue_pair, experiment_dir, episode_dir,
+                                        shared_css=shared_css)
+        except Exception:  # continue with other episodes if something goes wrong
+            self.logger.exception(f"{self.name}: Cannot {action} {episode_dir} (but continue)")
+            return False
+        return True
 
-            experiment_dirs = [file for file in os.listdir(game_result_path)
-                               if os.path.isdir(os.path.join(game_result_path, file))]
-            if not experiment_dirs:
-                stdout_logger.warning(f"{self.name}: No experiments for {dialogue_pair}")
-            for experiment_dir in experiment_dirs:
-                experiment_path = os.path.join(game_result_path, experiment_dir)
-                experiment_name = "_".join(experiment_dir.split("_")[1:])  # remove leading index number
-                if self.filter_experiment and experiment_name not in self.filter_experiment:
-                    stdout_logger.info(f"Skip experiment {experiment_name}")
-                    continue
-                stdout_logger.info(f"Scoring: {experiment_name}")
-                experiment_config = self.load_results_json(f"{experiment_dir}/experiment_{experiment_name}",
-                                                           results_root, dialogue_pair)
-                episode_dirs = [file for file in os.listdir(experiment_path)
-                                if os.path.isdir(os.path.join(experiment_path, file))]
-                error_count = 0
-                for episode_dir in tqdm(episode_dirs, desc="Scoring episodes"):
-                    try:
-                        rel_episode_path = f"{experiment_dir}/{episode_dir}"
-                        game_instance = self.load_results_json(f"{rel_episode_path}/instance",
-                                                               results_root, dialogue_pair)
-                        game_interactions = self.load_results_json(f"{rel_episode_path}/interactions",
-                                                                   results_root, dialogue_pair)
-
-                        game_scorer = self.create_game_scorer(experiment_config, game_instance)
-                        game_scorer.compute_scores(game_interactions)
-                        game_scorer.store_scores(results_root, dialogue_pair, rel_episode_path)
-                    except Exception:  # continue with other episodes if something goes wrong
-                        self.logger.exception(f"{self.name}: Cannot score {episode_dir} (but continue)")
-                        error_count += 1
-                if error_count > 0:
-                    stdout_logger.error(
-                        f"{self.name}: '{error_count}' exceptions occurred: See clembench.log for details.")
-
-    def run(self, player_models: List[Model], results_dir: str = None):
+    def run(self, player_models: List[Model], results_dir: str = None, workers: int = 1, use_async: bool = False,
+            resume: bool = False, stream_records: bool = False, compact_requests: bool = False):
         """
         Runs game-play on all game instances for a game.
         There must be an instances.json with the following structure:
@@ -743,7 +925,23 @@ class GameBenchmark(GameResourceLocator):
                             - episode_id
                                 - instance.json
                                 - interaction.json
-        """
+
+        :param player_models: to use for one or two players
+        :param results_dir: an alternative results directory structure given as a relative or absolute path
+        :param workers: the number of episodes to play concurrently (default: 1, one after another). Each episode
+                        gets its own game master, so this is safe as long as the models can be called concurrently,
+                        which is the case for the remote API backends, but not for the local backends.
+        :param use_async: play the episodes as coroutines on a single event loop (see GameMaster.aplay) instead of
+                          using a thread per episode; then workers is the maximal number of episodes in flight
+        :param resume: skip the episodes which have already been recorded completely by a previous run,
+                       e.g. after a crash or when new instances have been added to an experiment
+        :param stream_records: append the interactions and calls of each episode to JSON lines files while playing
+                               (see GameRecorder.start_streaming)
+        :param compact_requests: store the calls of each episode delta-encoded in requests_compact.json
+                                 (see file_utils.encode_requests)
+        """
+        self.stream_records = stream_records
+        self.compact_requests = compact_requests
         results_root = "results" if results_dir is None else results_dir
         experiments: List = self.instances["experiments"]
         if not experiments:
@@ -806,50 +1004,265 @@ class GameBenchmark(GameResourceLocator):
                 experiment_record_dir = f"{experiment_idx}_{experiment_name}"
                 experiment_config = {k: experiment[k] for k in experiment if k != 'game_instances'}
 
+                game_instances: List = experiment["game_instances"]
+                # the episode number is fixed by the position of the instance, so that the
+                # episode directories are the same no matter in which order the episodes finish
+                episodes = list(enumerate(game_instances, start=episode_counter))
+                if resume:
+                    episodes = [(episode_id, game_instance) for episode_id, game_instance in episodes
+                                if not self._is_episode_complete(episode_id, game_instance, experiment_record_dir,
+                                                                 dialogue_pair_desc, results_root)]
+                    stdout_logger.info(f"Resume: {len(game_instances) - len(episodes)} of {len(game_instances)} "
+                                       f"episodes already played")
+                    if not episodes:  # keep the experiment record of the previous run
+                        continue
+
                 # Add some important infos to track
                 experiment_config["timestamp"] = datetime.now().isoformat()
                 experiment_config["dialogue_partners"] = dialogue_pair_desc
-
-                self.store_results_file(experiment_config,
-                                        f"experiment_{experiment_name}.json",
+                experiment_file_name = f"experiment_{experiment_name}.json"
+                experiment_record = experiment_config
+                resumed_run = None
+                if resume:  # keep the record of the original run and add the resumed run to it
+                    previous_record = self._load_experiment_record(experiment_file_name, experiment_record_dir,
+                                                                   dialogue_pair_desc, results_root)
+                    if previous_record is not None:
+                        resumed_run = {"resumed_at": experiment_config["timestamp"], "episodes": len(episodes)}
+                        experiment_record = previous_record
+                        experiment_record.setdefault("resumed_runs", []).append(resumed_run)
+
+                self.store_results_file(experiment_record,
+                                        experiment_file_name,
                                         dialogue_pair_desc,
                                         sub_dir=experiment_record_dir,
                                         root_dir=results_root)
 
                 error_count = 0
                 time_experiment_start = datetime.now()
-                game_instances: List = experiment["game_instances"]
-                for game_instance in tqdm(game_instances, desc="Playing games"):
-                    game_id = game_instance["game_id"]
-                    self.logger.info("Activity: %s Experiment: %s Episode: %d Game: %s",
-                                     self.name, experiment_name, episode_counter, game_id)
-                    episode_dir = experiment_record_dir + f"/episode_{episode_counter}"
-                    self.store_results_file(game_instance,
-                                            f"instance.json",
-                                            dialogue_pair_desc,
-                                            sub_dir=episode_dir,
-                                            root_dir=results_root)
-                    try:
-                        game_master = self.create_game_master(experiment_config, dialogue_pair)
-                        game_master.setup(**game_instance)
-                        game_master.play()
-                        game_master.store_records(results_root, dialogue_pair_desc, episode_dir)
-                    except Exception:  # continue with other episodes if something goes wrong
-                        self.logger.exception(f"{self.name}: Exception for episode {game_id} (but continue)")
-                        error_count += 1
-                    episode_counter += 1
+                if use_async:
+                    error_count = run_coroutine(self._arun_episodes(episodes, workers,
+                                                                    experiment_config, experiment_record_dir,
+                                                                    dialogue_pair, dialogue_pair_desc, results_root))
+                elif workers > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(self._run_episode, episode_id, game_instance,
+                                                   experiment_config, experiment_record_dir,
+                                                   dialogue_pair, dialogue_pair_desc, results_root)
+                                   for episode_id, game_instance in episodes]
+                        for future in tqdm(as_completed(futures), total=len(futures), desc="Playing games"):
+                            if not future.result():
+                                error_count += 1
+                else:
+                    for episode_id, game_instance in tqdm(episodes, desc="Playing games"):
+                        if not self._run_episode(episode_id, game_instance,
+                                                 experiment_config, experiment_record_dir,
+                                                 dialogue_pair, dialogue_pair_desc, results_root):
+                            error_count += 1
                 if error_count > 0:
                     stdout_logger.error(
                         f"{self.name}: '{error_count}' exceptions occurred: See clembench.log for details.")
                 # Add experiment duration and overwrite file
                 time_experiment_end = datetime.now() - time_experiment_start
-                experiment_config["duration"] = str(time_experiment_end)
-                self.store_results_file(experiment_config,
-                                        f"experiment_{experiment_name}.json",
+                if resumed_run is not None:
+                    resumed_run["duration"] = str(time_experiment_end)
+                else:
+                    experiment_record["duration"] = str(time_experiment_end)
+                self.store_results_file(experiment_record,
+                                        experiment_file_name,
                                         dialogue_pair_desc,
                                         sub_dir=experiment_record_dir,
                                         root_dir=results_root)
 
+    def _run_episode(self, episode_id: int, game_instance: Dict, experiment_config: Dict,
+                     experiment_record_dir: str, dialogue_pair: List[Model], dialogue_pair_desc: str,
+                     results_root: str) -> bool:
+        """
+        Play a single episode with a fresh game master and store its records.
+
+        :return: True, if the episode has been played without exceptions; otherwise False
+        """
+        game_id = game_instance["game_id"]
+        self.logger.info("Activity: %s Experiment: %s Episode: %d Game: %s",
+                         self.name, experiment_config["name"], episode_id, game_id)
+        episode_dir = experiment_record_dir + f"/episode_{episode_id}"
+        self.store_results_file(game_instance,
+                                f"instance.json",
+                                dialogue_pair_desc,
+                                sub_dir=episode_dir,
+                                root_dir=results_root)
+        game_master = None
+        try:
+            game_master = self.create_game_master(experiment_config, dialogue_pair)
+            game_master.compact_requests = self.compact_requests
+            if self.stream_records:
+                game_master.start_streaming(results_root, dialogue_pair_desc, episode_dir)
+            game_master.setup(**game_instance)
+            game_master.play()
+            game_master.store_records(results_root, dialogue_pair_desc, episode_dir)
+            self._mark_episode_complete(episode_id, game_instance, experiment_record_dir,
+                                        dialogue_pair_desc, results_root)
+        except Exception:  # continue with other episodes if something goes wrong
+            self.logger.exception(f"{self.name}: Exception for episode {game_id} (but continue)")
+            return False
+        finally:
+            if game_master is not None:
+                game_master.stop_streaming()  # keep the lines recorded so far
+        return True
+
+    async def _arun_episodes(self, episodes: List[Tuple[int, Dict]], max_in_flight: int, experiment_config: Dict,
+                             experiment_record_dir: str, dialogue_pair: List[Model], dialogue_pair_desc: str,
+                             results_root: str) -> int:
+        """
+        Play the episodes concurrently on the running event loop.
+
+        :return: the number of episodes that raised an exception
+        """
+        semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+        async def bounded(episode_id: int, game_instance: Dict) -> bool:
+            async with semaphore:
+                return await self._arun_episode(episode_id, game_instance, experiment_config, experiment_record_dir,
+                                                dialogue_pair, dialogue_pair_desc, results_root)
+
+        tasks = [asyncio.create_task(bounded(episode_id, game_instance)) for episode_id, game_instance in episodes]
+        error_count = 0
+        for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Playing games"):
+            if not await task:
+                error_count += 1
+        return error_count
+
+    async def _arun_episode(self, episode_id: int, game_instance: Dict, experiment_config: Dict,
+                            experiment_record_dir: str, dialogue_pair: List[Model], dialogue_pair_desc: str,
+                            results_root: str) -> bool:
+        """
+        Coroutine version of _run_episode() which awaits GameMaster.aplay().
+
+        :return: True, if the episode has been played without exceptions; otherwise False
+        """
+        game_id = game_instance["game_id"]
+        self.logger.info("Activity: %s Experiment: %s Episode: %d Game: %s",
+                         self.name, experiment_config["name"], episode_id, game_id)
+        episode_dir = experiment_record_dir + f"/episode_{episode_id}"
+        self.store_results_file(game_instance,
+                                f"instance.json",
+                                dialogue_pair_desc,
+                                sub_dir=episode_dir,
+                                root_dir=results_root)
+        game_master = None
+        try:
+            game_master = self.create_game_master(experiment_config, dialogue_pair)
+            game_master.compact_requests = self.compact_requests
+            if self.stream_records:
+                game_master.start_streaming(results_root, dialogue_pair_desc, episode_dir)
+            game_master.setup(**game_instance)
+            await game_master.aplay()
+            game_master.store_records(results_root, dialogue_pair_desc, episode_dir)
+            self._mark_episode_complete(episode_id, game_instance, experiment_record_dir,
+                                        dialogue_pair_desc, results_root)
+        except Exception:  # continue with other episodes if something goes wrong
+            self.logger.exception(f"{self.name}: Exception for episode {game_id} (but continue)")
+            return False
+        finally:
+            if game_master is not None:
+                game_master.stop_streaming()  # keep the lines recorded so far
+        return True
+
+    def _load_experiment_record(self, experiment_file_name: str, experiment_record_dir: str,
+                                dialogue_pair_desc: str, results_root: str) -> Dict:
+        """
+        :return: the experiment record stored by a previous run, or None if there is none
+        """
+        file_path = os.path.join(self.results_path_for(results_root, dialogue_pair_desc),
+                                 experiment_record_dir, experiment_file_name)
+        if not file_utils.is_valid_json_file(file_path):
+            return None
+        return self.load_results_json(f"{experiment_record_dir}/{experiment_file_name}", results_root,
+                                      dialogue_pair_desc)
+
+    def _load_run_manifest(self, experiment_record_dir: str, dialogue_pair_desc: str, results_root: str) -> Dict:
+        manifest_path = os.path.join(self.results_path_for(results_root, dialogue_pair_desc),
+                                     experiment_record_dir, RUN_MANIFEST_FILE_NAME)
+        if manifest_path not in self._run_manifests:
+            if file_utils.is_valid_json_file(manifest_path):
+                self._run_manifests[manifest_path] = self.load_results_json(
+                    f"{experiment_record_dir}/{RUN_MANIFEST_FILE_NAME}", results_root, dialogue_pair_desc)
+            else:
+                self._run_manifests[manifest_path] = None
+        return self._run_manifests[manifest_path]
+
+    def _mark_episode_complete(self, episode_id: int, game_instance: Dict, experiment_record_dir: str,
+                               dialogue_pair_desc: str, results_root: str):
+        """
+        Add the episode to the run manifest of the experiment. The manifest is only written after the episode
+        records have been stored, so that an interrupted episode is never listed.
+        """
+        with self._run_manifests_lock:
+            manifest_path = os.path.join(self.results_path_for(results_root, dialogue_pair_desc),
+                                         experiment_record_dir, RUN_MANIFEST_FILE_NAME)
+            run_manifest = self._load_run_manifest(experiment_record_dir, dialogue_pair_desc, results_root)
+            if run_manifest is None:
+                run_manifest = self._run_manifests[manifest_path] = dict(episodes=dict())
+            run_manifest["episodes"][f"episode_{episode_id}"] = {
+                "game_id": game_instance["game_id"],
+                "timestamp": datetime.now().isoformat()
+            }
+            self.store_results_file(run_manifest, RUN_MANIFEST_FILE_NAME, dialogue_pair_desc,
+                                    sub_dir=experiment_record_dir, root_dir=results_root)
+
+    def _create_run_manifest(self, experiment_record_dir: str, dialogue_pair_desc: str, results_root: str) -> Dict:
+        """
+        Create the run manifest of results from before the manifest was introduced: it lists all the episodes whose
+        records are complete, so that later resumed runs keep them as well.
+        """
+        with self._run_manifests_lock:
+            manifest_path = os.path.join(self.results_path_for(results_root, dialogue_pair_desc),
+                                         experiment_record_dir, RUN_MANIFEST_FILE_NAME)
+            run_manifest = dict(episodes=dict())
+            experiment_path = os.path.dirname(manifest_path)
+            episode_dirs = sorted(entry for entry in os.listdir(experiment_path)
+                                  if entry.startswith("episode_")) if os.path.isdir(experiment_path) else []
+            for episode_dir in episode_dirs:
+                episode_path = os.path.join(experiment_path, episode_dir)
+                if not self._has_episode_records(episode_path):
+                    continue
+                stored_instance = self.load_results_json(f"{experiment_record_dir}/{episode_dir}/instance",
+                                                         results_root, dialogue_pair_desc)
+                recorded_at = os.path.getmtime(os.path.join(episode_path, "interactions.json"))
+                run_manifest["episodes"][episode_dir] = {
+                    "game_id": stored_instance["game_id"],
+                    "timestamp": datetime.fromtimestamp(recorded_at).isoformat()
+                }
+            self._run_manifests[manifest_path] = run_manifest
+            if run_manifest["episodes"]:
+                self.store_results_file(run_manifest, RUN_MANIFEST_FILE_NAME, dialogue_pair_desc,
+                                        sub_dir=experiment_record_dir, root_dir=results_root)
+            return run_manifest
+
+    @staticmethod
+    def _has_episode_records(episode_path: str) -> bool:
+        for file_name in ["instance.json", "interactions.json"]:
+            if not file_utils.is_valid_json_file(os.path.join(episode_path, file_name)):
+                return False
+        requests_files = ["requests.json", file_utils.COMPACT_REQUESTS_FILE_NAME]
+        return any(file_utils.is_valid_json_file(os.path.join(episode_path, file_name)) for file_name in requests_files)
+
+    def _is_episode_complete(self, episode_id: int, game_instance: Dict, experiment_record_dir: str,
+                             dialogue_pair_desc: str, results_root: str) -> bool:
+        """
+        :return: True, if the episode has been recorded completely for the same game instance; otherwise False
+        """
+        episode_dir = f"episode_{episode_id}"
+        episode_path = os.path.join(self.results_path_for(results_root, dialogue_pair_desc),
+                                    experiment_record_dir, episode_dir)
+        if not self._has_episode_records(episode_path):
+            return False
+        run_manifest = self._load_run_manifest(experiment_record_dir, dialogue_pair_desc, results_root)
+        if run_manifest is None:  # results from before the manifest was introduced: rely on the files once
+            run_manifest = self._create_run_manifest(experiment_record_dir, dialogue_pair_desc, results_root)
+        if episode_dir not in run_manifest["episodes"]:
+            return False
+        return run_manifest["episodes"][episode_dir]["game_id"] == game_instance["game_id"]
+
     def is_single_player(self) -> bool:
         """
         Decide if only a single cLLM is part of the interaction.
@@ -865,6 +1278,23 @@ class GameBenchmark(GameResourceLocator):
         raise NotImplementedError()
 
 
+_event_loop: asyncio.AbstractEventLoop = None  # shared by all the asynchronous runs of this process
+
+
+def run_coroutine(coro):
+    """
+    Run a coroutine (e.g. the episodes of an experiment) to completion on the event loop of this process. All the
+    experiments and games are played on the same loop, because the asynchronous clients of the backends keep their
+    connections bound to the loop they were first used on (which asyncio.run() would close after each experiment).
+
+    :return: the result of the coroutine
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop.run_until_complete(coro)
+
+
 class GameInstanceGenerator(GameResourceLocator):
     """
     Create all game instances for a game benchmark.
@@ -925,14 +1355,112 @@ class GameInstanceGenerator(GameResourceLocator):
         self.store_file(self.instances, filename, sub_dir="in")
 
 
-def load_benchmarks(do_setup: bool = True) -> List[GameBenchmark]:
+def _init_episode_worker():
+    # worker processes must never open plot windows
+    os.environ["MPLBACKEND"] = "Agg"
+    if "matplotlib" in sys.modules:
+        sys.modules["matplotlib"].use("Agg")
+
+
+_worker_benchmarks: Dict[Tuple[str, str], "GameBenchmark"] = dict()  # the game benchmarks of a worker process
+
+
+def _process_episode_in_worker(benchmark_class: Tuple[str, str], action: str, results_root: str,
+                               dialogue_pair: str, experiment_dir: str, episode_dir: str, shared_css: bool) -> bool:
+    """
+    :param benchmark_class: the module and the name of the GameBenchmark class of the game; the worker imports it
+                            itself, because only forked worker processes inherit all the game modules imported so
+                            far, while spawned ones (the default on macOS and Windows) only know the games which
+                            the clemgame package loads from the games directory
+    """
+    if benchmark_class not in _worker_benchmarks:
+        module_name, class_name = benchmark_class
+        _worker_benchmarks[benchmark_class] = getattr(importlib.import_module(module_name), class_name)()
+    return _worker_benchmarks[benchmark_class].process_episode(action, results_root, dialogue_pair,
+                                                               experiment_dir, episode_dir, shared_css=shared_css)
+
+
+def process_episodes(benchmarks: List[GameBenchmark], action: str, results_dir: str = None,
+                     jobs: int = 1, shared_css: bool = False, index_pages: bool = False) -> Dict[str, int]:
+    """
+    Score or transcribe the recorded episodes of the games. With jobs > 1 the episodes of all the games are
+    processed by a single pool of worker processes.
+
+    :param benchmarks: the games whose episodes to process
+    :param action: 'score' or 'transcribe'
+    :param results_dir: the results root directory
+    :param jobs: the number of worker processes; 1 processes the episodes in this process
+    :param shared_css: transcripts link a single style sheet at the results root instead of inlining the css
+    :param index_pages: after transcribing, store a (paginated) index.html of the transcripts of each experiment
+    :return: the number of episodes that raised an exception per game name
+    """
+    assert action in ["score", "transcribe"], f"Unknown action: {action}"
+    activity = "Scoring" if action == "score" else "Transcribe"
+    results_root = file_utils.results_root(results_dir)
+    tasks = []
+    for benchmark in benchmarks:
+        tasks.extend((benchmark, episode) for episode in benchmark.list_episodes(results_root, activity))
+    error_counts = {benchmark.name: 0 for benchmark in benchmarks}
+    desc = "Scoring episodes" if action == "score" else "Building transcripts"
+    if action == "transcribe" and shared_css:
+        file_utils.store_file(transcript_utils.CSS_STRING, transcript_utils.CSS_FILE_NAME, results_root)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_episode_worker) as executor:
+            futures = [executor.submit(_process_episode_in_worker,
+                                       (type(benchmark).__module__, type(benchmark).__qualname__),
+                                       action, results_root, *episode, shared_css)
+                       for benchmark, episode in tasks]
+            for _ in tqdm(as_completed(futures), total=len(futures), desc=desc):
+                pass
+            # collect in submission order, so that the reported errors do not depend on the scheduling
+            processed = [future.result() for future in futures]
+    else:
+        processed = [benchmark.process_episode(action, results_root, *episode, shared_css=shared_css)
+                     for benchmark, episode in tqdm(tasks, desc=desc)]
+    for (benchmark, _), is_processed in zip(tasks, processed):
+        if not is_processed:
+            error_counts[benchmark.name] += 1
+    if action == "score":
+        _update_scores_store(results_root, benchmarks,
+                             [task for task, is_processed in zip(tasks, processed) if is_processed])
+    if action == "transcribe" and index_pages:
+        _store_transcript_indexes(results_root, [task for task, is_processed in zip(tasks, processed)
+                                                 if is_processed], shared_css)
+    for game_name, error_count in error_counts.items():
+        if error_count > 0:
+            stdout_logger.error(
+                f"{game_name}: '{error_count}' exceptions occurred: See clembench.log for details.")
+    return error_counts
+
+
+def _store_transcript_indexes(results_root: str, transcribed_tasks: List, shared_css: bool):
+    experiments = collections.defaultdict(list)
+    for benchmark, (dialogue_pair, experiment_dir, episode_dir) in transcribed_tasks:
+        experiments[(benchmark, dialogue_pair, experiment_dir)].append(episode_dir)
+    for (benchmark, dialogue_pair, experiment_dir), episode_dirs in experiments.items():
+        benchmark.store_transcript_index(results_root, dialogue_pair, experiment_dir, episode_dirs,
+                                         shared_css=shared_css)
+
+
+def _update_scores_store(results_root: str, benchmarks: List[GameBenchmark], scored_tasks: List):
+    for benchmark in benchmarks:
+        scored_episodes = []
+        for task_benchmark, (dialogue_pair, experiment_dir, episode_dir) in scored_tasks:
+            if task_benchmark is benchmark:
+                scores = benchmark.load_results_json(f"{experiment_dir}/{episode_dir}/scores",
+                                                     results_root, dialogue_pair)
+                scored_episodes.append((dialogue_pair, experiment_dir, episode_dir, scores))
+        scores_store.update(results_root, benchmark.name, scored_episodes)
+
+
+def load_benchmarks(do_setup: bool = True, instances_name: str = None) -> List[GameBenchmark]:
     game_benchmarks = []
     for gb_cls in GameBenchmark.__subclasses__():
         gb = gb_cls()  # subclasses should only get the model_name
-        if do_setup:
-            gb.setup()
         if gb.name in GAMES_TO_IGNORE:
             continue  # only a showcase
+        if do_setup:
+            gb.setup(instances_name)
         game_benchmarks.append(gb)
     return game_benchmarks
 
@@ -1,7 +1,15 @@
-from typing import Dict
+from collections.abc import Sequence
+from typing import Dict, List, Iterable, Any, Optional, Tuple
+import hashlib
 import os
 import json
 import csv
+import tempfile
+
+COMPACT_REQUESTS_FILE_NAME = "requests_compact.json"
+COMPACT_REQUESTS_FORMAT = "delta-v2"  # delta-v1 did not escape keys starting with "$" in the logged objects
+COMPACT_REQUESTS_FORMATS = ["delta-v1", COMPACT_REQUESTS_FORMAT]
+BLOB_MIN_LENGTH = 1024  # strings of at least this length (e.g. base64 images) are stored only once per file
 
 
 def project_root():
@@ -100,17 +108,224 @@ def store_file(data, file_name: str, dir_path: str, sub_dir: str = None, do_over
     if sub_dir:
         dir_path = os.path.join(dir_path, sub_dir)
 
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
+    os.makedirs(dir_path, exist_ok=True)
 
     fp = os.path.join(dir_path, file_name)
     if not do_overwrite:
         if os.path.exists(fp):
             raise FileExistsError(fp)
 
-    with open(fp, "w", encoding='utf-8') as f:
-        if file_name.endswith(".json"):
-            json.dump(data, f, ensure_ascii=False)
-        else:
-            f.write(data)
+    # write to a temporary file first, so that an interrupted run never leaves a partially written file behind
+    tmp_fd, tmp_fp = tempfile.mkstemp(dir=os.path.dirname(fp), prefix=f".{os.path.basename(fp)}.", suffix=".tmp")
+    try:
+        with open(tmp_fd, "w", encoding='utf-8') as f:
+            if file_name.endswith(".json"):
+                json.dump(data, f, ensure_ascii=False)
+            else:
+                f.write(data)
+        os.chmod(tmp_fp, 0o644)  # mkstemp creates files only readable by the owner
+        os.replace(tmp_fp, fp)
+    except BaseException:
+        if os.path.exists(tmp_fp):
+            os.remove(tmp_fp)
+        raise
     return fp
+
+
+def is_valid_json_file(fp: str) -> bool:
+    """
+    :param fp: the path to the file
+    :return: True, if the file exists and can be parsed as JSON; otherwise False
+    """
+    if not os.path.isfile(fp):
+        return False
+    try:
+        with open(fp, encoding='utf8') as f:
+            json.load(f)
+    except ValueError:
+        return False
+    return True
+
+
+def compact_json_lines(jsonl_path: str, json_path: str) -> str:
+    """
+    Convert a file with one JSON object per line into a file with a JSON list of these objects. The lines are copied
+    as they are (without parsing), so that large files can be compacted with little memory. The .jsonl file is
+    removed afterwards.
+    :param jsonl_path: the JSON lines file
+    :param json_path: the JSON file to write
+    :return: the path to the JSON file
+    """
+    dir_path = os.path.dirname(json_path)
+    tmp_fd, tmp_fp = tempfile.mkstemp(dir=dir_path, prefix=f".{os.path.basename(json_path)}.", suffix=".tmp")
+    try:
+        with open(tmp_fd, "w", encoding='utf-8') as f, open(jsonl_path, encoding='utf-8') as lines:
+            f.write("[")
+            separator = ""
+            for line in lines:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                f.write(separator + line)
+                separator = ", "  # as written by json.dump
+            f.write("]")
+        os.chmod(tmp_fp, 0o644)
+        os.replace(tmp_fp, json_path)
+    except BaseException:
+        if os.path.exists(tmp_fp):
+            os.remove(tmp_fp)
+        raise
+    os.remove(jsonl_path)
+    return json_path
+
+
+def _content_hash(value: Any) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _is_message_list(prompt_obj: Any) -> bool:
+    return isinstance(prompt_obj, list) and all(isinstance(message, dict) for message in prompt_obj)
+
+
+def _to_blobs(value: Any, blobs: Dict[str, str]) -> Any:
+    """ Replace long strings by blob references and escape dict keys starting with "$" (like the markers) """
+    if isinstance(value, str) and len(value) >= BLOB_MIN_LENGTH:
+        key = _content_hash(value)
+        blobs[key] = value
+        return {"$blob": key}
+    if isinstance(value, dict):
+        return {("$" + k if k.startswith("$") else k): _to_blobs(v, blobs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_blobs(v, blobs) for v in value]
+    return value
+
+
+def _from_blobs(value: Any, blobs: Dict[str, str], escaped: bool = True) -> Any:
+    """ Reverse _to_blobs; escaped=False reads delta-v1 logs which did not escape the keys """
+    if isinstance(value, dict):
+        if len(value) == 1 and "$blob" in value:
+            return blobs[value["$blob"]]
+        return {(k[1:] if escaped and k.startswith("$") else k): _from_blobs(v, blobs, escaped)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_from_blobs(v, blobs, escaped) for v in value]
+    return value
+
+
+def _prefix_hashes(hashes: List[str]) -> List[str]:
+    """ :return: for each length k a hash of the first k message hashes, computed incrementally """
+    prefix_hashes = []
+    prefix_hash = ""
+    for message_hash in hashes:
+        prefix_hash = hashlib.sha256((prefix_hash + message_hash).encode("utf-8")).hexdigest()
+        prefix_hashes.append(prefix_hash)
+    return prefix_hashes
+
+
+def _find_base(prefix_index: Dict[str, int], prefix_hashes: List[str]) -> Tuple[Optional[int], int]:
+    """
+    Find the previous prompt that shares the longest message prefix (preferring the most recent one)
+    :param prefix_index: maps the prefix hashes of the previous prompts to the most recent prompt having the prefix
+    :param prefix_hashes: the prefix hashes of the prompt (see _prefix_hashes)
+    :return: the index of the base prompt (or None) and the number of shared messages
+    """
+    for keep in range(len(prefix_hashes), 0, -1):
+        base = prefix_index.get(prefix_hashes[keep - 1])
+        if base is not None:
+            return base, keep
+    return None, 0
+
+
+def encode_requests(requests: Iterable[Dict]) -> Dict:
+    """
+    Encode request logs (as stored in requests.json) compactly: a list of messages is stored as a reference to the
+    previous prompt sharing the longest prefix (usually the one of the same player in the previous turn) plus the
+    appended messages; long strings like images are stored once in a content-addressed blob table.
+    :param requests: the logged calls with 'manipulated_prompt_obj' and 'raw_response_obj'
+    :return: the compact representation to be read with RequestsReader
+    """
+    blobs = dict()
+    encoded_requests = []
+    prefix_index: Dict[str, int] = dict()
+    for idx, request in enumerate(requests):
+        encoded_request = dict(request)
+        prompt_obj = request["manipulated_prompt_obj"]
+        if _is_message_list(prompt_obj):
+            prefix_hashes = _prefix_hashes([_content_hash(message) for message in prompt_obj])
+            base, keep = _find_base(prefix_index, prefix_hashes)
+            encoded_request["manipulated_prompt_obj"] = {"$delta": {
+                "base": base,
+                "keep": keep,
+                "append": _to_blobs(prompt_obj[keep:], blobs)
+            }}
+            prefix_index.update((prefix_hash, idx) for prefix_hash in prefix_hashes)
+        else:
+            encoded_request["manipulated_prompt_obj"] = _to_blobs(prompt_obj, blobs)
+        encoded_request["raw_response_obj"] = _to_blobs(request["raw_response_obj"], blobs)
+        encoded_requests.append(encoded_request)
+    return {"format": COMPACT_REQUESTS_FORMAT, "blobs": blobs, "requests": encoded_requests}
+
+
+class RequestsReader(Sequence):
+    """
+    Read-only list of the logged calls of a compact request log (see encode_requests). The full prompts are
+    reconstructed only when a call is accessed. The returned prompts share their message objects with each other,
+    so they should not be modified.
+    """
+
+    def __init__(self, compact_requests: Dict):
+        if compact_requests.get("format") not in COMPACT_REQUESTS_FORMATS:
+            raise ValueError(f"Unknown request log format: {compact_requests.get('format')}")
+        self._escaped = compact_requests["format"] != "delta-v1"
+        self._blobs = compact_requests["blobs"]
+        self._requests = compact_requests["requests"]
+        self._prompts: Dict[int, List[Dict]] = dict()  # reconstructed message lists
+
+    def __len__(self):
+        return len(self._requests)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        request = dict(self._requests[idx])
+        request["manipulated_prompt_obj"] = self.get_prompt(idx)
+        request["raw_response_obj"] = _from_blobs(request["raw_response_obj"], self._blobs, self._escaped)
+        return request
+
+    def get_prompt(self, idx: int) -> Any:
+        """
+        :return: the full 'manipulated_prompt_obj' of the call at the index
+        """
+        prompt_obj = self._requests[idx]["manipulated_prompt_obj"]
+        if not (isinstance(prompt_obj, dict) and "$delta" in prompt_obj):
+            return _from_blobs(prompt_obj, self._blobs, self._escaped)
+        # follow the references back to a prompt that is already known (or has no base)
+        chain = []
+        while idx is not None and idx not in self._prompts:
+            delta = self._requests[idx]["manipulated_prompt_obj"]["$delta"]
+            chain.append((idx, delta))
+            idx = delta["base"]
+        messages = self._prompts[idx] if idx is not None else []
+        for idx, delta in reversed(chain):
+            messages = messages[:delta["keep"]] + _from_blobs(delta["append"], self._blobs, self._escaped)
+            self._prompts[idx] = messages
+        return list(messages)
+
+
+def load_requests(episode_dir: str) -> Sequence:
+    """
+    Load the logged calls of an episode, no matter whether they have been stored as requests.json or in the
+    compact format.
+    :param episode_dir: the path to the episode directory
+    :return: the list of calls as stored in requests.json
+    """
+    compact_fp = os.path.join(episode_dir, COMPACT_REQUESTS_FILE_NAME)
+    if os.path.isfile(compact_fp):
+        with open(compact_fp, encoding='utf8') as f:
+            return RequestsReader(json.load(f))
+    with open(os.path.join(episode_dir, "requests.json"), encoding='utf8') as f:
+        return json.load(f)
@@ -0,0 +1,339 @@
+"""
+    SQLite index of the episodes in a results directory, so that listing and filtering the episodes does not need to
+    walk the directory tree (which is slow on network file systems). The index lives at the results root and maps
+    each (dialogue pair, game, experiment, episode) to its directory and to when it was recorded, scored and
+    transcribed. It is updated whenever the records, scores or transcripts of an episode are stored.
+
+    When the index is created, it is filled from the episodes that are already in the results directory. Results
+    that are copied into (or removed from) the directory by other means are found by comparing the modification times
+    of the game directories with those stored in the index: only the experiments of the changed games are looked
+    into again (see ResultsIndex.sync()). Episodes copied into experiments that are already indexed are only found
+    when all the experiments are looked into (`cli.py index sync --full`).
+"""
+import collections
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple, Union
+
+import clemgame
+from clemgame import file_utils
+
+logger = clemgame.get_logger(__name__)
+
+INDEX_FILE_NAME = "results_index.sqlite"
+
+RECORDED = "recorded"
+SCORED = "scored"
+TRANSCRIBED = "transcribed"
+STATUSES = [RECORDED, SCORED, TRANSCRIBED]
+# the file that shows that an episode has the status (when the index is rebuilt from the directory)
+STATUS_FILES = {RECORDED: "interactions.json", SCORED: "scores.json", TRANSCRIBED: "transcript.html"}
+
+IndexedEpisode = collections.namedtuple("IndexedEpisode",
+                                        ["dialogue_pair", "game", "experiment", "episode",
+                                         RECORDED, SCORED, TRANSCRIBED])
+
+Names = Union[str, List[str]]
+
+
+def _sub_dirs(path: str, names: Names = None) -> List[str]:
+    if isinstance(names, str):
+        names = [names]
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entry.name for entry in entries
+                          if entry.is_dir() and (names is None or entry.name in names))
+    except FileNotFoundError:  # removed meanwhile
+        return []
+
+
+def _conditions(**filters: Names) -> Tuple[List[str], List[str]]:
+    conditions, params = [], []
+    for column, names in filters.items():
+        if names is None:
+            continue
+        names = [names] if isinstance(names, str) else list(names)
+        conditions.append(f"{column} IN ({', '.join('?' * len(names))})")
+        params.extend(names)
+    return conditions, params
+
+
+def _where(conditions: List[str]) -> str:
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+class ResultsIndex:
+    """
+    The episodes of a results directory. Safe to use from several threads; several processes may use the same index.
+    """
+
+    def __init__(self, results_root: str, read_only: bool = False):
+        """
+        :param results_root: the results directory; the index is created (and filled), if it does not exist
+        :param read_only: only query the existing index, without writing anything into the results directory
+        """
+        self.results_root = results_root
+        self.db_path = os.path.join(results_root, INDEX_FILE_NAME)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            # without a journal, no other process is writing: then the index is opened without any locking
+            is_written = any(os.path.exists(self.db_path + suffix) for suffix in ["-journal", "-wal"])
+            mode = "mode=ro" if is_written else "immutable=1"
+            uri = f"file:{urllib.request.pathname2url(os.path.abspath(self.db_path))}?{mode}"
+            self._connection = sqlite3.connect(uri, uri=True, timeout=60, check_same_thread=False)
+            return
+        is_new = not os.path.exists(self.db_path)
+        os.makedirs(results_root, exist_ok=True)
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        # the default rollback journal: a write-ahead log needs shared memory, which does not work on network
+        # file systems (indexes created with a write-ahead log are converted, unless they are in use)
+        try:
+            self._connection.execute("PRAGMA journal_mode=DELETE")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Cannot change the journal mode of {self.db_path}: {e}")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS episodes "
+                                 "(dialogue_pair TEXT, game TEXT, experiment TEXT, episode TEXT, "
+                                 f"{RECORDED} REAL, {SCORED} REAL, {TRANSCRIBED} REAL, "
+                                 "PRIMARY KEY (dialogue_pair, game, experiment, episode))")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS episodes_game ON episodes (game)")
+        # the modification times of the game and experiment directories when they were last listed
+        self._connection.execute("CREATE TABLE IF NOT EXISTS games "
+                                 "(dialogue_pair TEXT, game TEXT, mtime REAL, PRIMARY KEY (dialogue_pair, game))")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS experiments "
+                                 "(dialogue_pair TEXT, game TEXT, experiment TEXT, mtime REAL, "
+                                 "PRIMARY KEY (dialogue_pair, game, experiment))")
+        self._connection.commit()
+        if is_new:
+            self.rebuild()
+
+    def episode_path(self, episode: IndexedEpisode) -> str:
+        return os.path.join(self.results_root, episode.dialogue_pair, episode.game,
+                            episode.experiment, episode.episode)
+
+    def mark(self, dialogue_pair: str, game: str, experiment: str, episode: str, status: str):
+        """
+        Record that the episode has been recorded, scored or transcribed (just now).
+        """
+        assert status in STATUSES, f"Unknown status: {status}"
+        with self._lock:
+            self._connection.execute("INSERT OR IGNORE INTO episodes (dialogue_pair, game, experiment, episode) "
+                                     "VALUES (?, ?, ?, ?)", (dialogue_pair, game, experiment, episode))
+            self._connection.execute(f"UPDATE episodes SET {status} = ? WHERE dialogue_pair = ? AND game = ? "
+                                     "AND experiment = ? AND episode = ?",
+                                     (time.time(), dialogue_pair, game, experiment, episode))
+            self._connection.commit()
+
+    def query(self, dialogue_pair: Names = None, game: Names = None, experiment: Names = None,
+              episode: Names = None, status: str = None) -> List[IndexedEpisode]:
+        """
+        Select episodes; each filter is a name or a list of names. Without filters, all episodes are returned.
+        :param status: only the episodes that have this status (e.g. SCORED)
+        :return: the selected episodes, ordered by dialogue pair, game, experiment and episode
+        """
+        conditions, params = _conditions(dialogue_pair=dialogue_pair, game=game,
+                                         experiment=experiment, episode=episode)
+        if status is not None:
+            assert status in STATUSES, f"Unknown status: {status}"
+            conditions.append(f"{status} IS NOT NULL")
+        sql = "SELECT * FROM episodes" + _where(conditions) + " ORDER BY dialogue_pair, game, experiment, episode"
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [IndexedEpisode(*row) for row in rows]
+
+    def rebuild(self) -> int:
+        """
+        Replace the index with the episodes found in the results directory.
+        :return: the number of indexed episodes
+        """
+        rows, game_rows, experiment_rows = [], [], []
+        for game_key, game_mtime in self._game_dirs():
+            game_rows.append((*game_key, game_mtime))
+            for experiment_key, mtime in self._experiment_dirs(game_key):
+                rows.extend(self._episode_rows(experiment_key, _sub_dirs(self._path(*experiment_key))))
+                experiment_rows.append((*experiment_key, mtime))
+        with self._lock:
+            self._connection.execute("DELETE FROM episodes")
+            self._connection.executemany("INSERT INTO episodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.execute("DELETE FROM games")
+            self._connection.executemany("INSERT INTO games VALUES (?, ?, ?)", game_rows)
+            self._connection.execute("DELETE FROM experiments")
+            self._connection.executemany("INSERT INTO experiments VALUES (?, ?, ?, ?)", experiment_rows)
+            self._connection.commit()
+        logger.info(f"Indexed {len(rows)} episodes in {self.db_path}")
+        return len(rows)
+
+    def changes(self, dialogue_pair: Names = None, game: Names = None,
+                full: bool = False) -> Tuple[List[Tuple], List[Tuple]]:
+        """
+        Compare the index with the results directory. Only the game directories whose modification time differs
+        from the one stored in the index are looked into (adding or removing an experiment changes it), and of
+        these only the experiment directories whose modification time differs (adding or removing an episode
+        changes it).
+        :param full: look into all the game directories, to also find episodes that have been added to or removed
+                     from experiments that were already indexed
+        :return: the (dialogue_pair, game, experiment, episode) of the recorded episodes that are not in the index,
+                 and of the indexed episodes that are no longer in the results directory
+        """
+        missing, removed, _ = self._changes(dialogue_pair, game, full)
+        return [row[:4] for row in missing], removed
+
+    def sync(self, dialogue_pair: Names = None, game: Names = None, full: bool = False) -> Tuple[int, int]:
+        """
+        Add the recorded episodes that are not in the index and remove the episodes that are no longer in the
+        results directory (e.g. after results have been copied into it), see changes().
+        :return: the number of added and removed episodes
+        """
+        rows, removed, directories = self._changes(dialogue_pair, game, full)
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.executemany("DELETE FROM episodes WHERE dialogue_pair = ? AND game = ? "
+                                         "AND experiment = ? AND episode = ?", removed)
+            for key, mtime in directories.items():
+                if len(key) == 2:  # a game directory
+                    self._connection.execute("DELETE FROM games WHERE dialogue_pair = ? AND game = ?", key)
+                    if mtime is not None:
+                        self._connection.execute("INSERT INTO games VALUES (?, ?, ?)", (*key, mtime))
+                else:
+                    self._connection.execute("DELETE FROM experiments WHERE dialogue_pair = ? AND game = ? "
+                                             "AND experiment = ?", key)
+                    if mtime is not None:
+                        self._connection.execute("INSERT INTO experiments VALUES (?, ?, ?, ?)", (*key, mtime))
+            self._connection.commit()
+        if rows or removed:
+            logger.info(f"Added {len(rows)} and removed {len(removed)} episodes of {self.results_root} "
+                        f"that were changed outside of the index")
+        return len(rows), len(removed)
+
+    def _changes(self, dialogue_pair: Names, game: Names, full: bool) -> Tuple[List[Tuple], List[Tuple], Dict]:
+        """
+        :return: the rows of the missing episodes, the removed episodes, and the current modification times of the
+                 changed game and experiment directories (None if removed)
+        """
+        conditions, params = _conditions(dialogue_pair=dialogue_pair, game=game)
+        with self._lock:
+            tables = {row[0] for row in self._connection.execute("SELECT name FROM sqlite_master "
+                                                                 "WHERE type = 'table'")}
+            game_mtimes, experiment_mtimes = dict(), dict()
+            if "games" in tables:  # not in indexes created before the directories were tracked
+                sql = "SELECT dialogue_pair, game, mtime FROM games" + _where(conditions)
+                game_mtimes = {tuple(row[:2]): row[2] for row in self._connection.execute(sql, params)}
+            if "experiments" in tables:
+                sql = "SELECT dialogue_pair, game, experiment, mtime FROM experiments" + _where(conditions)
+                experiment_mtimes = {tuple(row[:3]): row[3] for row in self._connection.execute(sql, params)}
+            sql = "SELECT dialogue_pair, game, experiment, episode FROM episodes" + _where(conditions)
+            indexed = collections.defaultdict(set)
+            for row in self._connection.execute(sql, params):
+                indexed[tuple(row[:3])].add(row[3])
+        missing, removed, directories = [], [], dict()
+        unchanged_games = set()
+        for game_key, game_mtime in self._game_dirs(dialogue_pair, game):
+            if game_mtimes.pop(game_key, None) == game_mtime and not full:
+                unchanged_games.add(game_key)
+                continue
+            directories[game_key] = game_mtime
+            for experiment_key, mtime in self._experiment_dirs(game_key):
+                indexed_episodes = indexed.pop(experiment_key, set())
+                if experiment_mtimes.pop(experiment_key, None) == mtime:
+                    continue
+                directories[experiment_key] = mtime
+                episodes = set(_sub_dirs(self._path(*experiment_key)))
+                removed.extend((*experiment_key, episode) for episode in sorted(indexed_episodes - episodes))
+                missing.extend(self._episode_rows(experiment_key, sorted(episodes - indexed_episodes)))
+        # the experiments and games that are no longer in the results directory
+        for experiment_key, episodes in indexed.items():
+            if experiment_key[:2] not in unchanged_games:
+                removed.extend((*experiment_key, episode) for episode in sorted(episodes))
+        directories.update((experiment_key, None) for experiment_key in experiment_mtimes
+                           if experiment_key[:2] not in unchanged_games)
+        directories.update((game_key, None) for game_key in game_mtimes)
+        return missing, removed, directories
+
+    def _path(self, *names: str) -> str:
+        return os.path.join(self.results_root, *names)
+
+    def _game_dirs(self, dialogue_pair: Names = None, game: Names = None) -> List[Tuple[Tuple, float]]:
+        """
+        :return: the (dialogue_pair, game) of the game directories and their modification times
+        """
+        game_dirs = []
+        for dialogue_pair_dir in _sub_dirs(self.results_root, dialogue_pair):
+            for game_dir in _sub_dirs(self._path(dialogue_pair_dir), game):
+                mtime = self._file_time(self._path(dialogue_pair_dir, game_dir))
+                if mtime is not None:
+                    game_dirs.append(((dialogue_pair_dir, game_dir), mtime))
+        return game_dirs
+
+    def _experiment_dirs(self, game_key: Tuple) -> List[Tuple[Tuple, float]]:
+        """
+        :return: the (dialogue_pair, game, experiment) of the experiment directories of a game directory and their
+                 modification times
+        """
+        experiment_dirs = []
+        for experiment_dir in _sub_dirs(self._path(*game_key)):
+            mtime = self._file_time(self._path(*game_key, experiment_dir))
+            if mtime is not None:
+                experiment_dirs.append(((*game_key, experiment_dir), mtime))
+        return experiment_dirs
+
+    def _episode_rows(self, experiment_key: Tuple, episodes: List[str]) -> List[Tuple]:
+        """
+        :return: the rows of the recorded episodes of an experiment, with the times of their files
+        """
+        rows = []
+        for episode in episodes:
+            episode_path = self._path(*experiment_key, episode)
+            times = [self._file_time(os.path.join(episode_path, STATUS_FILES[status])) for status in STATUSES]
+            if times[0] is not None:  # only recorded episodes
+                rows.append((*experiment_key, episode, *times))
+        return rows
+
+    @staticmethod
+    def _file_time(file_path: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(file_path)
+        except OSError:
+            return None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_indexes: Dict[Tuple[int, str], ResultsIndex] = dict()  # the open indexes of this process
+_indexes_lock = threading.Lock()
+
+
+def get_index(results_root: str) -> ResultsIndex:
+    """
+    :return: the index of the results directory, shared by the threads of this process
+    """
+    key = (os.getpid(), os.path.abspath(results_root))  # connections must not be shared with forked processes
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ResultsIndex(results_root)
+        return _indexes[key]
+
+
+def has_index(results_root: str) -> bool:
+    return os.path.isfile(os.path.join(results_root, INDEX_FILE_NAME))
+
+
+def mark_episode(results_root: str, dialogue_pair: str, game: str, game_record_dir: str, status: str):
+    """
+    Record the status of an episode in the index of the results directory. The index is secondary to the files, so
+    that a failing update is only logged.
+    :param game_record_dir: the experiment and episode directory, e.g. '0_high_en/episode_0'
+    """
+    experiment, episode = os.path.normpath(game_record_dir).split(os.sep)[-2:]
+    try:
+        get_index(file_utils.results_root(results_root)).mark(dialogue_pair, game, experiment, episode, status)
+    except sqlite3.Error as e:
+        logger.warning(f"Cannot update the results index for {game_record_dir}: {e}")
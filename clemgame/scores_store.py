@@ -0,0 +1,118 @@
+"""
+    Consolidated columnar store of the scores of a results directory, so that the evaluation does not need to read
+    every scores.json file. The turn and episode scores are kept in Parquet files partitioned by game and model:
+
+    <results_root>/scores_store/{turn_scores,episode_scores}/game=<game>/model=<dialogue_pair>/scores.parquet
+
+    The rows have the columns of the evaluation dataframes (see evaluation/evalutils.py). The values are floats; a
+    non-numeric score has a NaN value and is kept JSON encoded in the additional raw_value column.
+"""
+import json
+import os
+import tempfile
+from typing import Dict, List, Tuple
+
+import clemgame
+
+logger = clemgame.get_logger(__name__)
+
+SCORES_STORE_DIR_NAME = "scores_store"
+TURN_SCORES = "turn_scores"
+EPISODE_SCORES = "episode_scores"
+TURN_COLUMNS = ["experiment", "episode", "turn", "metric", "value"]
+EPISODE_COLUMNS = ["experiment", "episode", "metric", "value"]
+RAW_VALUE_COLUMN = "raw_value"  # the JSON encoded non-numeric scores (None for the numeric ones)
+PARTITION_FILE_NAME = "scores.parquet"
+
+
+def is_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401 (only the Parquet engine for pandas)
+        return True
+    except ImportError:
+        return False
+
+
+def _as_values(value) -> Tuple[float, str]:
+    """
+    :return: the float value and, for a non-numeric score, its JSON encoding
+    """
+    if value is None:
+        return float("nan"), None
+    if isinstance(value, (int, float)):
+        return float(value), None
+    return float("nan"), json.dumps(value, ensure_ascii=False)
+
+
+def scores_to_rows(experiment_dir: str, episode_dir: str, scores: Dict) -> Tuple[List, List]:
+    """
+    :param scores: the scores of an episode as stored in scores.json
+    :return: the turn score rows and the episode score rows (without game and model)
+    """
+    turn_rows = []
+    for turn_idx, turn_scores in scores["turn scores"].items():
+        for metric, value in turn_scores.items():
+            turn_rows.append((experiment_dir, episode_dir, str(turn_idx), metric, *_as_values(value)))
+    episode_rows = []
+    for metric, value in scores["episode scores"].items():
+        episode_rows.append((experiment_dir, episode_dir, metric, *_as_values(value)))
+    return turn_rows, episode_rows
+
+
+def update_partition(results_root: str, game_name: str, dialogue_pair: str,
+                     turn_rows: List[Tuple], episode_rows: List[Tuple], episodes: List[Tuple[str, str]]):
+    """
+    Replace the scores of the given episodes in the partition of the game and model. The scores of other episodes
+    (e.g. of experiments that have not been scored again) are kept.
+    :param episodes: the (experiment_dir, episode_dir) that have been scored
+    """
+    import pandas as pd
+    scored_episodes = pd.MultiIndex.from_tuples(episodes, names=["experiment", "episode"])
+    for level, rows, columns in [(TURN_SCORES, turn_rows, TURN_COLUMNS),
+                                 (EPISODE_SCORES, episode_rows, EPISODE_COLUMNS)]:
+        partition_dir = os.path.join(results_root, SCORES_STORE_DIR_NAME, level,
+                                     f"game={game_name}", f"model={dialogue_pair}")
+        partition_path = os.path.join(partition_dir, PARTITION_FILE_NAME)
+        df = pd.DataFrame(rows, columns=columns + [RAW_VALUE_COLUMN])
+        if os.path.isfile(partition_path):
+            df_stored = pd.read_parquet(partition_path)
+            if RAW_VALUE_COLUMN not in df_stored.columns:  # stored before the non-numeric scores were kept
+                df_stored[RAW_VALUE_COLUMN] = None
+            is_scored = pd.MultiIndex.from_frame(df_stored[["experiment", "episode"]]).isin(scored_episodes)
+            df = pd.concat([df_stored[~is_scored], df], ignore_index=True)
+        df = df.sort_values(by=["experiment", "episode"], kind="stable", ignore_index=True)
+        df[RAW_VALUE_COLUMN] = df[RAW_VALUE_COLUMN].astype("string")  # a string column, even without any
+        os.makedirs(partition_dir, exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=partition_dir, prefix=f".{PARTITION_FILE_NAME}.", suffix=".tmp")
+        os.close(tmp_fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, partition_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def update(results_root: str, game_name: str, scored_episodes: List[Tuple[str, str, str, Dict]]):
+    """
+    Add the scores of a game to the store; a no-op (with a warning), when pyarrow is not installed.
+    :param scored_episodes: the (dialogue_pair, experiment_dir, episode_dir, scores) of the scored episodes
+    """
+    if not scored_episodes:
+        return
+    if not is_available():
+        logger.warning("The scores store is not updated, because pyarrow is not installed")
+        return
+    episodes_by_pair = dict()
+    for dialogue_pair, experiment_dir, episode_dir, scores in scored_episodes:
+        episodes_by_pair.setdefault(dialogue_pair, []).append((experiment_dir, episode_dir, scores))
+    for dialogue_pair, episodes in episodes_by_pair.items():
+        turn_rows, episode_rows = [], []
+        for experiment_dir, episode_dir, scores in episodes:
+            episode_turn_rows, episode_episode_rows = scores_to_rows(experiment_dir, episode_dir, scores)
+            turn_rows.extend(episode_turn_rows)
+            episode_rows.extend(episode_episode_rows)
+        update_partition(results_root, game_name, dialogue_pair, turn_rows, episode_rows,
+                         [(experiment_dir, episode_dir) for experiment_dir, episode_dir, _ in episodes])
+    logger.info(f"Updated the scores store for {game_name} ({len(scored_episodes)} episodes)")
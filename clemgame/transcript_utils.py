@@ -1,12 +1,17 @@
 import json
 import os
+import re
 from string import Template
-from typing import Dict
+from typing import Dict, List
 from clemgame import file_utils, project_root
 
 import html
 
 CSS_STRING = file_utils.load_file("chat-two-tracks.css", file_ending=".css")
+# the shared style sheet at the results root, when the transcripts link to it instead of inlining the css
+CSS_FILE_NAME = "transcript.css"
+# the maximal number of episodes listed on one page of an experiment index
+INDEX_PAGE_SIZE = 100
 
 HTML_HEADER = '''
 <!DOCTYPE html>
@@ -37,6 +42,25 @@ HTML_TEMPLATE = '''
     </div>
 '''
 
+HTML_HEADER_LINKED = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <link rel="stylesheet" href="{}">
+</head>
+<body>
+
+<br/>
+'''
+
+HTML_IMAGE_TEMPLATE = '  <a title="{0}"><img style="width:100%" src="{0}" alt="{0}" /></a>\n'
+
+HTML_INDEX_TEMPLATE = '''
+    <div class="msg gm-gm">
+        <p><a href="{0}/transcript.html">{0}</a> (<a href="{0}/transcript.tex">tex</a>)</p>
+    </div>
+'''
+
 HTML_FOOTER = '''
 </div>
 
@@ -79,6 +103,9 @@ TEX_TEMPLATE = Template('''
     $cols_init \\multicolumn{$ncols}{p{$width\\linewidth}}{\\cellcolor[rgb]{$rgb}{%\n\t\\makecell[{{p{\\linewidth}}}]{% \n\t  \\tt {\\tiny [$speakers]}  \n\t $msg \n\t  } \n\t   } \n\t   } \n\t $cols_end \\\\ \n 
 ''')
 
+# the substitution of a string.Template parses the template on each call; the format string is parsed only once
+TEX_FORMAT = re.sub(r"\$(\w+)", r"{\1}", TEX_TEMPLATE.template.replace("{", "{{").replace("}", "}}"))
+
 TEX_FOOTER = '''
 \\end{supertabular}
 }
@@ -100,68 +127,119 @@ def _get_class_name(event):
         return "gm-gm"
 
 
-def build_transcript(interactions: Dict, experiment_config: Dict, game_instance: Dict, dialogue_pair: str):
-    """Create an html with the interaction transcript."""
-    transcript = HTML_HEADER.format(CSS_STRING)
+def shared_css_href(levels: int) -> str:
+    """
+    :param levels: the number of directories between the results root and the html file, e.g. 4 for an episode
+    :return: the relative link from the html file to the shared style sheet at the results root
+    """
+    return "../" * levels + CSS_FILE_NAME
+
+
+HTML_HEADER_INLINED = HTML_HEADER.format(CSS_STRING)  # formatted once, not for each transcript
+
+
+def _html_header(css_href: str = None) -> str:
+    if css_href is None:
+        return HTML_HEADER_INLINED
+    return HTML_HEADER_LINKED.format(css_href)
+
+
+def _image_src(image_src: str) -> str:
+    if image_src.startswith("http"):  # take the web url as it is
+        return image_src
+    if "IMAGE_ROOT" in os.environ:
+        return os.path.join(os.environ["IMAGE_ROOT"], image_src)
+    return os.path.join(project_root, image_src)
+
+
+def build_transcript(interactions: Dict, experiment_config: Dict, game_instance: Dict, dialogue_pair: str,
+                     css_href: str = None):
+    """
+    Create an html with the interaction transcript.
+
+    :param css_href: link to this (shared) style sheet; otherwise the css is inlined, so that the file is standalone
+    """
     title = f"Interaction Transcript for {experiment_config['name']}, " \
             f"episode {game_instance['game_id']} with {dialogue_pair}."
-    transcript += top_info.format(title)
+    parts = [_html_header(css_href), top_info.format(title)]
     # Collect all events over all turns (ignore turn boundaries here)
-    events = [event for turn in interactions['turns'] for event in turn]
-    for event in events:
-        class_name = _get_class_name(event)
-        msg_content = event['action']['content']
-        msg_raw = html.escape(f"{msg_content}").replace('\n', '<br/>')
-        if event['from'] == 'GM' and event['to'] == 'GM':
-            speaker = f'Game Master: {event["action"]["type"]}'
-        else:
-            speaker = f"{event['from'].replace('GM', 'Game Master')} to {event['to'].replace('GM', 'Game Master')}"
-        # in case the content is a json BUT given as a string!
-        # we still want to check for image entry
-        if isinstance(msg_content, str):
-            try:
-                msg_content = json.loads(msg_content)
-            except:
-                ...
-        # in case the content is a json with an image entry
-        if isinstance(msg_content, dict):
-            if "image" in msg_content:
-                transcript += f'<div speaker="{speaker}" class="msg {class_name}">\n'
-                transcript += f'  <p>{msg_raw}</p>\n'
+    for turn in interactions['turns']:
+        for event in turn:
+            class_name = _get_class_name(event)
+            msg_content = event['action']['content']
+            msg_raw = html.escape(f"{msg_content}").replace('\n', '<br/>')
+            if event['from'] == 'GM' and event['to'] == 'GM':
+                speaker = f'Game Master: {event["action"]["type"]}'
+            else:
+                speaker = f"{event['from'].replace('GM', 'Game Master')} to {event['to'].replace('GM', 'Game Master')}"
+            # in case the content is a json BUT given as a string!
+            # we still want to check for image entry (but only parse, when there can be one)
+            if isinstance(msg_content, str) and "image" in msg_content:
+                try:
+                    msg_content = json.loads(msg_content)
+                except:
+                    ...
+            # in case the content is a json with an image entry
+            if isinstance(msg_content, dict) and "image" in msg_content:
+                parts.append(f'<div speaker="{speaker}" class="msg {class_name}">\n')
+                parts.append(f'  <p>{msg_raw}</p>\n')
                 for image_src in msg_content["image"]:
-                    if not image_src.startswith("http"):  # take the web url as it is
-                        if "IMAGE_ROOT" in os.environ:
-                            image_src = os.path.join(os.environ["IMAGE_ROOT"], image_src)
-                        else:
-                            image_src = os.path.join(project_root, image_src)
-                    transcript += (f'  <a title="{image_src}">'
-                                   f'<img style="width:100%" src="{image_src}" alt="{image_src}" />'
-                                   f'</a>\n')
-                transcript += '</div>\n'
+                    parts.append(HTML_IMAGE_TEMPLATE.format(_image_src(image_src)))
+                parts.append('</div>\n')
             else:
-                transcript += HTML_TEMPLATE.format(speaker, class_name, msg_raw)
-        else:
-            transcript += HTML_TEMPLATE.format(speaker, class_name, msg_raw)
-    transcript += HTML_FOOTER
-    return transcript
+                parts.append(HTML_TEMPLATE.format(speaker, class_name, msg_raw))
+    parts.append(HTML_FOOTER)
+    return "".join(parts)
 
 
 def build_tex(interactions: Dict):
-    tex = TEX_HEADER
+    parts = [TEX_HEADER]
     # Collect all events over all turns (ignore turn boundaries here)
-    events = [event for turn in interactions['turns'] for event in turn]
-    for event in events:
-        class_name = _get_class_name(event).replace('msg ', '')
-        msg_content = event['action']['content']
-        if isinstance(msg_content, str):
-            msg_content = msg_content.replace('\n', '\\\\ \\tt ')
-        rgb, speakers, cols_init, cols_end, ncols, width = TEX_BUBBLE_PARAMS[class_name]
-        tex += TEX_TEMPLATE.substitute(cols_init=cols_init,
-                                       rgb=rgb,
-                                       speakers=speakers,
-                                       msg=msg_content,
-                                       cols_end=cols_end,
-                                       ncols=ncols,
-                                       width=width)
-    tex += TEX_FOOTER
-    return tex
+    for turn in interactions['turns']:
+        for event in turn:
+            class_name = _get_class_name(event).replace('msg ', '')
+            msg_content = event['action']['content']
+            if isinstance(msg_content, str):
+                msg_content = msg_content.replace('\n', '\\\\ \\tt ')
+            rgb, speakers, cols_init, cols_end, ncols, width = TEX_BUBBLE_PARAMS[class_name]
+            parts.append(TEX_FORMAT.format(cols_init=cols_init,
+                                           rgb=rgb,
+                                           speakers=speakers,
+                                           msg=msg_content,
+                                           cols_end=cols_end,
+                                           ncols=ncols,
+                                           width=width))
+    parts.append(TEX_FOOTER)
+    return "".join(parts)
+
+
+def index_page_name(page: int) -> str:
+    """
+    :return: the file name of the (zero-based) page of an experiment index
+    """
+    return "index.html" if page == 0 else f"index_{page + 1}.html"
+
+
+def build_experiment_index(title: str, episode_dirs: List[str], page_size: int = INDEX_PAGE_SIZE,
+                           css_href: str = None) -> List[str]:
+    """
+    Create the html pages that link the transcripts of the episodes of an experiment.
+
+    :param title: shown on top of each page, e.g. the experiment name and dialogue pair
+    :param episode_dirs: the episode directories (relative to the experiment directory), listed in this order
+    :param page_size: the maximal number of episodes listed on one page
+    :param css_href: link to this (shared) style sheet; otherwise the css is inlined
+    :return: the pages; the first page is to be stored as index_page_name(0) and so on
+    """
+    header = _html_header(css_href)
+    n_pages = max(1, -(-len(episode_dirs) // page_size))
+    navigation = " ".join(f'<a href="{index_page_name(page)}">{page + 1}</a>' for page in range(n_pages))
+    pages = []
+    for page in range(n_pages):
+        page_title = title if n_pages == 1 else f"{title} Page {page + 1} of {n_pages}: {navigation}"
+        parts = [header, top_info.format(page_title)]
+        for episode_dir in episode_dirs[page * page_size:(page + 1) * page_size]:
+            parts.append(HTML_INDEX_TEMPLATE.format(html.escape(episode_dir)))
+        parts.append(HTML_FOOTER)
+        pages.append("".join(parts))
+    return pages
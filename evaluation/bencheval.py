@@ -10,10 +10,14 @@ from pathlib import Path
 
 import pandas as pd
 
+import evaluation.bootstrap as bootstrap
 import evaluation.evalutils as utils
+import evaluation.incremental as incremental
 import clemgame.metrics as clemmetrics
+from clemgame import scores_store
 
 TABLE_NAME = 'results'
+CI_TABLE_NAME = 'results_ci'
 
 
 class PlayedScoreError(Exception):
@@ -28,32 +32,44 @@ class PlayedScoreError(Exception):
     pass
 
 
-def save_clem_table(df: pd.DataFrame, path: str) -> None:
-    """Create benchmark results as a table."""
+def aggregate_game_model(df: pd.DataFrame) -> pd.DataFrame:
+    """Compute the main scores of each game and model."""
     df_aux = df[df['metric'].isin(utils.MAIN_METRICS)]
 
     # compute mean benchscore and mean played (which is binary, so a proportion)
-    df_a = (df_aux.groupby(['game', 'model', 'metric'])
+    df_a = (df_aux.groupby(['game', 'model', 'metric'], observed=True)
                   .mean(numeric_only=True)
                   .reset_index())
     df_a.loc[df_a.metric == clemmetrics.METRIC_PLAYED, 'value'] *= 100
     df_a = df_a.round(2)
-    df_a['metric'].replace(
-        {clemmetrics.METRIC_PLAYED: '% '+clemmetrics.METRIC_PLAYED},
-        inplace=True)
+    df_a['metric'] = df_a['metric'].replace(
+        {clemmetrics.METRIC_PLAYED: '% '+clemmetrics.METRIC_PLAYED})
 
     # compute the std of benchscore
     df_aux_b = df_aux[df_aux.metric == clemmetrics.BENCH_SCORE]
-    df_b = (df_aux_b.groupby(['game', 'model', 'metric'])
+    df_b = (df_aux_b.groupby(['game', 'model', 'metric'], observed=True)
                     .std(numeric_only=True)
                     .reset_index()
                     .round(2))
-    df_b['metric'].replace(
-        {clemmetrics.BENCH_SCORE: clemmetrics.BENCH_SCORE+' (std)'},
-        inplace=True)
+    df_b['metric'] = df_b['metric'].replace(
+        {clemmetrics.BENCH_SCORE: clemmetrics.BENCH_SCORE+' (std)'})
+
+    return df_a, df_b
+
+
+def save_clem_table(df: pd.DataFrame, path: str,
+                    df_game_model: tuple = None) -> None:
+    """Create benchmark results as a table.
+
+    The main scores of each game and model (see aggregate_game_model) are
+    computed from the episode scores, unless they are given.
+    """
+    if df_game_model is None:
+        df_game_model = aggregate_game_model(df)
+    df_a, df_b = df_game_model
 
     # compute the macro-average main score over games, per model
-    df_all = (df_a.groupby(['model', 'metric'])
+    df_all = (df_a.groupby(['model', 'metric'], observed=True)
                   .mean(numeric_only=True)
                   .reset_index()
                   .round(2))
@@ -87,17 +103,59 @@ def save_clem_table(df: pd.DataFrame, path: str) -> None:
     print(f'\n Saved results into {path}/{TABLE_NAME}.csv and .html')
 
 
+def save_ci_table(df: pd.DataFrame, path: str, n_resamples: int,
+                  confidence: float = 0.95, seed: int = None) -> None:
+    """Create a table with bootstrap confidence intervals of the scores."""
+    df_models, df_games = bootstrap.bootstrap_clemscores(
+        df, n_resamples=n_resamples, confidence=confidence, seed=seed)
+    metrics = df_games.columns
+    df_games = df_games.unstack('game').swaplevel(axis=1)
+    games = sorted(df_games.columns.get_level_values(0).unique())
+    df_games = df_games[pd.MultiIndex.from_product([games, metrics])]
+    df_models.columns = pd.MultiIndex.from_product([['-'], df_models.columns])
+    df_results = pd.concat([df_models, df_games], axis=1)
+
+    # flatten header
+    df_results.index.name = None
+    df_results.columns = [', '.join(x) for x in df_results.columns]
+
+    df_results.to_csv(Path(path) / f'{CI_TABLE_NAME}.csv')
+    df_results.to_html(Path(path) / f'{CI_TABLE_NAME}.html')
+    print(f'\n Saved {confidence:.0%} confidence intervals ({n_resamples} '
+          f'resamples) into {path}/{CI_TABLE_NAME}.csv and .html')
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument("-p", "--results_path",
                         type=str,
                         default='./results',
                         help="Path to the results folder containing scores.")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Only read the scores files that are new or changed since the last "
+                             "incremental evaluation and only aggregate the scores of the affected "
+                             "games and models again (see incremental.py).")
+    parser.add_argument("-b", "--bootstrap", type=int, default=0, metavar="N",
+                        help="Also compute confidence intervals of the clemscore and the game scores "
+                             "from N bootstrap resamples of the episodes (e.g. 10000). Default: 0 (none)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="The confidence level of the bootstrap intervals. Default: 0.95")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="The random seed of the bootstrap resampling.")
     args = parser.parse_args()
 
     # Get all episode scores as a pandas dataframe
-    scores = utils.load_scores(path=args.results_path)
-    df_episode_scores = utils.build_df_episode_scores(scores)
+    manifest = None
+    if args.incremental:
+        manifest = incremental.ScoresManifest(args.results_path)
+        changed_pairs = manifest.refresh()
+        df_episode_scores = manifest.build_df_episode_scores()
+    else:
+        df_episode_scores = utils.load_scores_store(
+            scores_store.EPISODE_SCORES, path=args.results_path)
+    if df_episode_scores is None:
+        scores = utils.load_scores(path=args.results_path)
+        df_episode_scores = utils.build_df_episode_scores(scores)
 
     # Create the PLAYED variable, inferring it from ABORTED
     if clemmetrics.METRIC_PLAYED in df_episode_scores['metric'].unique():
@@ -113,4 +171,21 @@ if __name__ == '__main__':
     print(f'\n Saved raw scores into {args.results_path}/raw.csv')
 
     # save main table
-    save_clem_table(df_episode_scores, args.results_path)
+    if manifest is None:
+        save_clem_table(df_episode_scores, args.results_path)
+    else:
+        # aggregate the scores of the changed games and models only
+        pairs = pd.MultiIndex.from_frame(df_episode_scores[['game', 'model']].astype(str))
+        df_changed = df_episode_scores[pairs.isin(list(changed_pairs))]
+        df_game_model = aggregate_game_model(df_changed)
+        df_cached = manifest.get_aggregates(exclude=changed_pairs)
+        if df_cached:
+            df_game_model = tuple(pd.concat([cached, new], ignore_index=True)
+                                  for cached, new in zip(df_cached, df_game_model))
+        save_clem_table(df_episode_scores, args.results_path, df_game_model)
+        manifest.set_aggregates(df_game_model)
+        manifest.save()
+
+    if args.bootstrap > 0:
+        save_ci_table(df_episode_scores, args.results_path, args.bootstrap,
+                      confidence=args.confidence, seed=args.seed)
@@ -0,0 +1,121 @@
+"""
+Bootstrap confidence intervals for the clemscore and the per game scores.
+
+The episodes of each game and model are resampled with replacement. Instead
+of a loop over resamples, the resamples of all the games and models with the
+same number of episodes are drawn at once as one index matrix (in chunks, to
+bound the memory), so that 10k resamples of the whole benchmark take seconds.
+"""
+
+import numpy as np
+import pandas as pd
+
+import evaluation.evalutils as utils
+import clemgame.metrics as clemmetrics
+
+# the number of resampled episodes drawn at once (bounds the memory)
+CHUNK_SIZE = 1_000_000
+
+
+def _group_means(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Mean of the non-NaN values of each group of columns (NaN if none)."""
+    is_valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(is_valid, values, 0.), starts, axis=-1)
+    counts = np.add.reduceat(is_valid, starts, axis=-1, dtype=np.int64)
+    return _divide(sums, counts)
+
+
+def _divide(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    means = np.full(sums.shape, np.nan)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return means
+
+
+def _model_scores(played_groups: np.ndarray, quality_groups: np.ndarray,
+                  model_starts: np.ndarray) -> np.ndarray:
+    """Compute the clemscore of each model from its game scores."""
+    # macro-average over the games of each model, as in the clemscore
+    played_models = _group_means(played_groups, model_starts)
+    quality_models = _group_means(quality_groups, model_starts)
+    return played_models / 100 * quality_models
+
+
+def _ci_frame(estimates: tuple, bounds: list, index: pd.Index,
+              names: list) -> pd.DataFrame:
+    """Put the estimates and the bounds of their intervals in columns."""
+    data = {}
+    for name, estimate, (low, high) in zip(names, estimates, bounds):
+        data[name] = estimate
+        data[f'{name} (CI low)'] = low
+        data[f'{name} (CI high)'] = high
+    return pd.DataFrame(data, index=index).round(2)
+
+
+def bootstrap_clemscores(df: pd.DataFrame, n_resamples: int = 10_000,
+                         confidence: float = 0.95, seed: int = None) -> tuple:
+    """Compute bootstrap confidence intervals of the main scores.
+
+    The dataframe has the episode scores (including the PLAYED metric).
+    Return a dataframe with the clemscore of each model and one with the
+    % played and quality score of each game and model, both with the point
+    estimate and the lower and upper bound of the (percentile) interval.
+    """
+    df_aux = df[df['metric'].isin(utils.MAIN_METRICS)]
+    df_aux = (df_aux.pivot(index=['model', 'game', 'experiment', 'episode'],
+                           columns='metric', values='value')
+                    .sort_index())
+    played = df_aux[clemmetrics.METRIC_PLAYED].to_numpy(dtype=float)
+    quality = df_aux[clemmetrics.BENCH_SCORE].to_numpy(dtype=float)
+
+    # the episodes are sorted, so that each group is a range of columns
+    group_codes, group_index = (df_aux.index
+                                      .droplevel(['experiment', 'episode'])
+                                      .factorize())
+    group_sizes = np.bincount(group_codes)
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+    # the first level of the groups is the model
+    model_codes, model_index = group_index.get_level_values(0).factorize()
+    model_starts = np.concatenate([[0],
+                                   np.cumsum(np.bincount(model_codes))[:-1]])
+
+    n_groups = len(group_index)
+    played_sums = np.empty((n_resamples, n_groups))
+    quality_sums = np.empty((n_resamples, n_groups))
+    quality_counts = np.empty((n_resamples, n_groups))
+    is_valid = ~np.isnan(quality)
+    quality_or_zero = np.where(is_valid, quality, 0.)
+    rng = np.random.default_rng(seed)
+    # the groups with the same number of episodes are resampled together
+    for size in np.unique(group_sizes):
+        bucket = np.flatnonzero(group_sizes == size)
+        chunk = max(1, CHUNK_SIZE // (len(bucket) * size))
+        for start in range(0, n_resamples, chunk):
+            end = min(start + chunk, n_resamples)
+            # one index matrix: resamples x groups x episodes of the group
+            indices = rng.integers(0, size, size=(end - start, len(bucket),
+                                                  size), dtype=np.int32)
+            indices += group_starts[bucket, None].astype(np.int32)
+            played_sums[start:end, bucket] = played[indices].sum(axis=2)
+            quality_sums[start:end, bucket] = (quality_or_zero[indices]
+                                               .sum(axis=2))
+            quality_counts[start:end, bucket] = is_valid[indices].sum(axis=2)
+    played_groups = 100 * played_sums / group_sizes
+    quality_groups = _divide(quality_sums, quality_counts)
+    resampled = (played_groups, quality_groups,
+                 _model_scores(played_groups, quality_groups, model_starts))
+
+    estimates = (100 * _group_means(played, group_starts),
+                 _group_means(quality, group_starts))
+    estimates += (_model_scores(*estimates, model_starts),)
+    alpha = 100 * (1 - confidence) / 2
+    with np.errstate(invalid='ignore'):  # all NaN, e.g. always aborted
+        bounds = [np.nanpercentile(scores, [alpha, 100 - alpha], axis=0)
+                  for scores in resampled]
+
+    group_index.names = ['model', 'game']
+    model_index.name = 'model'
+    df_games = _ci_frame(estimates[:2], bounds[:2], group_index,
+                         ['% ' + clemmetrics.METRIC_PLAYED, 'Quality Score'])
+    df_models = _ci_frame(estimates[2:], bounds[2:], model_index,
+                          ['clemscore'])
+    return df_models, df_games
@@ -2,16 +2,24 @@
 Auxiliary functions for plots and tables.
 """
 
+import collections
 import os
+import sqlite3
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
 from pathlib import Path
 
 import json
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
 from tqdm import tqdm
 
 import clemgame.metrics as clemmetrics
+from clemgame import scores_store, results_index
+
+try:  # optional, but much faster
+    import orjson
+except ImportError:
+    orjson = None
 
 EVAL_DIR = 'results_eval'
 RESULTS_DIR = './results'
@@ -102,6 +110,9 @@ metric_lims = {
 
 def savefig(name: str) -> None:
     """Save a plt figure."""
+    # imported here, so that only plotting needs to import them
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     sns.despine(left=False, right=False, top=False, bottom=False)
     plt.tight_layout()
     plt.savefig(name, bbox_inches='tight')
@@ -125,51 +136,263 @@ def name_as_tuple(name: str) -> tuple:
 
 
 def load_json(path: str) -> dict:
-    """Load a json file."""
-    with open(path, 'r') as file:
-        data = json.load(file)
-    return data
-
-
-def load_scores(game_name: str = None, path: str = RESULTS_DIR) -> dict:
+    """Load a json file (with orjson, if it is installed)."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN values, which only the json module accepts
+    return json.loads(data)
+
+
+def _as_names(names) -> set:
+    """Turn a name or a list of names into a set (None for no filter)."""
+    if names is None:
+        return None
+    return {names} if isinstance(names, str) else set(names)
+
+
+def _sub_dirs(path: str, names: set = None) -> list:
+    """Return the sorted subdirectories, only the named ones if given."""
+    with os.scandir(path) as entries:
+        return sorted(entry.path for entry in entries if entry.is_dir()
+                      and (names is None or entry.name in names))
+
+
+def _query_index(path: str, game_name, model_name, status: str) -> list:
+    """Return the episodes from the results index, or None if the index is
+    not up to date with the results directory (or cannot be read).
+
+    The index is only read, the evaluation does not write to the results.
+    """
+    index = None
+    try:
+        index = results_index.ResultsIndex(path, read_only=True)
+        missing, removed = index.changes(dialogue_pair=model_name,
+                                         game=game_name)
+        if missing or removed:
+            print(f'The results index is missing {len(missing)} and still '
+                  f'lists {len(removed)} removed episodes, walking the '
+                  f'directories instead (see cli.py index).')
+            return None
+        return index.query(dialogue_pair=model_name, game=game_name,
+                           status=status)
+    except sqlite3.Error as e:
+        print(f'Cannot read the results index ({e}), walking the '
+              f'directories instead.')
+        return None
+    finally:
+        if index is not None:
+            index.close()
+
+
+def find_episode_files(file_name: str, game_name=None, model_name=None,
+                       path: str = RESULTS_DIR) -> list:
+    """Find the file of each episode of the results directory.
+
+    The results are in model/game/experiment/episode directories, so that
+    the games and models to load are selected while walking the directories.
+    Both can be a name or a list of names. If the results have an index
+    (see clemgame/results_index.py), the episodes are looked up there.
+
+    The files are sorted by model, game, experiment and episode directory,
+    and so are the rows of the score tables built from them.
+    """
+    statuses = {name: status for status, name
+                in results_index.STATUS_FILES.items()}
+    if file_name in statuses and results_index.has_index(path):
+        # no need to walk the directories
+        episodes = _query_index(path, game_name, model_name,
+                                statuses[file_name])
+        if episodes is not None:
+            return [Path(path, episode.dialogue_pair, episode.game,
+                         episode.experiment, episode.episode, file_name)
+                    for episode in episodes]
+    game_names, model_names = _as_names(game_name), _as_names(model_name)
+    files = []
+    for model_dir in _sub_dirs(path, model_names):
+        for game_dir in _sub_dirs(model_dir, game_names):
+            for experiment_dir in _sub_dirs(game_dir):
+                for episode_dir in _sub_dirs(experiment_dir):
+                    file_path = os.path.join(episode_dir, file_name)
+                    if os.path.isfile(file_path):
+                        files.append(Path(file_path))
+    return files
+
+
+def iter_episode_files(files: list, load, jobs: int = 1):
+    """Yield the name tuple and the loaded contents of each file, in order.
+
+    With jobs > 1 the next files are read by a pool of threads while the
+    current one is processed, which pays off when reading is slow (e.g. on
+    network file systems). Only a few files are in memory at once.
+    """
+    if jobs <= 1:
+        for path in files:
+            yield name_as_tuple(parse_directory_name(path)), load(path)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        for path in files:
+            pending.append((path, executor.submit(load, path)))
+            if len(pending) > 2 * jobs:
+                path, future = pending.popleft()
+                yield name_as_tuple(parse_directory_name(path)), future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield name_as_tuple(parse_directory_name(path)), future.result()
+
+
+def _load_scores_file(path: str) -> dict:
+    data = load_json(path)
+    return {'turns': data['turn scores'], 'episodes': data['episode scores']}
+
+
+def load_scores(game_name=None, path: str = RESULTS_DIR, model_name=None,
+                jobs: int = 1) -> dict:
     """Get all turn and episodes scores and return them in a dictionary."""
-    # https://stackoverflow.com/a/18394205
-    score_files = list(Path(path).rglob("*scores.json"))
+    score_files = find_episode_files('scores.json', game_name, model_name,
+                                     path)
     print(f'Loading {len(score_files)} JSON files.')
-    scores = {}
-    for path in tqdm(score_files, desc="Loading scores"):
-        if game_name:
-            if game_name not in str(path):
-                continue
-        naming = name_as_tuple(parse_directory_name(path))
-        if naming not in scores:
-            data = load_json(path)
-            scores[naming] = {}
-            scores[naming]['turns'] = data['turn scores']
-            scores[naming]['episodes'] = data['episode scores']
-        else:
-            print(f'Repeated file {naming}!')
+    scores = dict(tqdm(iter_episode_files(score_files, _load_scores_file,
+                                          jobs),
+                       total=len(score_files), desc="Loading scores"))
     print(f'Retrieved {len(scores)} JSON files with scores.')
     return scores
 
 
-def load_interactions(game_name: str = None) -> dict:
-    """Get all interaction records and return them in a dictionary."""
-    # https://stackoverflow.com/a/18394205
-    interaction_files = list(Path(RESULTS_DIR).rglob("*interactions.json"))
-    print(f'Loading {len(interaction_files)} JSON files.')
-    interactions = {}
-    for path in tqdm(interaction_files, desc="Loading interactions"):
-        if game_name:
-            if game_name not in str(path):
-                continue
-        naming = name_as_tuple(parse_directory_name(path))
-        if naming not in interactions:
-            data = load_json(path)
-            instance = load_json(str(path).replace('interactions.json', 'instance.json'))
-            interactions[naming] = (data, instance)
+def _partition_mtime(store_path: Path, game: str, model: str) -> float:
+    """Return the modification time of a partition of the store (or 0)."""
+    partition = (store_path / f'game={game}' / f'model={model}'
+                 / scores_store.PARTITION_FILE_NAME)
+    try:
+        return partition.stat().st_mtime
+    except OSError:
+        return 0.
+
+
+def load_scores_store(level: str, game_name: str = None,
+                      path: str = RESULTS_DIR,
+                      score_files: list = None) -> pd.DataFrame:
+    """Read the turn or episode scores from the scores store of the results.
+
+    The store only holds the episodes as they were when they were last
+    scored. Episodes whose scores.json is missing from the store or newer
+    than its partition (e.g. copied in from another results directory) are
+    read from their scores.json instead, and episodes without a scores.json
+    are left out. Return None if the results have no scores store (see
+    cli.py score).
+    """
+    store_path = Path(path) / scores_store.SCORES_STORE_DIR_NAME / level
+    if not store_path.is_dir():
+        return None
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    if level == scores_store.TURN_SCORES:
+        columns = scores_store.TURN_COLUMNS
+    else:
+        columns = scores_store.EPISODE_COLUMNS
+    cols = ['game', 'model'] + columns
+    # all the partition values are names, even when they look like numbers
+    partition_fields = [('game', pa.string()), ('model', pa.string())]
+    schema = pa.schema([(col, pa.float64() if col == 'value' else pa.string())
+                        for col in columns + [scores_store.RAW_VALUE_COLUMN]]
+                       + partition_fields)
+    partitioning = ds.partitioning(pa.schema(partition_fields), flavor='hive')
+    dataset = ds.dataset(store_path, schema=schema, format='parquet',
+                         partitioning=partitioning)
+    table_filter = ds.field('game') == game_name if game_name else None
+    df = dataset.to_table(filter=table_filter).to_pandas()
+    raw_values = df[scores_store.RAW_VALUE_COLUMN]
+    if raw_values.notna().any():  # the non-numeric scores
+        values = df['value'].astype(object)
+        values[raw_values.notna()] = raw_values[raw_values.notna()].map(
+            json.loads)
+        df['value'] = values
+    df = df[cols]
+
+    if score_files is None:
+        score_files = find_episode_files('scores.json', game_name, path=path)
+    key_cols = ['game', 'model', 'experiment', 'episode']
+    stored = set(df[key_cols].drop_duplicates().itertuples(index=False,
+                                                           name=None))
+    mtimes, files, json_files = {}, {}, []
+    for file_path in score_files:
+        key = name_as_tuple(parse_directory_name(file_path))
+        files[key] = file_path
+        if key[:2] not in mtimes:
+            mtimes[key[:2]] = _partition_mtime(store_path, *key[:2])
+        if (key not in stored
+                or os.path.getmtime(file_path) > mtimes[key[:2]]):
+            json_files.append(file_path)
+    json_keys = {name_as_tuple(parse_directory_name(file_path))
+                 for file_path in json_files}
+    keep = pd.MultiIndex.from_frame(df[key_cols]).isin(
+        [key for key in files if key not in json_keys])
+    df = df[keep]
+    if json_files:
+        print(f'Reading {len(json_files)} scores files that are newer than '
+              f'the scores store.')
+        scores = dict(iter_episode_files(json_files, _load_scores_file))
+        if level == scores_store.TURN_SCORES:
+            df_json = build_df_turn_scores(scores)
         else:
-            print(f'Repeated file {naming}!')
+            df_json = build_df_episode_scores(scores)
+        df = pd.concat([df.astype({'value': object}),
+                        df_json[cols].astype(object)], ignore_index=True)
+    df = scores_records_to_df(df, cols)
+    print(f'Retrieved {len(df)} {level.replace("_", " ")} from {store_path}.')
+    return df
+
+
+def load_score_dfs(game_name: str = None, path: str = RESULTS_DIR) -> tuple:
+    """Get the episodes and dataframes with all turn and episode scores.
+
+    The scores are read from the scores store of the results, if there is
+    one (and from the scores.json files which are newer than the store);
+    otherwise from the scores.json files of the episodes.
+    """
+    score_files = find_episode_files('scores.json', game_name, path=path)
+    df_turn_scores = load_scores_store(scores_store.TURN_SCORES,
+                                       game_name, path, score_files)
+    df_episode_scores = load_scores_store(scores_store.EPISODE_SCORES,
+                                          game_name, path, score_files)
+    if df_turn_scores is None or df_episode_scores is None:
+        scores = load_scores(game_name, path)
+        return (list(scores.keys()), build_df_turn_scores(scores),
+                build_df_episode_scores(scores))
+    key_cols = ['game', 'model', 'experiment', 'episode']
+    keys = pd.concat([df_episode_scores[key_cols].astype(str),
+                      df_turn_scores[key_cols].astype(str)])
+    keys = sorted(set(keys.itertuples(index=False, name=None)))
+    return keys, df_turn_scores, df_episode_scores
+
+
+def _load_interactions_file(path: str) -> tuple:
+    instance_path = os.path.join(os.path.dirname(path), 'instance.json')
+    return load_json(path), load_json(instance_path)
+
+
+def iter_interactions(game_name=None, path: str = RESULTS_DIR,
+                      model_name=None, jobs: int = 1):
+    """Yield the interaction records and game instance of each episode.
+
+    Unlike load_interactions(), only a few episodes are in memory at once.
+    """
+    interaction_files = find_episode_files('interactions.json', game_name,
+                                           model_name, path)
+    yield from iter_episode_files(interaction_files, _load_interactions_file,
+                                  jobs)
+
+
+def load_interactions(game_name=None, path: str = RESULTS_DIR,
+                      model_name=None, jobs: int = 1) -> dict:
+    """Get all interaction records and return them in a dictionary."""
+    interactions = dict(tqdm(iter_interactions(game_name, path, model_name,
+                                               jobs),
+                             desc="Loading interactions"))
     print(f'Retrieved {len(interactions)} JSON files with interactions.')
     return interactions
 
@@ -206,29 +429,60 @@ def create_eval_tree(levels: list) -> None:
 def build_df_turn_scores(scores: dict) -> pd.DataFrame:
     """Create dataframe with all turn scores."""
     cols = ['game', 'model', 'experiment', 'episode', 'turn', 'metric', 'value']
-    df_turn_scores = pd.DataFrame(columns=cols)
+    records = {col: [] for col in cols}
     for name, data in tqdm(scores.items(), desc="Build turn scores dataframe"):
         (game, model, experiment, episode) = name
         for turn, turn_data in data['turns'].items():
-            for metric_name, metric_value in turn_data.items():
-                new_row = [game, model, experiment, episode, turn,
-                           metric_name, metric_value]
-                df_turn_scores.loc[len(df_turn_scores)] = new_row
-    return df_turn_scores
+            n_metrics = len(turn_data)
+            records['turn'].extend([turn] * n_metrics)
+            records['metric'].extend(turn_data.keys())
+            records['value'].extend(turn_data.values())
+        n_rows = len(records['turn']) - len(records['game'])
+        for col, value in zip(['game', 'model', 'experiment', 'episode'], name):
+            records[col].extend([value] * n_rows)
+    return scores_records_to_df(records, cols)
 
 
 def build_df_episode_scores(scores: dict) -> pd.DataFrame:
     """Create dataframe with all episode scores."""
     cols = ['game', 'model', 'experiment', 'episode', 'metric', 'value']
-    df_episode_scores = pd.DataFrame(columns=cols)
+    records = {col: [] for col in cols}
     desc = "Build episode scores dataframe"
     for name, data in tqdm(scores.items(), desc=desc):
-        (game, model, experiment, episode) = name
-        for metric_name, metric_value in data['episodes'].items():
-            new_row = [game, model, experiment, episode,
-                       metric_name, metric_value]
-            df_episode_scores.loc[len(df_episode_scores)] = new_row
-    return df_episode_scores
+        n_metrics = len(data['episodes'])
+        for col, value in zip(['game', 'model', 'experiment', 'episode'], name):
+            records[col].extend([value] * n_metrics)
+        records['metric'].extend(data['episodes'].keys())
+        records['value'].extend(data['episodes'].values())
+    return scores_records_to_df(records, cols)
+
+
+def scores_records_to_df(records, cols: list) -> pd.DataFrame:
+    """Build a scores dataframe at once from its columns (as lists).
+
+    The game, model and experiment columns are categorical (with sorted
+    categories) and the values are floats, unless a metric is not numeric
+    (then only the numeric values are floats).
+    """
+    df = pd.DataFrame(records, columns=cols)
+    for col in ['game', 'model', 'experiment']:
+        categories = sorted(df[col].unique())
+        df[col] = pd.Categorical(df[col], categories=categories)
+    try:
+        df['value'] = df['value'].astype(float)
+    except (TypeError, ValueError):
+        print('Found non-numeric scores, keeping the values as objects.')
+        # the numeric scores are floats, no matter where they were read from
+        df['value'] = df['value'].map(_as_float_if_numeric)
+    return df
+
+
+def _as_float_if_numeric(value):
+    if value is None:
+        return float('nan')
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value
 
 
 def filter_df_by_key(df: pd.DataFrame, value_dict: dict) -> pd.DataFrame:
@@ -241,103 +495,129 @@ def filter_df_by_key(df: pd.DataFrame, value_dict: dict) -> pd.DataFrame:
 
 def save_raw_scores(df_turn_scores: pd.DataFrame,
                     df_episode_scores: pd.DataFrame,
-                    scores: dict) -> None:
-    """Create .csv files with all the scores"""
+                    scores,
+                    jobs: int = 1) -> None:
+    """Create .csv files with all the scores
+
+    The scores are the scores as loaded by load_scores() or the episodes
+    as returned by load_score_dfs().
+    """
     name = create_file_name('', 'turn', 'tables', 'scores_raw', 'csv')
     df_turn_scores.to_csv(name)
     name = create_file_name('', 'episode', 'tables', 'scores_raw', 'csv')
     df_episode_scores.to_csv(name)
-    save_raw_episode_scores(scores.keys(), df_episode_scores)
-    save_raw_turn_scores(scores.keys(), df_turn_scores)
+    keys = scores.keys() if isinstance(scores, dict) else scores
+    save_raw_episode_scores(keys, df_episode_scores, jobs=jobs)
+    save_raw_turn_scores(keys, df_turn_scores, jobs=jobs)
     print('Saved raw scores into .csv files.')
 
 
-def save_raw_episode_scores(keys: list, df_scores: pd.DataFrame) -> None:
+def save_raw_episode_scores(keys: list, df_scores: pd.DataFrame,
+                            jobs: int = 1) -> None:
     """Create csv files with episode scores for each level."""
-    desc = "Saving raw episode scores"
-    for game, model, experiment, episode in tqdm(keys, desc=desc):
+    levels = [
         # all results
-        filter_dic = {'game': game, 'model': model,
-                      'experiment': experiment, 'episode': episode}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux[['metric', 'value']]
-        prefix = f'{EVAL_DIR}/{game}/{model}/{experiment}/{episode}/{EVAL_DIR}'
-        name = f'{prefix}/episode-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
-
+        (['game', 'model', 'experiment', 'episode'],
+         lambda df: df[['metric', 'value']],
+         lambda game, model, experiment, episode:
+            f'{EVAL_DIR}/{game}/{model}/{experiment}/{episode}/{EVAL_DIR}'),
         # by experiment
-        filter_dic = {'game': game, 'model': model, 'experiment': experiment}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index='episode',
-                              columns=['metric'],
-                              values='value')
-        prefix = f'{EVAL_DIR}/{game}/{model}/{experiment}/{EVAL_DIR}'
-        name = f'{prefix}/episode-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
-
+        (['game', 'model', 'experiment'],
+         lambda df: df.pivot(index='episode',
+                             columns=['metric'],
+                             values='value'),
+         lambda game, model, experiment:
+            f'{EVAL_DIR}/{game}/{model}/{experiment}/{EVAL_DIR}'),
         # by model
-        filter_dic = {'game': game, 'model': model}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index=['episode'],
-                              columns=['experiment', 'metric'],
-                              values='value')
-        prefix = f'{EVAL_DIR}/{game}/{model}/{EVAL_DIR}/episode-level'
-        name = f'{prefix}/tables/scores_raw.csv'
-        df_aux.to_csv(name)
-
+        (['game', 'model'],
+         lambda df: df.pivot(index=['episode'],
+                             columns=['experiment', 'metric'],
+                             values='value'),
+         lambda game, model: f'{EVAL_DIR}/{game}/{model}/{EVAL_DIR}'),
         # by game
-        filter_dic = {'game': game}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index=['model', 'episode'],
-                              columns=['experiment', 'metric'],
-                              values='value') 
-        prefix = f'{EVAL_DIR}/{game}/{EVAL_DIR}'
-        name = f'{prefix}/episode-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
+        (['game'],
+         lambda df: df.pivot(index=['model', 'episode'],
+                             columns=['experiment', 'metric'],
+                             values='value'),
+         lambda game: f'{EVAL_DIR}/{game}/{EVAL_DIR}'),
+    ]
+    export_tables(df_scores, keys, levels,
+                  'episode-level/tables/scores_raw.csv',
+                  desc="Saving raw episode scores", jobs=jobs)
 
 
-def save_raw_turn_scores(keys: list, df_scores: pd.DataFrame) -> None:
+def save_raw_turn_scores(keys: list, df_scores: pd.DataFrame,
+                         jobs: int = 1) -> None:
     """Create csv files with turn scores for each level."""
-    desc = "Saving raw turn scores"
-    for game, model, experiment, episode in tqdm(keys, desc=desc):
+    levels = [
         # all results
-        filter_dic = {'game': game, 'model': model,
-                      'experiment': experiment, 'episode': episode}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index='turn', columns=['metric'], values='value')
-        prefix = f'{EVAL_DIR}/{game}/{model}/{experiment}/{episode}/{EVAL_DIR}'
-        name = f'{prefix}/turn-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
-
+        (['game', 'model', 'experiment', 'episode'],
+         lambda df: df.pivot(index='turn', columns=['metric'],
+                             values='value'),
+         lambda game, model, experiment, episode:
+            f'{EVAL_DIR}/{game}/{model}/{experiment}/{episode}/{EVAL_DIR}'),
         # by experiment
-        filter_dic = {'game': game, 'model': model, 'experiment': experiment}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index=['episode', 'turn'],
-                              columns=['metric'],
-                              values='value')
-        prefix = f'{EVAL_DIR}/{game}/{model}/{experiment}/{EVAL_DIR}'
-        name = f'{prefix}/turn-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
-
-        # by model
-        filter_dic = {'game': game, 'model': model}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index=['episode', 'turn'],
-                              columns=['experiment', 'metric'],
-                              values='value') 
-        prefix = f'{EVAL_DIR}/{game}/{model}/{EVAL_DIR}'
-        name = f'{prefix}/turn-level/tables/scores_raw.csv'
-        df_aux.to_csv()
-
+        (['game', 'model', 'experiment'],
+         lambda df: df.pivot(index=['episode', 'turn'],
+                             columns=['metric'],
+                             values='value'),
+         lambda game, model, experiment:
+            f'{EVAL_DIR}/{game}/{model}/{experiment}/{EVAL_DIR}'),
         # by game
-        filter_dic = {'game': game}
-        df_aux = filter_df_by_key(df_scores, filter_dic)
-        df_aux = df_aux.pivot(index=['model', 'episode', 'turn'],
-                              columns=['experiment', 'metric'],
-                              values='value') 
-        prefix = f'{EVAL_DIR}/{game}/{EVAL_DIR}'
-        name = f'{prefix}/turn-level/tables/scores_raw.csv'
-        df_aux.to_csv(name)
+        (['game'],
+         lambda df: df.pivot(index=['model', 'episode', 'turn'],
+                             columns=['experiment', 'metric'],
+                             values='value'),
+         lambda game: f'{EVAL_DIR}/{game}/{EVAL_DIR}'),
+    ]
+    export_tables(df_scores, keys, levels,
+                  'turn-level/tables/scores_raw.csv',
+                  desc="Saving raw turn scores", jobs=jobs)
+
+
+def export_tables(df_scores: pd.DataFrame, keys: list, levels: list,
+                  file_name: str, desc: str, jobs: int = 1) -> None:
+    """Write one csv file per distinct key of each level.
+
+    Each level is a tuple of the columns to group by, a function that
+    turns the rows of a group into the table to save and a function that
+    returns the directory for a key. The rows of each group are selected
+    with a single groupby per level. Keys without any rows are saved as
+    tables built from an empty dataframe.
+    """
+    tables = _build_tables(df_scores, keys, levels, file_name)
+    n_tables = sum(len({key[:len(cols)] for key in keys}) for cols, _, _ in levels)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_save_table, table, name)
+                       for table, name in tables]
+            for future in tqdm(as_completed(futures), total=n_tables,
+                               desc=desc):
+                future.result()
+    else:
+        for table, name in tqdm(tables, total=n_tables, desc=desc):
+            _save_table(table, name)
+
+
+def _build_tables(df_scores: pd.DataFrame, keys: list, levels: list,
+                  file_name: str):
+    """Yield the table and file name for each distinct key of each level."""
+    empty = df_scores.iloc[0:0]
+    for cols, make_table, make_dir in levels:
+        indices = {}
+        groupby = df_scores.groupby(cols, observed=True, sort=False)
+        for key, key_indices in groupby.indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            indices[key] = key_indices
+        # the distinct keys of this level, in the order of the episodes
+        level_keys = dict.fromkeys(tuple(key[:len(cols)]) for key in keys)
+        for key in level_keys:
+            rows = df_scores.iloc[indices[key]] if key in indices else empty
+            yield make_table(rows), f'{make_dir(*key)}/{file_name}'
+
+
+def _save_table(df: pd.DataFrame, name: str) -> None:
+    df.to_csv(name)
 
 
 def create_file_name(subfolders: str, level: str, kind: str,
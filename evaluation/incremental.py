@@ -0,0 +1,137 @@
+"""
+Manifest for the incremental evaluation of a results directory.
+
+The manifest remembers the episode scores of every scores.json file (with
+its mtime, size and hash) and the aggregated rows of every game and model,
+so that a new evaluation only reads the new or changed files and only
+aggregates the scores of the affected games and models again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from tqdm import tqdm
+
+import evaluation.evalutils as utils
+
+MANIFEST_NAME = 'bencheval_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_hash(path: Path) -> str:
+    """Return the sha256 of the file contents."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class ScoresManifest:
+    """The scores of a results directory, as of the last evaluation."""
+
+    def __init__(self, results_path: str):
+        self.results_path = Path(results_path)
+        self.manifest_path = self.results_path / MANIFEST_NAME
+        self.episodes = {}  # relative path of scores.json -> entry
+        self.aggregates = {}  # game -> model -> [[metric, value], ...]
+        if self.manifest_path.is_file():
+            data = utils.load_json(self.manifest_path)
+            if data.get('version') == MANIFEST_VERSION:
+                self.episodes = data['episodes']
+                self.aggregates = data['aggregates']
+            else:
+                print('Outdated evaluation manifest, evaluating all episodes.')
+
+    def refresh(self) -> set:
+        """Read the new and changed scores files, forget the removed ones.
+
+        Return the (game, model) pairs whose episode scores have changed.
+        """
+        changed = set()
+        score_files = utils.find_episode_files('scores.json',
+                                               path=self.results_path)
+        seen = set()
+        n_read = 0
+        for path in tqdm(score_files, desc='Checking scores'):
+            key = path.relative_to(self.results_path).as_posix()
+            seen.add(key)
+            stat = path.stat()
+            entry = self.episodes.get(key)
+            if (entry is not None and entry['mtime'] == stat.st_mtime
+                    and entry['size'] == stat.st_size):
+                continue
+            digest = file_hash(path)
+            if entry is not None and entry['hash'] == digest:
+                entry['mtime'] = stat.st_mtime  # touched, but not changed
+                continue
+            name = utils.parse_directory_name(path)
+            entry = dict(name, mtime=stat.st_mtime, size=stat.st_size,
+                         hash=digest,
+                         scores=utils.load_json(path)['episode scores'])
+            self.episodes[key] = entry
+            changed.add((entry['game'], entry['model']))
+            n_read += 1
+        for key in set(self.episodes) - seen:
+            entry = self.episodes.pop(key)
+            changed.add((entry['game'], entry['model']))
+        # keep the order of the files, as in a full evaluation
+        self.episodes = {key: self.episodes[key] for key in
+                         (path.relative_to(self.results_path).as_posix()
+                          for path in score_files)}
+        print(f'Read {n_read} new or changed of {len(score_files)} '
+              f'scores files, {len(changed)} game/model pairs changed.')
+        return changed
+
+    def build_df_episode_scores(self) -> pd.DataFrame:
+        """Create dataframe with all episode scores (as in evalutils)."""
+        scores = {}
+        for entry in self.episodes.values():
+            naming = utils.name_as_tuple(entry)
+            if naming in scores:
+                print(f'Repeated file {naming}!')
+                continue
+            scores[naming] = {'episodes': entry['scores']}
+        return utils.build_df_episode_scores(scores)
+
+    def get_aggregates(self, exclude: set) -> tuple:
+        """Return the remembered aggregated rows of the unchanged pairs.
+
+        The rows are in as many dataframes as have been remembered (see
+        bencheval.aggregate_game_model).
+        """
+        cols = ['game', 'model', 'metric', 'value']
+        tables = []
+        for game, by_model in self.aggregates.items():
+            for model, model_tables in by_model.items():
+                if (game, model) in exclude:
+                    continue
+                for idx, metric_values in enumerate(model_tables):
+                    if idx == len(tables):
+                        tables.append([])
+                    tables[idx].extend((game, model, metric, value)
+                                       for metric, value in metric_values)
+        return tuple(pd.DataFrame(rows, columns=cols) for rows in tables)
+
+    def set_aggregates(self, dfs: tuple) -> None:
+        """Remember the aggregated rows of all game/model pairs."""
+        self.aggregates = {}
+        for idx, df in enumerate(dfs):
+            cols = ['game', 'model', 'metric', 'value']
+            for game, model, metric, value in df[cols].itertuples(
+                    index=False, name=None):
+                by_model = self.aggregates.setdefault(str(game), {})
+                model_tables = by_model.setdefault(str(model),
+                                                   [[] for _ in dfs])
+                model_tables[idx].append([metric, value])
+
+    def save(self) -> None:
+        """Write the manifest (atomically) next to the results."""
+        data = {'version': MANIFEST_VERSION, 'episodes': self.episodes,
+                'aggregates': self.aggregates}
+        fd, tmp_path = tempfile.mkstemp(dir=self.results_path,
+                                        prefix=f'.{MANIFEST_NAME}.')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.manifest_path)
+        print(f'Saved the evaluation manifest into {self.manifest_path}')
@@ -24,33 +24,32 @@ additional directory called results_eval containing two directories
 """
 
 import argparse
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
-import seaborn as sns
-import sklearn.metrics as metrics
-from tqdm import tqdm
 
 import evaluation.evalutils as utils
-import evaluation.plotting as plotting
 import evaluation.makingtables as tables
 import clemgame.metrics as clemmetrics
 
-sns.set(font='Futura', style="white")
-
 parser = argparse.ArgumentParser()
 parser.add_argument('--no_plots', action='store_true',
                     help='Do not generate plots.')
+parser.add_argument('-j', '--jobs', type=int, default=1,
+                    help='Number of processes that render the plots.')
+parser.add_argument('--redraw', action='store_true',
+                    help='Render all plots, also those whose input has not '
+                         'changed since they were rendered.')
 args = parser.parse_args()
 
 if args.no_plots:
     print('Only tables will be created, all plots skipped!')
+else:
+    # matplotlib and seaborn are only imported when plotting
+    import evaluation.plotting as plotting
+    from evaluation.plotting import PlotJob
+    plot_jobs = []
 
-scores = utils.load_scores()
-utils.create_eval_tree(scores.keys())
-
-df_turn_scores = utils.build_df_turn_scores(scores)
-df_episode_scores = utils.build_df_episode_scores(scores)
+episodes, df_turn_scores, df_episode_scores = utils.load_score_dfs()
+utils.create_eval_tree(episodes)
 
 # Create the PLAYED variable
 aux = df_episode_scores[df_episode_scores["metric"] == "Aborted"].copy()
@@ -61,13 +60,13 @@ df_episode_scores = pd.concat([df_episode_scores, aux], ignore_index=True)
 
 GAMES = df_turn_scores['game'].unique().tolist()
 MODELS = df_turn_scores['model'].unique().tolist()
-EXPERIMENTS = list(set([x[:3] for x in scores]))
-EPISODES = scores.keys()
+EXPERIMENTS = list(set([x[:3] for x in episodes]))
+EPISODES = episodes
 ZERO_ONE_EPISODE_SCORES = utils.get_metrics_in_zero_one(df_episode_scores)
 ZERO_ONE_TURN_SCORES = utils.get_metrics_in_zero_one(df_turn_scores)
 
 # Save tables with raw scores
-utils.save_raw_scores(df_turn_scores, df_episode_scores, scores)
+utils.save_raw_scores(df_turn_scores, df_episode_scores, episodes)
 
 for key, value in utils.short_names.items():
     df_turn_scores['model'] = df_turn_scores['model'].str.replace(key, value)
@@ -107,28 +106,32 @@ if not args.no_plots:
     df_01, df_other = utils.filter_metrics_in_zero_one(df_episode_scores,
                                                        ZERO_ONE_EPISODE_SCORES)
     if not df_01.empty:
-        plotting.plot_escore_benchmark(df_01, '_in01')       # (2a)
+        plot_jobs.append(PlotJob(plotting.plot_escore_benchmark,
+                                 df_01, '_in01'))       # (2a)
     if not df_other.empty:
-        plotting.plot_escore_benchmark(df_other, '_other')   # (2b)
+        plot_jobs.append(PlotJob(plotting.plot_escore_benchmark,
+                                 df_other, '_other'))   # (2b)
 
     # Stacked bar plots with success, lose and aborted
     # micro average
-    plotting.plot_stacked_micro_bar(df_episode_scores, df_clem)
+    plot_jobs.append(PlotJob(plotting.plot_stacked_micro_bar,
+                             df_episode_scores, df_clem))
     # macro_average
-    plotting.plot_stacked_macro_bar(df_episode_scores, df_clem)
+    plot_jobs.append(PlotJob(plotting.plot_stacked_macro_bar,
+                             df_episode_scores, df_clem))
 
     # polygons
-    plotting.plot_polygons(df_episode_scores)
+    plot_jobs.append(PlotJob(plotting.plot_polygons, df_episode_scores))
 
     # scatter plots with (% played, quality score) for each model
     # we generate for the benchmark, for each game and for each experiment
-    plotting.plot_paper_scatter(df_paper)
+    plot_jobs.append(PlotJob(plotting.plot_paper_scatter, df_paper))
 
     # lineplots with quality score for each model across experiments
-    plotting.plot_lines(df_episode_scores)
+    plot_jobs.append(PlotJob(plotting.plot_lines, df_episode_scores))
 
     # barplots with clem score for each model 
-    plotting.plot_clem_score(df_clem)
+    plot_jobs.append(PlotJob(plotting.plot_clem_score, df_clem))
 
 # ----------------------- Benchmark: Turn-Level Scores ------------------------
 #
@@ -148,22 +151,28 @@ tables.make_detailed_overview_by_game(df_episode_scores)
 
 # Plots
 if not args.no_plots:
-    for game in tqdm(GAMES, desc="Generating game-specific plots"):
+    for game in GAMES:
         act_df = df_episode_scores[df_episode_scores.game == game]
         # overview of all episode scores
-        plotting.plot_escores_game(act_df, game)
-        plotting.plot_escores_line_game(act_df, game)
+        plot_jobs.append(PlotJob(plotting.plot_escores_game, act_df, game))
+        plot_jobs.append(PlotJob(plotting.plot_escores_line_game,
+                                 act_df, game))
         # one plot for each metric
         for metric, metric_df in act_df.groupby('metric'):
             lims = utils.get_metric_lims(metric, ZERO_ONE_EPISODE_SCORES)
-            plotting.plot_escores_game_metric(metric_df, game, metric, lims)
-            plotting.plot_escores_line_game_metric(metric_df, game, metric, lims)
+            plot_jobs.append(PlotJob(plotting.plot_escores_game_metric,
+                                     metric_df, game, metric, lims))
+            plot_jobs.append(PlotJob(plotting.plot_escores_line_game_metric,
+                                     metric_df, game, metric, lims))
         # overview of turn scores
         # there should not be nans, removing them here for now
         act_df = df_turn_scores[df_turn_scores.game == game].dropna()
         # overview of all turn scores
-        plotting.plot_tscores_game(act_df, game)
+        plot_jobs.append(PlotJob(plotting.plot_tscores_game, act_df, game))
         # one plot for each metric
         for metric, metric_df in act_df.groupby('metric'):
             lims = utils.get_metric_lims(metric, ZERO_ONE_TURN_SCORES)
-            plotting.plot_tscores_game_metric(metric_df, game, metric, lims)
+            plot_jobs.append(PlotJob(plotting.plot_tscores_game_metric,
+                                     metric_df, game, metric, lims))
+
+    plotting.render_plots(plot_jobs, n_jobs=args.jobs, redraw=args.redraw)
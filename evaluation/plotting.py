@@ -2,6 +2,13 @@
 Functions that create evaluation plots.
 """
 
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -10,11 +17,18 @@ import seaborn as sns
 from matplotlib.colors import ListedColormap, to_rgba
 from matplotlib.patches import Polygon
 
+from tqdm import tqdm
+
 import evaluation.evalutils as utils
 import clemgame.metrics as clemmetrics
 
+sns.set(font='Futura', style="white")
+
 ABORTED = clemmetrics.METRIC_ABORTED
 
+# remembers the input of each plot when it was last rendered
+PLOTS_MANIFEST = f'{utils.EVAL_DIR}/plots_manifest.json'
+
 COLORS = ['darkorange', 'teal', 'firebrick', 'purple', 'darkgoldenrod',
           'steelblue', 'darkgreen']
 
@@ -23,7 +37,7 @@ STACK_COLORS = ['darkolivegreen', 'indianred', 'gray']
 
 # ------------------------ Evaluation of the Benchmark ------------------------
 # Overview plots
-def plot_escore_benchmark(df: pd.DataFrame, ending: str) -> None:
+def plot_escore_benchmark(df: pd.DataFrame, ending: str) -> str:
     "Create benchmark overview with subplots for all games."
     n_games = len(df.game.unique())
     n_models = len(df.model.unique())
@@ -31,7 +45,7 @@ def plot_escore_benchmark(df: pd.DataFrame, ending: str) -> None:
     fig, all_axes = plt.subplots(n_games, 1, figsize=(15, n_games * 5))
     axs = all_axes.flatten()
 
-    for n, (game, df_group) in enumerate(df.groupby('game')):
+    for n, (game, df_group) in enumerate(df.groupby('game', observed=True)):
         g = sns.barplot(data=df_group,
                         x='metric',
                         y='value',
@@ -57,6 +71,7 @@ def plot_escore_benchmark(df: pd.DataFrame, ending: str) -> None:
     name = f'overview{ending}'
     path = utils.create_file_name('', 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_stacked_micro_bar(df, df_clem):
@@ -70,7 +85,7 @@ def plot_stacked_micro_bar(df, df_clem):
                            values='value')
                     .reset_index()
                     .drop(columns=['game', 'experiment', 'episode'])
-                    .groupby('model')
+                    .groupby('model', observed=True)
                     .sum()
                     .sort_values(axis=1, by='metric', ascending=False))
     percs = 100 * df_aux.div(df_aux.sum(axis=1), axis=0)
@@ -88,6 +103,7 @@ def plot_stacked_micro_bar(df, df_clem):
     name = 'succes-lose-aborted_micro-avr'
     path = utils.create_file_name('', 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_stacked_macro_bar(df, df_clem):
@@ -98,10 +114,10 @@ def plot_stacked_macro_bar(df, df_clem):
     """
 
     df_aux = df[df.metric.isin(utils.GAMEPLAY_METRICS)]
-    df_aux = 100 * (df_aux.groupby(['model', 'game', 'metric'])
+    df_aux = 100 * (df_aux.groupby(['model', 'game', 'metric'], observed=True)
                           .mean(numeric_only=True)
                           .reset_index()
-                          .groupby(['model', 'metric'])
+                          .groupby(['model', 'metric'], observed=True)
                           .mean(numeric_only=True))
     df_aux = (df_aux.reset_index()
                     .pivot(columns='metric', index=['model']))
@@ -121,9 +137,10 @@ def plot_stacked_macro_bar(df, df_clem):
     name = 'succes-lose-aborted_macro-avr'
     path = utils.create_file_name('', 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
-def plot_paper_scatter(df_paper: pd.DataFrame) -> None:
+def plot_paper_scatter(df_paper: pd.DataFrame) -> str:
     """Create scatter plot with % played vs. quality score."""
     dots = (df_paper['all'].to_frame()
                            .reset_index()
@@ -162,6 +179,7 @@ def plot_paper_scatter(df_paper: pd.DataFrame) -> None:
     name = 'played-quality-paper'
     path = utils.create_file_name('', 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_clem_score(df_clem):
@@ -173,6 +191,7 @@ def plot_clem_score(df_clem):
     name = 'clemscore'
     path = utils.create_file_name('', 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def ccw_sort(p):
@@ -190,7 +209,7 @@ def plot_polygons(df):
     fig, ax_list = plt.subplots(3, 4, figsize=(9, 6), sharey=True, sharex=True)
     axs = ax_list.flatten()
 
-    for n, (model, model_df) in enumerate(df.groupby('model')):
+    for n, (model, model_df) in enumerate(df.groupby('model', observed=True)):
         rows = model_df.metric.isin(utils.MAIN_METRICS)
         df_aux = model_df[rows]
         df_aux = (df_aux.pivot(index=['game', 'experiment', 'episode'],
@@ -201,7 +220,7 @@ def plot_polygons(df):
 
         # create the x and y coordinates for each game
         dots = []
-        for game, game_df in df_aux.groupby('game'):
+        for game, game_df in df_aux.groupby('game', observed=True):
             overall_means = (game_df.mean(numeric_only=True)
                                     .fillna(0))
             # replace missing score by 0 when all aborted
@@ -238,12 +257,13 @@ def plot_polygons(df):
     plt.tight_layout()
     path = utils.create_file_name('', 'episode', 'plots', 'polygons', 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_lines(df):
     """Plot lineplot comparing models across experiments."""
     aux_df = (df[df.metric == clemmetrics.BENCH_SCORE]
-              .groupby(['game', 'model', 'experiment'])
+              .groupby(['game', 'model', 'experiment'], observed=True)
               .mean(numeric_only=True)
               .reset_index())
     g = sns.catplot(aux_df,
@@ -262,6 +282,7 @@ def plot_lines(df):
     plt.tight_layout()
     path = utils.create_file_name('', 'episode', 'plots', 'lines', 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_escores_game(act_df, game):
@@ -285,11 +306,12 @@ def plot_escores_game(act_df, game):
     plt.suptitle(f'Overview of Episode Scores: {game}', y=1.)
     path = utils.create_file_name(game, 'episode', 'plots', '_overview', 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_escores_line_game(act_df, game):
     """Plot lineplot for a game, across experiments."""
-    act_df = (act_df.groupby(['model', 'experiment', 'metric'])
+    act_df = (act_df.groupby(['model', 'experiment', 'metric'], observed=True)
                     .mean(numeric_only=True)
                     .reset_index())
     g = sns.catplot(act_df,
@@ -308,6 +330,7 @@ def plot_escores_line_game(act_df, game):
     name = '_overview-lines'
     path = utils.create_file_name(game, 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_escores_game_metric(metric_df, game, metric, lims):
@@ -333,6 +356,7 @@ def plot_escores_game_metric(metric_df, game, metric, lims):
     name = f'_overview_{metric}'
     path = utils.create_file_name(game, 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_escores_line_game_metric(metric_df, game, metric, lims):
@@ -354,6 +378,7 @@ def plot_escores_line_game_metric(metric_df, game, metric, lims):
     name = f'_overview-lines_{metric}'
     path = utils.create_file_name(game, 'episode', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_tscores_game(act_df, game):
@@ -373,6 +398,7 @@ def plot_tscores_game(act_df, game):
     plt.suptitle(f'Overview of Turn Scores: {game}', y=1.1)
     path = utils.create_file_name(game, 'turn', 'plots', '_overview', 'pdf')
     utils.savefig(path)
+    return path
 
 
 def plot_tscores_game_metric(metric_df, game, metric, lims):
@@ -393,3 +419,83 @@ def plot_tscores_game_metric(metric_df, game, metric, lims):
     name = f'_overview_{metric}'
     path = utils.create_file_name(game, 'turn', 'plots', name, 'pdf')
     utils.savefig(path)
+    return path
+
+
+# --------------------------------- Plot jobs ---------------------------------
+# The plots are independent of each other, so they can be rendered in
+# parallel and skipped when their input has not changed.
+class PlotJob:
+    """A plot function with its arguments (dataframes or plain values)."""
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    @property
+    def key(self) -> str:
+        """Identify the plot by the function and its non-data arguments."""
+        names = [str(arg) for arg in self.args
+                 if not isinstance(arg, pd.DataFrame)]
+        return ' | '.join([self.function.__name__] + names)
+
+    def fingerprint(self) -> str:
+        """Hash the code of the plot function and its input."""
+        digest = hashlib.sha256(inspect.getsource(self.function).encode())
+        for arg in self.args:
+            if isinstance(arg, pd.DataFrame):
+                # the dtypes include the categories, which seaborn plots
+                digest.update(str(arg.dtypes.to_dict()).encode())
+                with_index = not isinstance(arg.index, pd.RangeIndex)
+                hashes = pd.util.hash_pandas_object(arg, index=with_index)
+                digest.update(hashes.values.tobytes())
+            else:
+                digest.update(repr(arg).encode())
+        return digest.hexdigest()
+
+
+def _use_file_backend():
+    """Render to files only, without a display (also in worker processes)."""
+    matplotlib.use('Agg')
+
+
+def _render(function, args) -> str:
+    return function(*args)
+
+
+def render_plots(jobs: list, n_jobs: int = 1, redraw: bool = False) -> None:
+    """Render the plots whose input has changed since the last rendering.
+
+    With n_jobs > 1 the plots are rendered by a pool of processes.
+    """
+    manifest = {}
+    if os.path.isfile(PLOTS_MANIFEST) and not redraw:
+        manifest = utils.load_json(PLOTS_MANIFEST)
+    todo = []
+    for job in jobs:
+        fingerprint = job.fingerprint()
+        entry = manifest.get(job.key)
+        if (entry is None or entry['fingerprint'] != fingerprint
+                or not os.path.isfile(entry['path'])):
+            todo.append((job, fingerprint))
+    print(f'Rendering {len(todo)} of {len(jobs)} plots '
+          f'(the others have not changed).')
+    try:
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs,
+                                     initializer=_use_file_backend) as executor:
+                futures = {executor.submit(_render, job.function, job.args):
+                           (job, fingerprint) for job, fingerprint in todo}
+                for future in tqdm(as_completed(futures), total=len(futures),
+                                   desc='Rendering plots'):
+                    job, fingerprint = futures[future]
+                    manifest[job.key] = {'fingerprint': fingerprint,
+                                         'path': future.result()}
+        else:
+            _use_file_backend()
+            for job, fingerprint in tqdm(todo, desc='Rendering plots'):
+                manifest[job.key] = {'fingerprint': fingerprint,
+                                     'path': _render(job.function, job.args)}
+    finally:  # keep what has been rendered, even if a plot fails
+        with open(PLOTS_MANIFEST, 'w') as file:
+            json.dump(manifest, file, indent=1)
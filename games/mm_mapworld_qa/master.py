@@ -10,6 +10,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import imageio
 import shutil
+import tempfile
 
 import games.mm_mapworld_qa.utils as utils
 
@@ -577,22 +578,20 @@ class MM_MapWorldQAScorer(GameScorer):
                                 root_dir=results_root)
         
         # plotting & animation
-        if not os.path.exists("tmp"):
-            os.makedirs("tmp")
+        # a fresh temporary directory per episode, so that episodes can be scored in parallel processes
+        tmp_dir = tempfile.mkdtemp()
         path_plot = self.plot_path(self.path)
         path_plot.savefig(os.path.join(results_root, dialogue_pair, self.name, game_record_dir, "path.png"))
-        plt.close()
-        if not os.path.exists("tmp/step_plots"):
-            os.makedirs("tmp/step_plots")
+        plt.close(path_plot)
         images = []
         for i in range(len(self.path)):
             step_plot = self.plot_path(self.path[:i+1])
-            step_plot.savefig(f"tmp/step_plots/{i}.png")
-            images.append(imageio.imread(f"tmp/step_plots/{i}.png"))
-            plt.close()
+            step_plot.savefig(os.path.join(tmp_dir, f"{i}.png"))
+            images.append(imageio.imread(os.path.join(tmp_dir, f"{i}.png")))
+            plt.close(step_plot)
         imageio.mimsave(os.path.join(results_root, dialogue_pair, self.name, game_record_dir, "animation.gif"), images, fps=1, loop=True)
         try:
-            shutil.rmtree("tmp")
+            shutil.rmtree(tmp_dir)
         except OSError as e:
             print("Error: %s - %s." % (e.filename, e.strerror))
         
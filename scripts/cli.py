@@ -14,6 +14,9 @@ from clemgame import benchmark
     To run a specific game with a single player:
     $> python3 scripts/cli.py run -g privateshared -m mock
     
+    To run several games (or 'all') with the model loaded only once:
+    $> python3 scripts/cli.py run -g wordle taboo -m mock
+
     To run a specific game with a two players:
     $> python3 scripts/cli.py run -g taboo -m mock mock
     
@@ -31,6 +34,13 @@ from clemgame import benchmark
     
     To score a specific game:
     $> python3 scripts/cli.py transcribe -g privateshared
+
+    To share the response cache (see run --cache) between machines:
+    $> python3 scripts/cli.py cache export -f cache.jsonl
+    $> python3 scripts/cli.py cache import -f cache.jsonl
+
+    To update the index of the episodes after episodes have been copied into experiments of the results directory:
+    $> python3 scripts/cli.py index sync --full
 """
 
 
@@ -55,16 +65,31 @@ def main(args: argparse.Namespace):
     if args.command_name == "ls":
         benchmark.list_games()
     if args.command_name == "run":
-        benchmark.run(args.game,
+        benchmark.run(args.game[0] if len(args.game) == 1 else args.game,
                       model_specs=read_model_specs(args.models),
                       gen_args=read_gen_args(args),
                       experiment_name=args.experiment_name,
                       instances_name=args.instances_name,
-                      results_dir=args.results_dir)
+                      results_dir=args.results_dir,
+                      workers=args.workers,
+                      use_async=args.use_async,
+                      use_cache=args.cache,
+                      cache_size=args.cache_size,
+                      resume=args.resume,
+                      stream_records=args.stream_records,
+                      compact_requests=args.compact_requests,
+                      prometheus_file=args.prometheus_file)
     if args.command_name == "score":
-        benchmark.score(args.game, experiment_name=args.experiment_name, results_dir=args.results_dir)
+        benchmark.score(args.game, experiment_name=args.experiment_name, results_dir=args.results_dir,
+                        jobs=args.jobs)
     if args.command_name == "transcribe":
-        benchmark.transcripts(args.game, experiment_name=args.experiment_name, results_dir=args.results_dir)
+        benchmark.transcripts(args.game, experiment_name=args.experiment_name, results_dir=args.results_dir,
+                              jobs=args.jobs, shared_css=args.shared_css, index_pages=args.index_pages)
+    if args.command_name == "cache":
+        benchmark.cache(args.action, file_path=args.file, results_dir=args.results_dir, cache_size=args.cache_size)
+    if args.command_name == "index":
+        benchmark.index(args.action, results_dir=args.results_dir, game_name=args.game,
+                        dialogue_pair=args.dialogue_pair, status=args.status, full=args.full)
 
 
 if __name__ == "__main__":
@@ -79,6 +104,9 @@ if __name__ == "__main__":
       To run a specific game with a single player:
       $> python3 scripts/cli.py run -g privateshared -m mock
 
+      To run several games (or 'all') with the model loaded only once:
+      $> python3 scripts/cli.py run -g wordle taboo -m mock
+
       To run a specific game with a two players:
       $> python3 scripts/cli.py run -g taboo -m mock mock
 
@@ -89,8 +117,9 @@ if __name__ == "__main__":
       Default: None.""")
     run_parser.add_argument("-e", "--experiment_name", type=str,
                             help="Optional argument to only run a specific experiment")
-    run_parser.add_argument("-g", "--game", type=str,
-                            required=True, help="A specific game name (see ls).")
+    run_parser.add_argument("-g", "--game", type=str, nargs="+",
+                            required=True, help="A specific game name (see ls), several game names or 'all'. "
+                                                "The models are loaded only once for all given games.")
     run_parser.add_argument("-t", "--temperature", type=float, default=0.0,
                             help="Argument to specify sampling temperature for the models. Default: 0.0.")
     run_parser.add_argument("-l", "--max_tokens", type=int, default=100,
@@ -103,6 +132,34 @@ if __name__ == "__main__":
                             help="A relative or absolute path to the results root directory. "
                                  "For example '-r results/v1.5/de‘ or '-r /absolute/path/for/results'. "
                                  "When not specified, then the results will be located in './results'")
+    run_parser.add_argument("-w", "--workers", type=int, default=1,
+                            help="The number of episodes to play concurrently. "
+                                 "Use this only with remote API backends, because local models are not thread-safe, "
+                                 "or with huggingface_local models that have a max_batch_size in the model registry. "
+                                 "Default: 1.")
+    run_parser.add_argument("--use_async", action="store_true",
+                            help="Play the episodes as coroutines on a single event loop instead of one thread "
+                                 "per episode. Then --workers is the maximal number of episodes in flight.")
+    run_parser.add_argument("--resume", action="store_true",
+                            help="Skip the episodes that have already been recorded completely in the results "
+                                 "directory, e.g. to continue a crashed run or to play only newly added instances.")
+    run_parser.add_argument("--stream_records", action="store_true",
+                            help="Append the interactions and requests of each episode to .jsonl files while "
+                                 "playing, instead of keeping them in memory until the episode ends.")
+    run_parser.add_argument("--compact_requests", action="store_true",
+                            help="Store the requests of each episode in requests_compact.json, where each prompt only "
+                                 "holds the messages added since the previous prompt. "
+                                 "Read with clemgame.file_utils.load_requests().")
+    run_parser.add_argument("--cache", action="store_true",
+                            help="Answer repeated requests with temperature 0 from the response cache "
+                                 "in the results directory (and add new responses to it).")
+    run_parser.add_argument("--cache_size", type=int, default=None,
+                            help="The maximal number of cached responses. "
+                                 "The least recently used ones are removed first. Default: unbounded.")
+    run_parser.add_argument("--prometheus_file", type=str, default=None,
+                            help="Also store the metrics of the model calls (which are always stored as "
+                                 "run_metrics.json in the results directory) to this file in the Prometheus text "
+                                 "format, e.g. for the textfile collector of the node exporter.")
 
     score_parser = sub_parsers.add_parser("score")
     score_parser.add_argument("-e", "--experiment_name", type=str,
@@ -113,6 +170,9 @@ if __name__ == "__main__":
                               help="A relative or absolute path to the results root directory. "
                                    "For example '-r results/v1.5/de‘ or '-r /absolute/path/for/results'. "
                                    "When not specified, then the results will be located in './results'")
+    score_parser.add_argument("-j", "--jobs", type=int, default=1,
+                              help="The number of processes that work on the episodes (of all games) in parallel. "
+                                   "Default: 1.")
 
     transcribe_parser = sub_parsers.add_parser("transcribe")
     transcribe_parser.add_argument("-e", "--experiment_name", type=str,
@@ -123,5 +183,49 @@ if __name__ == "__main__":
                                    help="A relative or absolute path to the results root directory. "
                                         "For example '-r results/v1.5/de‘ or '-r /absolute/path/for/results'. "
                                         "When not specified, then the results will be located in './results'")
+    transcribe_parser.add_argument("-j", "--jobs", type=int, default=1,
+                                   help="The number of processes that work on the episodes (of all games) in parallel. "
+                                        "Default: 1.")
+    transcribe_parser.add_argument("--shared_css", action="store_true",
+                                   help="Link a single style sheet at the results root (transcript.css) instead of "
+                                        "inlining the css into each transcript. Default: False.")
+    transcribe_parser.add_argument("--index_pages", action="store_true",
+                                   help="Also store a (paginated) index.html that links the transcripts of each "
+                                        "experiment. Default: False.")
+
+    cache_parser = sub_parsers.add_parser("cache")
+    cache_parser.add_argument("action", type=str, choices=["stats", "export", "import"],
+                              help="Show the size of the response cache, or export/import it to share it "
+                                   "between machines.")
+    cache_parser.add_argument("-f", "--file", type=str,
+                              help="The JSON lines file to export to or import from. "
+                                   "Default: response_cache.jsonl in the results directory.")
+    cache_parser.add_argument("--cache_size", type=int, default=None,
+                              help="The maximal number of cached responses kept after an import. "
+                                   "Default: unbounded.")
+    cache_parser.add_argument("-r", "--results_dir", type=str, default="results",
+                              help="A relative or absolute path to the results root directory. "
+                                   "For example '-r results/v1.5/de‘ or '-r /absolute/path/for/results'. "
+                                   "When not specified, then the results will be located in './results'")
+
+    index_parser = sub_parsers.add_parser("index")
+    index_parser.add_argument("action", type=str, choices=["rebuild", "sync", "list"],
+                              help="Rebuild the index of the episodes from the results directory, add the "
+                                   "episodes that have been copied into it (and remove the deleted ones), or "
+                                   "list the indexed episodes.")
+    index_parser.add_argument("-g", "--game", type=str, nargs="+",
+                              help="Only sync or list the episodes of these games.")
+    index_parser.add_argument("-p", "--dialogue_pair", type=str, nargs="+",
+                              help="Only sync or list the episodes of these dialogue pairs (model directories).")
+    index_parser.add_argument("--full", action="store_true",
+                              help="Sync: look into all the experiment directories, not only into those of the "
+                                   "game directories that changed (to find episodes copied into experiments that "
+                                   "are already indexed).")
+    index_parser.add_argument("-s", "--status", type=str, choices=["recorded", "scored", "transcribed"],
+                              help="Only list the episodes that have been recorded, scored or transcribed.")
+    index_parser.add_argument("-r", "--results_dir", type=str, default="results",
+                              help="A relative or absolute path to the results root directory. "
+                                   "For example '-r results/v1.5/de‘ or '-r /absolute/path/for/results'. "
+                                   "When not specified, then the results will be located in './results'")
 
     main(parser.parse_args())
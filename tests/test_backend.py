@@ -1,7 +1,10 @@
+import asyncio
 import unittest
 
-from backends import get_model_for, load_model_registry
-from backends.utils import ensure_alternating_roles
+import backends
+from backends import get_model_for, load_model_registry, Model, ModelSpec, Backend, ModelPool
+from backends.utils import ensure_alternating_roles, ensure_messages_format, TokenCountCache, get_http_client, \
+    get_async_http_client, EventLoopLocal
 
 
 class UtilsTestCase(unittest.TestCase):
@@ -98,6 +101,152 @@ class UtilsTestCase(unittest.TestCase):
                          )
 
 
+class TokenCountCacheTestCase(unittest.TestCase):
+
+    def test_only_the_new_suffix_is_tokenized(self):
+        tokenized = []
+
+        def tokenize(text):
+            tokenized.append(text)
+            return text.split()
+
+        token_counts = TokenCountCache(tokenize, max_entries=2)
+        self.assertEqual(token_counts.count("User: hi\n"), 2)
+        self.assertEqual(token_counts.count("User: hi\nAssistant: hello\n"), 4)
+        self.assertEqual(token_counts.count("User: hi\nAssistant: hello\nUser: bye\n"), 6)
+        self.assertEqual(tokenized, ["User: hi\n", "Assistant: hello\n", "User: bye\n"])
+        self.assertEqual(token_counts.count("User: bye\n"), 2)  # the first prompt has been dropped
+
+
+class HttpClientTestCase(unittest.TestCase):
+
+    def test_backends_share_a_client_per_name(self):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            self.skipTest("httpx is not installed")
+        client = get_http_client("test_backend", {"max_connections": 4, "timeout": 30})
+        self.assertIs(get_http_client("test_backend"), client)
+        self.assertIsNot(get_http_client("test_backend", verify=False), client)
+        self.assertIsNot(get_http_client("other_test_backend"), client)
+        self.assertEqual(client.timeout.read, 30)
+        self.assertEqual(client.timeout.connect, 10)
+
+    def test_async_clients_are_shared_per_event_loop(self):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            self.skipTest("httpx is not installed")
+
+        async def get_clients():
+            return get_async_http_client("test_backend"), get_async_http_client("test_backend")
+
+        first_client, same_client = asyncio.run(get_clients())
+        self.assertIs(first_client, same_client)
+        second_client, _ = asyncio.run(get_clients())  # a new event loop, the first one is closed
+        self.assertIsNot(second_client, first_client)
+
+    def test_event_loop_local_values(self):
+        created = []
+        clients = EventLoopLocal(lambda: created.append(object()) or created[-1])
+
+        async def get_client():
+            return clients.get()
+
+        loop = asyncio.new_event_loop()
+        self.assertIs(loop.run_until_complete(get_client()), loop.run_until_complete(get_client()))
+        loop.close()
+        asyncio.run(get_client())
+        self.assertEqual(len(created), 2)
+        self.assertEqual(len(clients._values), 1)  # the value of the closed first event loop is dropped
+        with self.assertRaises(RuntimeError):  # no running event loop
+            clients.get()
+
+
+class EchoModel(Model):
+
+    @ensure_messages_format
+    def generate_response(self, messages):
+        return messages, {}, messages[-1]["content"]
+
+
+class AsyncEchoModel(Model):
+
+    def generate_response(self, messages):
+        raise NotImplementedError()
+
+    @ensure_messages_format
+    async def agenerate_response(self, messages):
+        return messages, {}, messages[-1]["content"]
+
+
+class AsyncModelTestCase(unittest.TestCase):
+
+    def test_agenerate_response_falls_back_to_generate_response(self):
+        model = EchoModel(ModelSpec(model_name="echo"))
+        messages = [{"role": "user", "content": "Hello"}, {"role": "user", "content": "there"}]
+        prompt, _, response_text = asyncio.run(model.agenerate_response(messages))
+        self.assertEqual(response_text, "Hello\n\nthere")
+        self.assertEqual(prompt, model.generate_response(messages)[0])
+
+    def test_ensure_messages_format_wraps_coroutines(self):
+        model = AsyncEchoModel(ModelSpec(model_name="echo"))
+        messages = [{"role": "user", "content": "Hello"}, {"role": "user", "content": "there"}]
+        _, _, response_text = asyncio.run(model.agenerate_response(messages))
+        self.assertEqual(response_text, "Hello\n\nthere")
+
+    def test_experiments_are_played_on_the_same_event_loop(self):
+        from clemgame.clemgame import run_coroutine
+
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        first_loop = run_coroutine(running_loop())
+        self.assertIs(run_coroutine(running_loop()), first_loop)
+        self.assertFalse(first_loop.is_closed())
+
+
+class ClosableModel(EchoModel):
+
+    def __init__(self, model_spec: ModelSpec):
+        super().__init__(model_spec)
+        self.is_closed = False
+
+    def close(self):
+        self.is_closed = True
+
+
+class ClosableBackend(Backend):
+
+    def get_model_for(self, model_spec: ModelSpec) -> Model:
+        return ClosableModel(model_spec)
+
+
+class ModelPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        load_model_registry()
+        backends._backend_registry["closable"] = ClosableBackend()
+        self.pool = ModelPool()
+
+    def tearDown(self):
+        del backends._backend_registry["closable"]
+
+    def test_models_are_reused_across_runs(self):
+        model_a, model_b = self.pool.get_models_for([ModelSpec(model_name="a", backend="closable")] * 2)
+        self.assertIs(model_a, model_b)
+        model_c, = self.pool.get_models_for([ModelSpec(model_name="a", backend="closable")])
+        self.assertIs(model_a, model_c)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_unused_models_are_closed_when_switching(self):
+        model_a, = self.pool.get_models_for([ModelSpec(model_name="a", backend="closable")])
+        model_b, = self.pool.get_models_for([ModelSpec(model_name="b", backend="closable")])
+        self.assertTrue(model_a.is_closed)
+        self.assertFalse(model_b.is_closed)
+        self.assertEqual(len(self.pool), 1)
+
+
 class ModelTestCase(unittest.TestCase):
     def test_get_backend_for_model1(self):
         load_model_registry("test-registry.json")
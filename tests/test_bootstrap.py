@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import clemgame.metrics as clemmetrics
+from evaluation.bootstrap import bootstrap_clemscores
+
+
+def build_episode_scores(quality: dict) -> pd.DataFrame:
+    """One PLAYED and one main score row per episode; NaN quality means aborted."""
+    rows = []
+    for (game, model), values in quality.items():
+        for idx, value in enumerate(values):
+            name = (game, model, '0_exp', f'episode_{idx}')
+            rows.append(name + (clemmetrics.METRIC_PLAYED, float(not np.isnan(value))))
+            rows.append(name + (clemmetrics.BENCH_SCORE, value))
+    return pd.DataFrame(rows, columns=['game', 'model', 'experiment', 'episode', 'metric', 'value'])
+
+
+class BootstrapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.df = build_episode_scores({
+            ('taboo', 'm1'): [100, 0, np.nan, 100],
+            ('wordle', 'm1'): [50, 50, 50],
+            ('taboo', 'm2'): [np.nan, 20, 40, 60, 80],
+        })
+
+    def test_point_estimates(self):
+        df_models, df_games = bootstrap_clemscores(self.df, n_resamples=100, seed=0)
+        self.assertAlmostEqual(df_games.loc[('m1', 'taboo'), '% Played'], 75.)
+        self.assertAlmostEqual(df_games.loc[('m1', 'taboo'), 'Quality Score'], 66.67)
+        # macro-average over the games: 87.5 % played and a quality score of 58.33
+        self.assertAlmostEqual(df_models.loc['m1', 'clemscore'], 51.04)
+        self.assertAlmostEqual(df_models.loc['m2', 'clemscore'], 40.)
+
+    def test_intervals(self):
+        df_models, df_games = bootstrap_clemscores(self.df, n_resamples=2000, seed=0)
+        # all the episodes have the same score
+        self.assertEqual(df_games.loc[('m1', 'wordle'), 'Quality Score (CI low)'], 50.)
+        self.assertEqual(df_games.loc[('m1', 'wordle'), 'Quality Score (CI high)'], 50.)
+        for model, row in df_models.iterrows():
+            self.assertLessEqual(row['clemscore (CI low)'], row['clemscore'])
+            self.assertGreaterEqual(row['clemscore (CI high)'], row['clemscore'])
+
+    def test_seed_makes_it_reproducible(self):
+        first, _ = bootstrap_clemscores(self.df, n_resamples=500, seed=42)
+        second, _ = bootstrap_clemscores(self.df, n_resamples=500, seed=42)
+        pd.testing.assert_frame_equal(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from clemgame import results_index
+import evaluation.evalutils as utils
+
+
+def build_synthetic_scores(n_episodes: int, n_turns: int, n_metrics: int) -> dict:
+    """Scores as returned by load_scores() for n_episodes * n_turns * n_metrics turn metric rows."""
+    scores = {}
+    for idx in range(n_episodes):
+        name = (f'game_{idx % 5}', f'model_{idx % 7}', f'{idx % 3}_experiment', f'episode_{idx}')
+        turns = {str(turn): {f'metric_{m}': float(turn * m) for m in range(n_metrics)}
+                 for turn in range(n_turns)}
+        episodes = {f'metric_{m}': m for m in range(n_metrics)}
+        scores[name] = {'turns': turns, 'episodes': episodes}
+    return scores
+
+
+def build_df_turn_scores_rowwise(scores: dict) -> pd.DataFrame:
+    """The former row by row construction (as a reference)."""
+    cols = ['game', 'model', 'experiment', 'episode', 'turn', 'metric', 'value']
+    df_turn_scores = pd.DataFrame(columns=cols)
+    for name, data in scores.items():
+        (game, model, experiment, episode) = name
+        for turn, turn_data in data['turns'].items():
+            for metric_name, metric_value in turn_data.items():
+                new_row = [game, model, experiment, episode, turn,
+                           metric_name, metric_value]
+                df_turn_scores.loc[len(df_turn_scores)] = new_row
+    return df_turn_scores
+
+
+class BuildScoresDataFrameTestCase(unittest.TestCase):
+
+    def test_same_rows_as_rowwise_construction(self):
+        scores = build_synthetic_scores(n_episodes=20, n_turns=3, n_metrics=4)
+        df = utils.build_df_turn_scores(scores)
+        expected = build_df_turn_scores_rowwise(scores)
+        pd.testing.assert_frame_equal(df.astype(object), expected.astype(object), check_dtype=False)
+
+    def test_typed_columns(self):
+        scores = build_synthetic_scores(n_episodes=10, n_turns=2, n_metrics=3)
+        df = utils.build_df_episode_scores(scores)
+        self.assertEqual(len(df), 10 * 3)
+        for col in ['game', 'model', 'experiment']:
+            self.assertIsInstance(df[col].dtype, pd.CategoricalDtype)
+        self.assertEqual(df['value'].dtype, float)
+
+    def test_one_million_rows(self):
+        scores = build_synthetic_scores(n_episodes=10_000, n_turns=10, n_metrics=10)
+        df = utils.build_df_turn_scores(scores)
+        self.assertEqual(len(df), 1_000_000)
+        self.assertEqual(df['value'].dtype, float)
+
+
+class LoadScoresTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_path = tempfile.mkdtemp()
+        for game in ['wordle', 'wordle_withclue']:
+            for episode in ['episode_0', 'episode_1']:
+                episode_path = os.path.join(self.results_path, 'm--m', game, '0_high', episode)
+                os.makedirs(episode_path)
+                with open(os.path.join(episode_path, 'scores.json'), 'w') as f:
+                    f.write('{"turn scores": {}, "episode scores": {"Request Success": NaN}}')
+                with open(os.path.join(episode_path, 'interactions.json'), 'w') as f:
+                    json.dump({'turns': []}, f)
+                with open(os.path.join(episode_path, 'instance.json'), 'w') as f:
+                    json.dump({'game_id': episode}, f)
+
+    def test_game_filter_matches_whole_names(self):
+        scores = utils.load_scores('wordle', path=self.results_path)
+        self.assertEqual(sorted(scores), [('wordle', 'm--m', '0_high', 'episode_0'),
+                                          ('wordle', 'm--m', '0_high', 'episode_1')])
+
+    def test_threads_keep_the_order(self):
+        self.assertEqual(list(utils.load_scores(path=self.results_path, jobs=4)),
+                         list(utils.load_scores(path=self.results_path)))
+
+    def test_iter_interactions(self):
+        episodes = utils.iter_interactions(path=self.results_path, model_name='m--m', jobs=2)
+        name, (interactions, instance) = next(episodes)
+        self.assertEqual(instance['game_id'], name[3])
+        self.assertEqual(len(list(episodes)), 3)
+
+    def test_episodes_copied_in_after_the_index(self):
+        results_index.ResultsIndex(self.results_path).close()
+        episode_path = os.path.join(self.results_path, 'm--m', 'wordle', '1_low', 'episode_0')
+        os.makedirs(episode_path)
+        for file_name in ['scores.json', 'interactions.json']:
+            with open(os.path.join(episode_path, file_name), 'w') as f:
+                f.write('{"turn scores": {}, "episode scores": {}}')
+        files = utils.find_episode_files('scores.json', 'wordle', path=self.results_path)
+        self.assertEqual([file.parent.parent.name for file in files], ['0_high', '0_high', '1_low'])
+        index = results_index.ResultsIndex(self.results_path)
+        index.sync()
+        index.close()
+        self.assertEqual(utils.find_episode_files('scores.json', 'wordle', path=self.results_path), files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+
+from clemgame.file_utils import encode_requests, RequestsReader, BLOB_MIN_LENGTH
+
+
+def call(prompt_obj, response="ok"):
+    return {"timestamp": "2024-01-01T00:00:00", "manipulated_prompt_obj": prompt_obj, "raw_response_obj": response}
+
+
+class CompactRequestsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        image = "i" * BLOB_MIN_LENGTH
+        player_1 = [{"role": "user", "content": "Describe", "image": [image]}]
+        player_2 = [{"role": "user", "content": "Guess"}]
+        self.requests = [call(list(player_1)), call(list(player_2))]
+        player_1 += [{"role": "assistant", "content": "A cloud"}, {"role": "user", "content": "More"}]
+        self.requests.append(call(list(player_1)))
+        player_2 += [{"role": "assistant", "content": "Sky"}, {"role": "user", "content": "Again", "image": [image]}]
+        self.requests.append(call(list(player_2)))
+        self.requests.append(call({"inputs": "a plain prompt"}, response={"text": image}))
+
+    def test_prompts_reference_the_previous_prompt_of_the_same_player(self):
+        compact = encode_requests(self.requests)
+        delta = compact["requests"][2]["manipulated_prompt_obj"]["$delta"]
+        self.assertEqual(delta["base"], 0)
+        self.assertEqual(delta["keep"], 1)
+        self.assertEqual(len(delta["append"]), 2)
+        delta = compact["requests"][3]["manipulated_prompt_obj"]["$delta"]
+        self.assertEqual(delta["base"], 1)
+
+    def test_long_strings_are_stored_once(self):
+        compact = encode_requests(self.requests)
+        self.assertEqual(len(compact["blobs"]), 1)
+
+    def test_reader_reconstructs_the_requests(self):
+        compact = json.loads(json.dumps(encode_requests(self.requests)))
+        reader = RequestsReader(compact)
+        self.assertEqual(len(reader), len(self.requests))
+        self.assertEqual(reader[3], self.requests[3])  # out of order access
+        self.assertEqual(list(reader), self.requests)
+
+    def test_payloads_with_marker_keys_are_reconstructed(self):
+        requests = [call([{"role": "user", "content": "Hi"}], response={"$blob": "not a reference"}),
+                    call({"$delta": {"base": None, "keep": 0, "append": []}}),
+                    call([{"role": "user", "content": "Hi"}, {"role": "user", "$$content": {"$blob": "x"}}])]
+        compact = json.loads(json.dumps(encode_requests(requests)))
+        self.assertEqual(list(RequestsReader(compact)), requests)
+
+    def test_prompts_reference_the_longest_shared_prefix(self):
+        messages = [{"role": "user", "content": str(i)} for i in range(4)]
+        requests = [call(messages[:3]), call(messages[:1]), call(messages[:2] + messages[3:]), call(messages)]
+        compact = encode_requests(requests)
+        self.assertEqual(compact["requests"][2]["manipulated_prompt_obj"]["$delta"]["base"], 0)  # not the latest one
+        self.assertEqual(compact["requests"][3]["manipulated_prompt_obj"]["$delta"]["base"], 0)
+        self.assertEqual(compact["requests"][3]["manipulated_prompt_obj"]["$delta"]["keep"], 3)
+        self.assertEqual(list(RequestsReader(compact)), requests)
+
+    def test_reader_reads_the_previous_format(self):
+        compact = {"format": "delta-v1", "blobs": {}, "requests": [
+            call({"$delta": {"base": None, "keep": 0, "append": [{"role": "user", "$key": "Hi"}]}})]}
+        self.assertEqual(RequestsReader(compact)[0], call([{"role": "user", "$key": "Hi"}]))
+
+
+if __name__ == '__main__':
+    unittest.main()
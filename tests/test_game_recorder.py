@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+from clemgame import file_utils
+from clemgame.clemgame import GameRecorder
+
+DIALOGUE_PAIR = "mock-t0.0--mock-t0.0"
+EPISODE_DIR = "0_high/episode_0"
+
+
+def read_lines(file_path: str):
+    with open(file_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class StreamingRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_root = tempfile.mkdtemp()
+        self.episode_path = os.path.join(self.results_root, DIALOGUE_PAIR, "taboo", EPISODE_DIR)
+
+    def play_turn(self, recorder: GameRecorder, turn: int):
+        recorder.log_next_turn()
+        prompt = [{"role": "user", "content": f"Guess {turn}"}]
+        recorder.log_event("GM", "Player 1", {"type": "send message", "content": f"Guess {turn}"})
+        recorder.log_event("Player 1", "GM", {"type": "get message", "content": "apple"},
+                           call=(prompt, {"response": "apple"}))
+
+    def test_records_are_appended_while_playing_and_compacted_at_the_end(self):
+        recorder = GameRecorder("taboo")
+        recorder.start_streaming(self.results_root, DIALOGUE_PAIR, EPISODE_DIR)
+        recorder.log_players({"GM": "Game master", "Player 1": "Guesser"})
+        self.play_turn(recorder, 0)
+        self.play_turn(recorder, 1)  # flushes the lines of the first turn
+        interaction_lines = read_lines(os.path.join(self.episode_path, "interactions.jsonl"))
+        self.assertEqual(interaction_lines[0], {"key": "players", "value": {"GM": "Game master",
+                                                                            "Player 1": "Guesser"}})
+        self.assertEqual([line.get("turn") for line in interaction_lines[1:]], [0, 0, 0, 1])
+        self.assertEqual(len(read_lines(os.path.join(self.episode_path, "requests.jsonl"))), 1)
+        self.assertEqual(recorder.requests, [])  # the calls are not kept in memory
+
+        recorder.store_records(self.results_root, DIALOGUE_PAIR, EPISODE_DIR)
+        self.assertEqual(sorted(os.listdir(self.episode_path)), ["interactions.json", "requests.json"])
+        with open(os.path.join(self.episode_path, "interactions.json")) as f:
+            interactions = json.load(f)
+        self.assertEqual(interactions, recorder.interactions)
+        self.assertEqual([len(turn) for turn in interactions["turns"]], [2, 2])
+        with open(os.path.join(self.episode_path, "requests.json")) as f:
+            requests = json.load(f)
+        self.assertEqual([request["manipulated_prompt_obj"][0]["content"] for request in requests],
+                         ["Guess 0", "Guess 1"])
+
+    def test_streamed_records_can_be_stored_compact(self):
+        recorder = GameRecorder("taboo")
+        recorder.compact_requests = True
+        recorder.start_streaming(self.results_root, DIALOGUE_PAIR, EPISODE_DIR)
+        recorder.log_players({"GM": "Game master", "Player 1": "Guesser"})
+        self.play_turn(recorder, 0)
+        recorder.store_records(self.results_root, DIALOGUE_PAIR, EPISODE_DIR)
+        self.assertNotIn("requests.jsonl", os.listdir(self.episode_path))
+        requests = file_utils.load_requests(self.episode_path)
+        self.assertEqual(requests[0]["raw_response_obj"], {"response": "apple"})
+
+    def test_a_crash_leaves_readable_partial_records(self):
+        recorder = GameRecorder("taboo")
+        recorder.start_streaming(self.results_root, DIALOGUE_PAIR, EPISODE_DIR)
+        recorder.log_players({"GM": "Game master", "Player 1": "Guesser"})
+        self.play_turn(recorder, 0)
+        self.play_turn(recorder, 1)
+        recorder.stop_streaming()  # as after an exception in the episode, without store_records()
+        self.assertEqual(sorted(os.listdir(self.episode_path)), ["interactions.jsonl", "requests.jsonl"])
+        interaction_lines = read_lines(os.path.join(self.episode_path, "interactions.jsonl"))
+        self.assertEqual(interaction_lines[-1]["event"]["action"]["content"], "apple")
+        requests = read_lines(os.path.join(self.episode_path, "requests.jsonl"))
+        self.assertEqual([request["manipulated_prompt_obj"][0]["content"] for request in requests],
+                         ["Guess 0", "Guess 1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,15 @@
+import time
 import unittest
+from concurrent.futures import Future
+
+import torch
 
 import backends
-from backends.huggingface_local_api import check_messages, check_context_limit
+from backends.huggingface_local_api import check_messages, check_context_limit, BatchGenerator, PrefixCache
+
+PAD_TOKEN_ID = 0
+EOS_TOKEN_ID = 2
+END_OF_TURN_TOKEN_ID = 3  # an additional eos of the generation config
 
 MODEL_SPEC = backends.ModelSpec(**{
     "model_name": "Mistral-7B-Instruct-v0.1",
@@ -96,5 +104,152 @@ class HuggingfaceLocalTestCase(unittest.TestCase):
         when the full set of clemgames is run by others."""
 
 
+class StubTokenizer:
+    pad_token_id = PAD_TOKEN_ID
+    eos_token_id = EOS_TOKEN_ID
+
+
+class StubGenerationConfig:
+    eos_token_id = [EOS_TOKEN_ID, END_OF_TURN_TOKEN_ID]
+
+
+class StubModel:
+    """ Generates the last prompt token + 100 and eos, followed by padding """
+
+    def __init__(self, error: Exception = None, eos_token_id: int = EOS_TOKEN_ID):
+        self.error = error
+        self.eos_token_id = eos_token_id
+        self.calls = []
+        self.generation_config = StubGenerationConfig()
+
+    def generate(self, input_ids, attention_mask=None, pad_token_id=None, **gen_kwargs):
+        self.calls.append((input_ids.clone(), attention_mask.clone(), gen_kwargs))
+        if self.error is not None:
+            raise self.error
+        generated = torch.full((len(input_ids), 3), pad_token_id, dtype=torch.long)
+        generated[:, 0] = input_ids[:, -1] + 100
+        generated[:, 1] = self.eos_token_id
+        return torch.cat([input_ids, generated], dim=1)
+
+
+class BatchGeneratorTestCase(unittest.TestCase):
+
+    def test_prompts_are_left_padded_and_results_routed_to_their_requests(self):
+        model = StubModel()
+        generator = BatchGenerator(model, StubTokenizer(), max_batch_size=2, max_batch_wait=5)
+        short = generator.submit(torch.tensor([5, 6]), max_new_tokens=3)
+        long = generator.submit(torch.tensor([7, 8, 9]), max_new_tokens=3)
+        self.assertEqual(long.result(timeout=5).tolist(), [7, 8, 9, 109, EOS_TOKEN_ID])
+        self.assertEqual(short.result(timeout=5).tolist(), [5, 6, 106, EOS_TOKEN_ID])
+        generator.close()
+        self.assertEqual(len(model.calls), 1)  # the batch was full, so it did not wait for max_batch_wait
+        input_ids, attention_mask, gen_kwargs = model.calls[0]
+        self.assertEqual(input_ids.tolist(), [[PAD_TOKEN_ID, 5, 6], [7, 8, 9]])
+        self.assertEqual(attention_mask.tolist(), [[0, 1, 1], [1, 1, 1]])
+        self.assertEqual(gen_kwargs, {"max_new_tokens": 3})
+
+    def test_only_prompts_with_the_same_gen_args_are_batched(self):
+        model = StubModel()
+        generator = BatchGenerator(model, StubTokenizer(), max_batch_size=2, max_batch_wait=5)
+        greedy = generator.submit(torch.tensor([5]), do_sample=False)
+        sampled = generator.submit(torch.tensor([6]), do_sample=True)
+        self.assertEqual(greedy.result(timeout=5).tolist(), [5, 105, EOS_TOKEN_ID])
+        self.assertEqual(sampled.result(timeout=5).tolist(), [6, 106, EOS_TOKEN_ID])
+        generator.close()
+        self.assertEqual([len(input_ids) for input_ids, _, _ in model.calls], [1, 1])
+
+    def test_outputs_are_cut_at_any_eos_of_the_generation_config(self):
+        generator = BatchGenerator(StubModel(eos_token_id=END_OF_TURN_TOKEN_ID), StubTokenizer(),
+                                   max_batch_size=2, max_batch_wait=5)
+        short = generator.submit(torch.tensor([5]))
+        long = generator.submit(torch.tensor([6, 7]))
+        self.assertEqual(short.result(timeout=5).tolist(), [5, 105, END_OF_TURN_TOKEN_ID])
+        self.assertEqual(long.result(timeout=5).tolist(), [6, 7, 107, END_OF_TURN_TOKEN_ID])
+        generator.close()
+
+    def test_outputs_are_cut_at_the_padding(self):
+        model = StubModel()
+        model.generate = lambda input_ids, attention_mask=None, pad_token_id=None, **gen_kwargs: torch.cat(
+            [input_ids, torch.tensor([[input_ids[0, -1] + 100, pad_token_id]])], dim=1)  # no eos generated
+        generator = BatchGenerator(model, StubTokenizer(), max_batch_size=1, max_batch_wait=5)
+        self.assertEqual(generator.submit(torch.tensor([5])).result(timeout=5).tolist(), [5, 105])
+        generator.close()
+
+    def test_collect_batch_stops_at_the_size_or_the_timeout(self):
+        generator = BatchGenerator(StubModel(), StubTokenizer(), max_batch_size=2, max_batch_wait=0.05)
+        generator.close()  # stop the background thread, so that the batches can be collected here
+        for token in range(3):
+            generator._pending.put((torch.tensor([token]), {}, Future()))
+        self.assertEqual(len(generator._collect_batch()), 2)
+        start = time.monotonic()
+        self.assertEqual(len(generator._collect_batch()), 1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_errors_are_passed_to_all_waiting_requests(self):
+        generator = BatchGenerator(StubModel(error=RuntimeError("out of memory")), StubTokenizer(),
+                                   max_batch_size=2, max_batch_wait=5)
+        futures = [generator.submit(torch.tensor([5])), generator.submit(torch.tensor([6, 7]))]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        generator.close()
+
+    def test_close_generates_the_pending_prompts_and_stops_the_thread(self):
+        model = StubModel()
+        generator = BatchGenerator(model, StubTokenizer(), max_batch_size=4, max_batch_wait=5)
+        future = generator.submit(torch.tensor([5]))
+        generator.close()  # does not wait for max_batch_wait
+        self.assertEqual(future.result(timeout=0).tolist(), [5, 105, EOS_TOKEN_ID])
+        self.assertFalse(generator._worker.is_alive())
+
+
+class StubKeyValueCache:
+
+    def __init__(self, length: int):
+        self.length = length
+
+    def crop(self, length: int):
+        self.length = length
+
+
+class PrefixCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = PrefixCache(max_entries=2)
+
+    def put(self, token_ids):
+        self.cache.put(torch.tensor(token_ids), StubKeyValueCache(len(token_ids)))
+
+    def test_the_previous_turn_is_reused_and_removed(self):
+        self.put([1, 5, 6, 7, 8])
+        past_key_values = self.cache.pop(torch.tensor([1, 5, 6, 7, 8, 9, 10]))
+        self.assertEqual(past_key_values.length, 5)
+        self.assertIsNone(self.cache.pop(torch.tensor([1, 5, 6, 7, 8, 9, 10])))  # generate() extends it in place
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_the_entry_is_cropped_to_the_shared_prefix(self):
+        self.put([1, 5, 6, 7, 8, 9, 10, 11, 12, 13])
+        past_key_values = self.cache.pop(torch.tensor([1, 5, 6, 7, 8, 9, 10, 11, 20, 21]))
+        self.assertEqual(past_key_values.length, 8)
+        self.put([1, 5, 6])
+        # at least the last prompt token must be fed to the model
+        self.assertEqual(self.cache.pop(torch.tensor([1, 5, 6])).length, 2)
+
+    def test_the_entry_of_another_dialogue_is_not_taken(self):
+        self.put([1, 5, 6, 7, 8])  # player A
+        self.put([1, 30, 31, 32, 33])  # player B, only the header is shared
+        self.assertEqual(self.cache.pop(torch.tensor([1, 30, 31, 32, 33, 34])).length, 5)
+        self.assertIsNone(self.cache.pop(torch.tensor([1, 40, 41, 42])))
+        self.assertEqual(self.cache.pop(torch.tensor([1, 5, 6, 7, 8, 9])).length, 5)
+
+    def test_least_recently_added_entries_are_evicted(self):
+        self.put([1, 5])
+        self.put([1, 6])
+        self.put([1, 7])
+        self.assertIsNone(self.cache.pop(torch.tensor([1, 5, 9])))
+        self.assertIsNotNone(self.cache.pop(torch.tensor([1, 6, 9])))
+        self.assertIsNotNone(self.cache.pop(torch.tensor([1, 7, 9])))
+
+
 if __name__ == '__main__':
     unittest.main()
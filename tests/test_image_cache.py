@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import image_cache
+from backends.image_cache import ImageCache
+
+# the smallest valid PNG (a single transparent pixel)
+PNG_BYTES = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                          "1f15c4890000000d49444154789c6300010000000500010d0a2db40000000049454e44ae426082")
+
+
+class ImageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.image_dir = tempfile.mkdtemp()
+        self.loaded = []
+
+    def write_image(self, name: str, content: bytes = PNG_BYTES) -> str:
+        image_path = os.path.join(self.image_dir, name)
+        with open(image_path, "wb") as f:
+            f.write(content)
+        return image_path
+
+    def load(self, image: str) -> str:
+        self.loaded.append(image)
+        return "x" * 10
+
+    def test_images_are_loaded_once_until_changed(self):
+        cache = ImageCache()
+        image_path = self.write_image("a.png")
+        for _ in range(3):
+            cache.get(image_cache.RGB, image_path, self.load)
+        cache.get(image_cache.BASE64, image_path, self.load)  # another kind of the same image
+        self.assertEqual(len(self.loaded), 2)
+        self.write_image("a.png", PNG_BYTES + b"\0")  # changes the size (and the modification time)
+        cache.get(image_cache.RGB, image_path, self.load)
+        self.assertEqual(len(self.loaded), 3)
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 3))
+        self.assertAlmostEqual(stats["rgb_hit_rate"], 0.5)
+
+    def test_least_recently_used_images_are_evicted(self):
+        cache = ImageCache(max_bytes=25)
+        a, b, c = [self.write_image(name) for name in ["a.png", "b.png", "c.png"]]
+        cache.get(image_cache.RGB, a, self.load)
+        cache.get(image_cache.RGB, b, self.load)
+        cache.get(image_cache.RGB, a, self.load)
+        cache.get(image_cache.RGB, c, self.load)  # evicts b
+        self.assertEqual((len(cache), cache.bytes), (2, 20))
+        cache.get(image_cache.RGB, a, self.load)
+        cache.get(image_cache.RGB, b, self.load)
+        self.assertEqual(self.loaded, [a, b, c, b])
+
+    def test_concurrent_requests_load_an_image_once(self):
+        cache = ImageCache()
+        image_path = self.write_image("a.png")
+        loaded = []
+
+        def slow_load(image):
+            loaded.append(threading.get_ident())
+            time.sleep(0.05)
+            return "x"
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            values = list(executor.map(lambda _: cache.get(image_cache.RGB, image_path, slow_load), range(4)))
+        self.assertEqual(values, ["x"] * 4)
+        self.assertEqual(len(loaded), 1)
+
+    def test_load_base64(self):
+        image_data, mime_type = image_cache.load_base64(self.write_image("image.png"))
+        self.assertEqual(mime_type, "image/png")
+        self.assertTrue(image_data.startswith("iVBORw0KGgo"))
+
+    def test_image_type(self):
+        self.assertEqual(image_cache.image_type(PNG_BYTES), "png")
+        self.assertEqual(image_cache.image_type(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"), "jpeg")
+        self.assertEqual(image_cache.image_type(b"GIF89a\x01\x00"), "gif")
+        self.assertEqual(image_cache.image_type(b"RIFF\x24\x00\x00\x00WEBPVP8 "), "webp")
+        self.assertIsNone(image_cache.image_type(b"not an image"))
+
+
+if __name__ == '__main__':
+    unittest.main()
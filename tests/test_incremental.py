@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from evaluation.incremental import ScoresManifest
+
+
+def store_scores(results_path: str, model: str, episode: str, main_score: float):
+    episode_path = os.path.join(results_path, model, "taboo", "0_high", episode)
+    os.makedirs(episode_path, exist_ok=True)
+    with open(os.path.join(episode_path, "scores.json"), "w") as f:
+        json.dump({"turn scores": {}, "episode scores": {"Main Score": main_score, "Aborted": 0}}, f)
+
+
+class ScoresManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_path = tempfile.mkdtemp()
+        store_scores(self.results_path, "m1--m1", "episode_0", 100)
+        store_scores(self.results_path, "m1--m1", "episode_1", 0)
+        manifest = ScoresManifest(self.results_path)
+        self.assertEqual(manifest.refresh(), {("taboo", "m1--m1")})
+        manifest.save()
+
+    def test_only_new_pairs_have_changed(self):
+        store_scores(self.results_path, "m2--m2", "episode_0", 50)
+        manifest = ScoresManifest(self.results_path)
+        self.assertEqual(manifest.refresh(), {("taboo", "m2--m2")})
+        df = manifest.build_df_episode_scores()
+        self.assertEqual(len(df), 3 * 2)
+
+    def test_rewritten_but_same_scores_are_unchanged(self):
+        store_scores(self.results_path, "m1--m1", "episode_1", 0)
+        manifest = ScoresManifest(self.results_path)
+        self.assertEqual(manifest.refresh(), set())
+
+    def test_removed_episodes_change_their_pair(self):
+        os.remove(os.path.join(self.results_path, "m1--m1", "taboo", "0_high", "episode_1", "scores.json"))
+        manifest = ScoresManifest(self.results_path)
+        self.assertEqual(manifest.refresh(), {("taboo", "m1--m1")})
+        self.assertEqual(len(manifest.episodes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import ModelSpec
+from clemgame import benchmark
+from clemgame.clemgame import find_benchmark, _process_episode_in_worker
+
+
+class ProcessEpisodesTestCase(unittest.TestCase):
+
+    def test_spawned_workers_import_the_game_themselves(self):
+        results_root = tempfile.mkdtemp()
+        benchmark.run("referencegame", model_specs=[ModelSpec.from_name("mock")],
+                      gen_args=dict(temperature=0.0, max_tokens=100),
+                      experiment_name="line_grids_rows", results_dir=results_root)
+        game_benchmark = find_benchmark("referencegame")
+        dialogue_pair, experiment_dir, episode_dir = game_benchmark.list_episodes(results_root, "Scoring")[0]
+        benchmark_class = (type(game_benchmark).__module__, type(game_benchmark).__qualname__)
+        # a spawned process starts without the game modules imported by this process
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            is_processed = executor.submit(_process_episode_in_worker, benchmark_class, "score", results_root,
+                                           dialogue_pair, experiment_dir, episode_dir, False).result()
+        self.assertTrue(is_processed)
+        episode_path = os.path.join(results_root, dialogue_pair, "referencegame", experiment_dir, episode_dir)
+        self.assertTrue(os.path.isfile(os.path.join(episode_path, "scores.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
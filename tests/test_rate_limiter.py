@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+
+import backends
+from backends import rate_limiter, telemetry
+from backends.utils import retry
+
+
+class RateLimitError(Exception):
+
+    def __init__(self, retry_after: str = None):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+
+class ThrottledModel(backends.Model):
+
+    def __init__(self, rate_limits: int, model_name: str):
+        super().__init__(backends.ModelSpec(model_name=model_name, backend="test", max_concurrency=4))
+        self.set_gen_args(max_tokens=100, temperature=0)
+        self.rate_limits = rate_limits
+
+    @retry(tries=3, delay=0)
+    def generate_response(self, messages):
+        if self.rate_limits > 0:
+            self.rate_limits -= 1
+            raise RateLimitError(retry_after="0")
+        return messages, {"usage": {"prompt_tokens": 10, "completion_tokens": 5}}, "ok"
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def test_budgets_and_concurrency(self):
+        limiter = rate_limiter.RateLimiter(requests_per_minute=2, tokens_per_minute=600, max_concurrency=4)
+        self.assertEqual(limiter.try_acquire(100), 0)
+        self.assertGreater(limiter.try_acquire(600), 0)  # the token budget is used up
+        limiter.release(100, used_tokens=10)
+        self.assertEqual(limiter.try_acquire(550), 0)
+        self.assertAlmostEqual(limiter.try_acquire(0), 30, delta=1)  # the request budget is used up
+        limiter.on_rate_limited(retry_after=5)
+        self.assertEqual(limiter.get_stats()["concurrency_limit"], 1)
+        self.assertGreaterEqual(limiter.try_acquire(0), 5)
+
+    def test_rate_limit_errors_of_the_apis(self):
+        self.assertTrue(rate_limiter.is_rate_limit_error(RateLimitError()))
+        self.assertFalse(rate_limiter.is_rate_limit_error(ConnectionError()))
+        self.assertEqual(rate_limiter.retry_after_seconds(RateLimitError(retry_after="2.5")), 2.5)
+        self.assertIsNone(rate_limiter.retry_after_seconds(RateLimitError()))
+        self.assertLessEqual(rate_limiter.backoff_delay(20), rate_limiter.BACKOFF_MAX)
+
+    def test_rate_limited_calls_are_retried_and_reduce_the_concurrency(self):
+        run_telemetry = telemetry.Telemetry()
+        model = ThrottledModel(rate_limits=5, model_name="throttled")
+        with mock.patch("time.sleep"), run_telemetry.track_call("throttled"):
+            _, response, text = model.generate_response([{"role": "user", "content": "hi"}])
+        self.assertEqual(text, "ok")
+        stats = run_telemetry.get_stats()[("throttled", telemetry.UNKNOWN_GAME)]
+        self.assertEqual((stats.retries, stats.rate_limited), (5, 5))
+        limiter = rate_limiter.get_rate_limiter(model.model_spec)
+        self.assertEqual(limiter.get_stats()["in_flight"], 0)
+        self.assertEqual(limiter.get_stats()["rate_limited"], 5)
+        with mock.patch("time.sleep"), self.assertRaises(RateLimitError):
+            ThrottledModel(rate_limits=rate_limiter.RATE_LIMIT_TRIES, model_name="blocked").generate_response([])
+
+
+if __name__ == '__main__':
+    unittest.main()
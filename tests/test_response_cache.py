@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from backends import Model, ModelSpec, telemetry
+from backends.response_cache import ResponseCache, CachedModel, cache_key
+
+
+class CountingModel(Model):
+
+    def __init__(self, model_spec: ModelSpec):
+        super().__init__(model_spec)
+        self.calls = 0
+
+    def generate_response(self, messages):
+        self.calls += 1
+        return messages, {"call": self.calls}, f"response {self.calls}"
+
+
+def user_message(content: str):
+    return [{"role": "user", "content": content}]
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.tmp_dir, "cache.sqlite"), max_entries=2)
+        self.model = CountingModel(ModelSpec(model_name="counting"))
+        self.cached_model = CachedModel(self.model, self.cache)
+        self.cached_model.set_gen_args(temperature=0.0, max_tokens=10)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_repeated_request_is_answered_from_cache(self):
+        first = self.cached_model.generate_response(user_message("Hello"))
+        second = self.cached_model.generate_response(user_message("Hello"))
+        self.assertEqual(first, second)
+        self.assertEqual(self.model.calls, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_sampled_requests_are_not_cached(self):
+        self.cached_model.set_gen_args(temperature=1.0, max_tokens=10)
+        self.cached_model.generate_response(user_message("Hello"))
+        self.cached_model.generate_response(user_message("Hello"))
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cached_model.generate_response(user_message("1"))
+        self.cached_model.generate_response(user_message("2"))
+        self.cached_model.generate_response(user_message("1"))  # now "2" is the least recently used
+        self.cached_model.generate_response(user_message("3"))
+        self.assertEqual(len(self.cache), 2)
+        self.cached_model.generate_response(user_message("1"))
+        self.assertEqual(self.model.calls, 3)
+        self.cached_model.generate_response(user_message("2"))
+        self.assertEqual(self.model.calls, 4)
+
+    def test_key_is_computed_from_the_messages_as_given(self):
+        spec = ModelSpec(model_name="counting")
+        merged = cache_key(spec, 0.0, 10, user_message("Hello\n\nthere"))
+        self.assertEqual(merged, cache_key(spec, 0.0, 10, user_message("Hello\n\nthere")))
+        self.assertNotEqual(merged, cache_key(spec, 0.0, 10, user_message("Hello") + user_message("there")))
+        self.assertNotEqual(merged, cache_key(spec, 0.0, 20, user_message("Hello\n\nthere")))
+
+    def test_key_ignores_spec_entries_that_do_not_change_the_responses(self):
+        spec = ModelSpec(model_name="counting", model_id="counting-1", backend="test")
+        key = cache_key(spec, 0.0, 10, user_message("Hello"))
+        throttled_spec = ModelSpec(model_name="counting", model_id="counting-1", backend="test",
+                                   requests_per_minute=60, release_date="2024-01-01")
+        self.assertEqual(key, cache_key(throttled_spec, 0.0, 10, user_message("Hello")))
+        other_spec = ModelSpec(model_name="counting", model_id="counting-2", backend="test")
+        self.assertNotEqual(key, cache_key(other_spec, 0.0, 10, user_message("Hello")))
+
+    def test_key_is_computed_from_the_image_contents(self):
+        spec = ModelSpec(model_name="counting")
+        image_path = os.path.join(self.tmp_dir, "a.png")
+        other_image_path = os.path.join(self.tmp_dir, "b.png")
+        for path, content in [(image_path, b"first image"), (other_image_path, b"first image")]:
+            with open(path, "wb") as f:
+                f.write(content)
+        with_image = [{"role": "user", "content": "What is this?", "image": [image_path]}]
+        with_same_image = [{"role": "user", "content": "What is this?", "image": [other_image_path]}]
+        key = cache_key(spec, 0.0, 10, with_image)
+        self.assertEqual(key, cache_key(spec, 0.0, 10, with_same_image))
+        with open(image_path, "wb") as f:
+            f.write(b"changed image")  # at the same path
+        self.assertNotEqual(key, cache_key(spec, 0.0, 10, with_image))
+
+    def test_cache_hits_are_not_counted_as_model_calls(self):
+        run_telemetry = telemetry.Telemetry()
+        for _ in range(2):
+            with run_telemetry.track_call("counting"):
+                self.cached_model.generate_response(user_message("Hello"))
+        stats = run_telemetry.get_stats()[("counting", telemetry.UNKNOWN_GAME)]
+        self.assertEqual((stats.calls, stats.cache_hits, len(stats.durations)), (1, 1, 1))
+
+    def test_export_import(self):
+        self.cached_model.generate_response(user_message("Hello"))
+        export_file = os.path.join(self.tmp_dir, "cache.jsonl")
+        self.assertEqual(self.cache.export_to(export_file), 1)
+        other_cache = ResponseCache(os.path.join(self.tmp_dir, "other.sqlite"))
+        self.assertEqual(other_cache.import_from(export_file), 1)
+        key = cache_key(self.model.model_spec, 0.0, 10, user_message("Hello"))
+        self.assertEqual(other_cache.get(key)[2], "response 1")
+        other_cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
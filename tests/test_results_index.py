@@ -0,0 +1,89 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from clemgame import results_index
+from clemgame.results_index import ResultsIndex
+
+
+def record_episode(results_root: str, game: str, episode: str, *file_names, experiment: str = "0_high"):
+    episode_path = os.path.join(results_root, "m--m", game, experiment, episode)
+    os.makedirs(episode_path, exist_ok=True)
+    for file_name in file_names:
+        with open(os.path.join(episode_path, file_name), "w") as f:
+            f.write("{}")
+
+
+class ResultsIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_root = tempfile.mkdtemp()
+        record_episode(self.results_root, "taboo", "episode_0", "interactions.json", "scores.json")
+        record_episode(self.results_root, "taboo", "episode_1", "interactions.json")
+        record_episode(self.results_root, "taboo", "episode_2")  # not recorded (e.g. crashed)
+        self.index = ResultsIndex(self.results_root)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_new_index_holds_the_recorded_episodes(self):
+        self.assertEqual([episode.episode for episode in self.index.query()], ["episode_0", "episode_1"])
+        scored = self.index.query(status=results_index.SCORED)
+        self.assertEqual([episode.episode for episode in scored], ["episode_0"])
+
+    def test_marked_episodes_can_be_queried(self):
+        self.index.mark("m--m", "wordle", "1_low", "episode_0", results_index.RECORDED)
+        self.index.mark("m--m", "taboo", "0_high", "episode_1", results_index.TRANSCRIBED)
+        self.assertEqual(len(self.index.query(game=["taboo", "wordle"])), 3)
+        transcribed = self.index.query(dialogue_pair="m--m", status=results_index.TRANSCRIBED)
+        self.assertEqual([(episode.game, episode.episode) for episode in transcribed], [("taboo", "episode_1")])
+        self.assertEqual(self.index.episode_path(transcribed[0]),
+                         os.path.join(self.results_root, "m--m", "taboo", "0_high", "episode_1"))
+
+    def test_rebuild_forgets_removed_episodes(self):
+        self.index.mark("m--m", "wordle", "1_low", "episode_0", results_index.RECORDED)
+        self.assertEqual(self.index.rebuild(), 2)
+        self.assertEqual(self.index.query(game="wordle"), [])
+
+    def test_sync_adds_copied_and_removes_deleted_experiments(self):
+        record_episode(self.results_root, "taboo", "episode_0", "interactions.json", "scores.json",
+                       experiment="1_low")  # copied in
+        record_episode(self.results_root, "wordle", "episode_0", "interactions.json")
+        missing, removed = self.index.changes(game="taboo")
+        self.assertEqual((missing, removed), ([("m--m", "taboo", "1_low", "episode_0")], []))
+        self.assertEqual(self.index.sync(), (2, 0))
+        shutil.rmtree(os.path.join(self.results_root, "m--m", "taboo", "0_high"))
+        self.assertEqual(self.index.sync(), (0, 2))
+        self.assertEqual([(episode.game, episode.experiment) for episode in self.index.query()],
+                         [("taboo", "1_low"), ("wordle", "0_high")])
+        self.assertEqual(len(self.index.query(status=results_index.SCORED)), 1)
+        self.assertEqual(self.index.changes(), ([], []))
+
+    def test_episodes_of_indexed_experiments_are_only_found_by_a_full_sync(self):
+        record_episode(self.results_root, "taboo", "episode_3", "interactions.json")  # copied in
+        shutil.rmtree(os.path.join(self.results_root, "m--m", "taboo", "0_high", "episode_1"))
+        self.assertEqual(self.index.changes(), ([], []))  # the game directory is unchanged
+        missing, removed = self.index.changes(full=True)
+        self.assertEqual(missing, [("m--m", "taboo", "0_high", "episode_3")])
+        self.assertEqual(removed, [("m--m", "taboo", "0_high", "episode_1")])
+        self.assertEqual(self.index.sync(full=True), (1, 1))
+        self.assertEqual([episode.episode for episode in self.index.query()], ["episode_0", "episode_3"])
+
+    def test_read_only_index_does_not_write_to_the_results(self):
+        self.index.close()
+        record_episode(self.results_root, "taboo", "episode_0", "interactions.json", experiment="1_low")
+        files = sorted(os.listdir(self.results_root))
+        read_only_index = ResultsIndex(self.results_root, read_only=True)
+        self.assertEqual(len(read_only_index.query()), 2)
+        self.assertEqual(read_only_index.changes()[0], [("m--m", "taboo", "1_low", "episode_0")])
+        with self.assertRaises(sqlite3.OperationalError):
+            read_only_index.sync()
+        read_only_index.close()
+        self.assertEqual(sorted(os.listdir(self.results_root)), files)
+        self.index = ResultsIndex(self.results_root)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import glob
+import json
+import os
+import tempfile
+import unittest
+
+from backends import ModelSpec
+from clemgame import benchmark
+from clemgame.clemgame import RUN_MANIFEST_FILE_NAME
+
+
+class ResumeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_root = tempfile.mkdtemp()
+
+    def run_referencegame(self, resume: bool):
+        benchmark.run("referencegame", model_specs=[ModelSpec.from_name("mock")],
+                      gen_args=dict(temperature=0.0, max_tokens=100),
+                      experiment_name="line_grids_rows", results_dir=self.results_root, resume=resume)
+
+    def find_files(self, file_name: str):
+        return sorted(glob.glob(os.path.join(self.results_root, "**", file_name), recursive=True))
+
+    def test_resuming_results_from_before_the_manifest_twice(self):
+        self.run_referencegame(resume=False)
+        for manifest_path in self.find_files(RUN_MANIFEST_FILE_NAME):
+            os.remove(manifest_path)  # as recorded before the manifest was introduced
+        interactions_files = self.find_files("interactions.json")
+        os.remove(interactions_files.pop(3))  # an interrupted episode
+        recorded_at = [os.stat(file_path).st_mtime_ns for file_path in interactions_files]
+
+        self.run_referencegame(resume=True)
+        self.run_referencegame(resume=True)
+        self.assertEqual([os.stat(file_path).st_mtime_ns for file_path in interactions_files], recorded_at)
+        self.assertEqual(len(self.find_files("interactions.json")), len(interactions_files) + 1)
+        with open(self.find_files(RUN_MANIFEST_FILE_NAME)[0]) as f:
+            run_manifest = json.load(f)
+        self.assertEqual(len(run_manifest["episodes"]), len(interactions_files) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
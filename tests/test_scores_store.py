@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from clemgame import scores_store
+import evaluation.evalutils as utils
+
+
+def episode_scores(success: float):
+    return {"turn scores": {0: {"Parsed": 1}, 1: {"Parsed": 0, "Comment": "not numeric"}},
+            "episode scores": {"Success": success, "Aborted": None}}
+
+
+@unittest.skipUnless(scores_store.is_available(), "pyarrow is not installed")
+class ScoresStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.results_root = tempfile.mkdtemp()
+        self.score_episodes([
+            ("m1--m1", "0_high", "episode_0", episode_scores(1)),
+            ("m1--m1", "0_high", "episode_1", episode_scores(0)),
+            ("m2--m2", "0_high", "episode_0", episode_scores(1)),
+        ])
+
+    def write_scores_file(self, model: str, experiment: str, episode: str, scores: dict):
+        episode_dir = os.path.join(self.results_root, model, "taboo", experiment, episode)
+        os.makedirs(episode_dir, exist_ok=True)
+        with open(os.path.join(episode_dir, "scores.json"), "w") as f:
+            json.dump(scores, f)
+
+    def score_episodes(self, episodes):
+        for episode in episodes:
+            self.write_scores_file(*episode)
+        scores_store.update(self.results_root, "taboo", episodes)
+
+    def test_store_is_read_like_the_scores_files(self):
+        keys, df_turn_scores, df_episode_scores = utils.load_score_dfs(path=self.results_root)
+        self.assertEqual(keys, [("taboo", "m1--m1", "0_high", "episode_0"),
+                                ("taboo", "m1--m1", "0_high", "episode_1"),
+                                ("taboo", "m2--m2", "0_high", "episode_0")])
+        self.assertEqual(len(df_turn_scores), 3 * 3)
+        self.assertEqual(list(df_turn_scores.columns),
+                         ["game", "model", "experiment", "episode", "turn", "metric", "value"])
+        self.assertEqual(df_episode_scores["value"].isna().sum(), 3)
+        scores = utils.load_scores(path=self.results_root)
+        df_json = utils.scores_records_to_df(utils.build_df_turn_scores(scores), None)
+        self.assertEqual(df_turn_scores["value"].tolist(), df_json["value"].tolist())
+        self.assertIn("not numeric", df_turn_scores["value"].tolist())
+
+    def test_rescored_episodes_are_replaced(self):
+        self.score_episodes([("m1--m1", "0_high", "episode_1", episode_scores(1))])
+        _, _, df_episode_scores = utils.load_score_dfs(path=self.results_root)
+        success = df_episode_scores[df_episode_scores["metric"] == "Success"]
+        self.assertEqual(len(success), 3)
+        self.assertEqual(success["value"].tolist(), [1.0, 1.0, 1.0])
+
+    def test_scores_files_newer_than_the_store_are_read(self):
+        time.sleep(0.01)  # so that the scores files are newer than the partitions
+        self.write_scores_file("m1--m1", "0_high", "episode_1", episode_scores(1))  # rescored
+        self.write_scores_file("m3--m3", "0_high", "episode_0", episode_scores(0))  # copied in
+        shutil.rmtree(os.path.join(self.results_root, "m2--m2"))  # deleted
+        keys, _, df_episode_scores = utils.load_score_dfs(path=self.results_root)
+        self.assertEqual(keys, [("taboo", "m1--m1", "0_high", "episode_0"),
+                                ("taboo", "m1--m1", "0_high", "episode_1"),
+                                ("taboo", "m3--m3", "0_high", "episode_0")])
+        success = df_episode_scores[df_episode_scores["metric"] == "Success"]
+        self.assertEqual(success["value"].tolist(), [1.0, 1.0, 0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
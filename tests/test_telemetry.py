@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+
+import backends
+from backends import telemetry
+from backends.utils import retry
+
+
+class FlakyBackend:
+
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    @retry(tries=3, delay=0)
+    def generate_response(self, messages):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("try again")
+        return messages, {"usage": {"prompt_tokens": 10, "completion_tokens": 5}}, "ok"
+
+
+class TelemetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.telemetry = telemetry.Telemetry()
+        self.telemetry.set_game("taboo")
+
+    def call(self, backend: FlakyBackend):
+        with self.telemetry.track_call("model") as call:
+            _, response, _ = backend.generate_response([])
+            call.set_response(response)
+
+    def test_calls_are_aggregated_per_model_and_game(self):
+        self.call(FlakyBackend(failures=2))
+        with self.assertRaises(ConnectionError):
+            self.call(FlakyBackend(failures=3))
+        with self.assertRaises(backends.ContextExceededError):
+            with self.telemetry.track_call("model"):
+                raise backends.ContextExceededError()
+        stats = self.telemetry.get_stats()[("model", "taboo")]
+        self.assertEqual((stats.calls, stats.retries, stats.errors, stats.context_exceeded), (3, 4, 1, 1))
+        self.assertEqual((stats.prompt_tokens, stats.completion_tokens, stats.calls_with_tokens), (10, 5, 1))
+        self.assertEqual(sum(stats.bucket_counts), 3)
+
+    def test_token_counts_of_the_apis(self):
+        self.assertEqual(telemetry.token_counts({"usage": {"input_tokens": 3, "output_tokens": 4}}), (3, 4))
+        self.assertEqual(telemetry.token_counts({"response": "text"}), (None, None))
+        self.assertEqual(telemetry.token_counts("text"), (None, None))
+
+    def test_store(self):
+        self.call(FlakyBackend(failures=0))
+        results_root = tempfile.mkdtemp()
+        prometheus_file = os.path.join(results_root, "clembench.prom")
+        file_path = self.telemetry.store(results_root, prometheus_file)
+        with open(file_path) as f:
+            metrics = json.load(f)
+        self.assertEqual(metrics["models"]["model"]["calls"], 1)
+        self.assertEqual(metrics["games"][0]["game"], "taboo")
+        with open(prometheus_file) as f:
+            lines = f.read().splitlines()
+        self.assertIn('clembench_call_duration_seconds_bucket{model="model",game="taboo",le="+Inf"} 1', lines)
+        self.assertIn('clembench_completion_tokens_total{model="model",game="taboo"} 5', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from clemgame import transcript_utils
+
+INTERACTIONS = {"turns": [[
+    {"from": "GM", "to": "Player 1", "action": {"type": "send message", "content": "Guess\nthe word"}},
+    {"from": "Player 1", "to": "GM", "action": {"type": "get message", "content": "<apple>"}},
+    {"from": "GM", "to": "GM", "action": {"type": "metadata", "content": "correct"}}
+]]}
+
+
+class TranscriptUtilsTestCase(unittest.TestCase):
+
+    def test_transcript_inlines_or_links_the_css(self):
+        args = (INTERACTIONS, {"name": "high"}, {"game_id": 0}, "m--m")
+        inlined = transcript_utils.build_transcript(*args)
+        self.assertIn(transcript_utils.CSS_STRING, inlined)
+        self.assertIn("Guess<br/>the word", inlined)
+        self.assertIn("&lt;apple&gt;", inlined)
+        linked = transcript_utils.build_transcript(*args, css_href=transcript_utils.shared_css_href(4))
+        self.assertNotIn(transcript_utils.CSS_STRING, linked)
+        self.assertIn('href="../../../../transcript.css"', linked)
+        self.assertEqual(inlined.split("<body>")[1], linked.split("<body>")[1])
+
+    def test_tex_has_a_bubble_per_event(self):
+        tex = transcript_utils.build_tex(INTERACTIONS)
+        self.assertEqual(tex.count("\\stepcounter{utterance}"), 3)
+        self.assertIn("Guess\\\\ \\tt the word", tex)
+        self.assertIn("\\multicolumn{2}{p{0.3\\linewidth}}{\\cellcolor[rgb]{0.95,0.95,0.95}", tex)
+
+    def test_experiment_index_is_paginated(self):
+        episode_dirs = [f"episode_{idx}" for idx in range(5)]
+        pages = transcript_utils.build_experiment_index("high", episode_dirs, page_size=2)
+        self.assertEqual(len(pages), 3)
+        self.assertIn('href="episode_3/transcript.html"', pages[1])
+        self.assertNotIn("episode_3", pages[0])
+        self.assertIn(f'href="{transcript_utils.index_page_name(2)}"', pages[0])
+        self.assertEqual(len(transcript_utils.build_experiment_index("high", [])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()